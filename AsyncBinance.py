@@ -0,0 +1,186 @@
+import asyncio
+import aiohttp
+
+from Binance import BinanceCommon
+from SymbolRules import SymbolRules
+
+# AsyncBinance.py is the asyncio counterpart of Binance.py : the same operations as coroutines,
+# so that one event loop keeps the requests of hundreds of symbols in flight without a thread each.
+# Urls, params, signing and parsing of the answers are shared with the Binance class through BinanceCommon,
+# the requests themselves only go through aiohttp.
+
+#%%
+class AsyncBinance(BinanceCommon):
+
+	def __init__(self, credentials='credentials.txt', max_connections:int=100, timeout:float=10, weight_limit:int=6000, exchange_info_ttl:float=3600):
+		BinanceCommon.__init__(self, credentials, timeout, weight_limit, exchange_info_ttl)
+		self.max_connections = max_connections   # Connections kept alive at most, requests above wait for a free one
+		self.async_session = None   # Created on the first request, it has to belong to the running event loop
+		self.exchange_info_lock = asyncio.Lock()   # Coroutines asking for exchangeInfo at the same time wait for one download
+
+#%%
+	async def _Session(self):
+		if self.async_session is None or self.async_session.closed:
+			self.async_session = aiohttp.ClientSession(
+				connector = aiohttp.TCPConnector(limit=self.max_connections),
+				timeout = aiohttp.ClientTimeout(total=self.timeout))
+
+		return self.async_session
+
+#%%
+	async def Close(self):
+		""" Closes all the connections kept alive by the session """
+		if self.async_session is not None:
+			await self.async_session.close()
+
+#%%
+	async def _arequest(self, method:str, url, params=None, headers=None, raw:bool=False):
+		""" Sends a request through the session, returns the text of the answer (its bytes if raw) """
+		endpoint, weight, priority = self.rate_limiter.RequestWeight(method, url, params)
+		wait = self.rate_limiter.TryAcquire(weight, priority)
+		while wait > 0:   # The request would go over the weight limit
+			await asyncio.sleep(min(wait, 1))
+			wait = self.rate_limiter.TryAcquire(weight, priority)
+
+		session = await self._Session()
+		async with session.request(method, url, params=params, headers=headers) as response:
+			text = await response.read() if raw else await response.text()
+			self.rate_limiter.Update(response.status, response.headers)   # Weight used as counted by the exchange
+		with self.stats_lock:
+			self.requests_sent += 1
+
+		return text
+
+#%%
+	async def _aget(self, url, params=None, headers=None) -> dict:
+		""" Makes a Get Request """
+		try:
+			data = self._ParseResponse(url, await self._arequest('GET', url, params, headers))
+		except Exception as e:
+			data = self._ErrorResponse(url, e)
+
+		return data
+
+#%%
+	async def _apost(self, url, params=None, headers=None) -> dict:
+		""" Makes a Post Request """
+		try:
+			data = self._ParseResponse(url, await self._arequest('POST', url, params, headers))
+		except Exception as e:
+			data = self._ErrorResponse(url, e)
+
+		return data
+
+#%%
+	async def _adelete(self, url, params=None, headers=None) -> dict:
+		""" Makes a Delete Request """
+		try:
+			data = self._ParseResponse(url, await self._arequest('DELETE', url, params, headers))
+		except Exception as e:
+			data = self._ErrorResponse(url, e)
+
+		return data
+
+#%%
+	async def GetSymbolDataOfSymbols(self, symbols:list=None):
+		""" Gets All symbols which are tradable (currently), from the cached exchangeInfo """
+		return self._TradingSymbols(await self.GetExchangeInfo(), symbols)
+
+#%%
+	async def GetExchangeInfo(self) -> dict:
+		""" Returns the data of every symbol indexed by symbol, see Binance.GetExchangeInfo """
+		if self._ExchangeInfoExpired():
+			async with self.exchange_info_lock:
+				if self._ExchangeInfoExpired():   # Not downloaded by the coroutine we waited for
+					self._SetExchangeInfo(await self._aget(self.base + self.endpoints["exchangeInfo"]))
+
+		return self.exchange_info
+
+#%%
+	async def GetSymbolData(self, symbol:str):
+		""" Returns the data of one symbol (None if it doesn't exist) """
+		return (await self.GetExchangeInfo()).get(symbol, None)
+
+#%%
+	async def GetSymbolRules(self, symbol:str):
+		""" Returns the trading rules of a symbol, parsed only once from exchangeInfo """
+		exchange_info = await self.GetExchangeInfo()
+		if symbol not in self.symbol_rules and symbol in exchange_info:
+			self.symbol_rules[symbol] = SymbolRules(exchange_info[symbol])
+
+		return self.symbol_rules.get(symbol, None)
+
+#%%
+	async def GetAccountData(self) -> dict:
+		""" Gets Balances & Account Data """
+		return await self._aget(self.base + self.endpoints["account"], self._SignedParams(dict()), self.headers)
+
+#%%
+	async def Get24hrTicker(self, symbol:str):
+		return await self._aget(self.base + self.endpoints['24hrTicker'] + "?symbol="+symbol)
+
+#%%
+	async def Get24hrTickers(self):
+		""" Gets the 24h tickers of all the symbols in one request """
+		return await self._aget(self.base + self.endpoints['24hrTicker'])
+
+#%%
+	async def GetOrderBook(self, symbol:str, limit:int=100):
+		""" Gets the bids and asks of a symbol, limit levels on each side """
+		return await self._aget(self.base + self.endpoints['orderBook'] + "?symbol="+symbol+"&limit="+str(limit))
+
+#%%
+	async def GetSymbolKlines(self, symbol:str, interval:str, limit:int=1000, end_time=False):
+		"""	Gets trading data for one symbol, see Binance.GetSymbolKlines """
+		if limit > 1000:   # We can get only 1000 candles per request, so all the pages are requested at once
+			pages = await asyncio.gather(*[self.GetSymbolKlines(symbol, interval, 1000, page_end_time)
+				for page_end_time in self._PageEndTimes(interval, limit, end_time)])
+			return self._JoinPages(pages, limit)
+
+		raw = await self._arequest('GET', self._KlinesUrl(symbol, interval, limit, end_time), raw=True)
+
+		return self._ParseKlines(raw, symbol, interval)
+
+#%%
+	async def PlaceOrderFromDict(self, params, test:bool=False):
+		""" Places order from params dict """
+		return await self._apost(self._OrderUrl(test), self._SignedParams(params), self.headers)
+
+#%%
+	async def PlaceOrder(self, symbol:str, side:str, orderType:str, quantity:float=0, price:float=0, test:bool=True):
+		"""Places an order on Binance, see Binance.PlaceOrder """
+		params = self._OrderParams(symbol, side, orderType, quantity, price)
+		self.signRequest(params)   # Request needs to be signed by creditential info to be valid
+
+		return await self._apost(self._OrderUrl(test), params, self.headers)
+
+#%%
+	async def CancelOrder(self, symbol:str, orderId:str):
+		"""	Cancels the order on a symbol based on orderId """
+		params = self._SignedParams(dict(symbol=symbol, orderId=orderId))
+
+		return await self._adelete(self.base + self.endpoints['order'], params, self.headers)
+
+#%%
+	async def GetOrderInfo(self, symbol:str, orderId:str):
+		""" Gets info about an order on a symbol based on orderId """
+		params = self._SignedParams(dict(symbol=symbol, origClientOrderId=orderId))
+
+		return await self._aget(self.base + self.endpoints['order'], params, self.headers)
+
+#%%
+async def Main():
+
+	symbols = ['BTCUSDT', 'ETHUSDT', 'BNBUSDT', 'LTCUSDT']
+	exchange = AsyncBinance('credentials.txt')
+
+	# All the candles are downloaded concurrently from one thread
+	dfs = await asyncio.gather(*[exchange.GetSymbolKlines(symbol, '5m', 1000) for symbol in symbols])
+	tickers = await asyncio.gather(*[exchange.Get24hrTicker(symbol) for symbol in symbols])
+	await exchange.Close()
+
+	return dfs, tickers
+
+#%%
+if __name__ == '__main__':
+	dfs, tickers = asyncio.run(Main())
@@ -0,0 +1,251 @@
+import time
+import numpy as np
+import pandas as pd
+
+from Strategies import GetSignals
+
+# Backtester.py simulates a bot on past candles (TradingModel.df or any candles dataframe) with the same
+# orders as BotRunner : on a signal, a limit buy at 0.99 * close, once filled a limit sell at profit_target
+# times the buy price, and one trade at a time on the pair. Signals come from the vectorized form of the
+# strategy and the fills are found with array searches, the only Python loop being over the trades.
+
+#%%
+def _FirstCrossing(values:np.ndarray, start:int, level:float, below:bool) -> int:
+	""" Returns the first index from start where values is at or below level (at or above if not below),
+	-1 if there is none. Searches windows doubling in size, so the work is proportional to the distance """
+	size = 256
+	while start < len(values):
+		window = values[start:start + size]
+		hits = window <= level if below else window >= level
+		k = int(hits.argmax())
+		if hits[k]:
+			return start + k
+		start += size
+		size *= 2
+
+	return -1
+
+#%%
+def OrderPrices(close:np.ndarray, profit_target:float, trade_allocation:float, rules=None):
+	""" Returns the buy prices, take profit prices and quantities of the orders BotRunner places on candles
+	closing at close, and whether they follow the trading rules of the symbol (when given), all at once """
+	close = np.asarray(close, dtype=np.float64)
+	buy_prices = close * 0.99
+	take_profit_prices = buy_prices * profit_target
+	with np.errstate(divide='ignore', invalid='ignore'):
+		quantities = trade_allocation / buy_prices
+	valid = buy_prices > 0
+
+	if rules is not None:
+		buy_prices = rules.RoundPrices(buy_prices)
+		take_profit_prices = rules.RoundPrices(buy_prices * profit_target, round_up=True)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			quantities = rules.RoundQuantities(trade_allocation / buy_prices)
+		valid &= rules.AreValid(buy_prices, quantities)
+
+	return buy_prices, take_profit_prices, quantities, valid
+
+#%%
+class Backtester:
+
+	def __init__(self, df, strategy, profit_target:float=1.012, trade_allocation:float=100, fee:float=0.001,
+		initial_balance:float=1000, rules=None):
+		self.df = df   # Candles with time, open, high, low, close, like TradingModel.df
+		self.strategy = strategy   # Function of strategies_dict
+		self.profit_target = profit_target   # Sell price relative to the buy price, as bot_params['profit_target']
+		self.trade_allocation = trade_allocation   # Quote spent on each trade, as bot_params['trade_allocation']
+		self.fee = fee   # Fee rate of the exchange on each order (limit orders pay the maker fee), charged in quote
+		self.initial_balance = initial_balance   # Quote balance of the bot at the start
+		self.rules = rules   # SymbolRules of the symbol, prices and quantities are rounded as the bot does when given
+
+#%%
+	def Orders(self, signals:np.ndarray):
+		""" OrderPrices on all the candles, valid only where the strategy gives a signal """
+		buy_prices, take_profit_prices, quantities, valid = OrderPrices(self.df['close'], self.profit_target, self.trade_allocation, self.rules)
+
+		return buy_prices, take_profit_prices, quantities, valid & ~np.isnan(signals)
+
+#%%
+	def Run(self, state:dict=None) -> dict:
+		""" Simulates the bot on all the candles and returns its trades, equity curve, drawdown and fees.
+		Orders are placed at the close of the signal candle and fill from the next candle on, when its low
+		reaches the buy price (its high the sell price). An exit is placed once its entry is filled.
+		state (results['state'] of a backtest on the first candles of df) resumes that backtest where it stopped """
+		df = self.df
+		n = len(df)
+		low = df['low'].to_numpy(dtype=np.float64)
+		high = df['high'].to_numpy(dtype=np.float64)
+		close = df['close'].to_numpy(dtype=np.float64)
+
+		signals = GetSignals(self.strategy, df)
+		buy_prices, take_profit_prices, quantities, valid = self.Orders(signals)
+		candidates = np.flatnonzero(valid)   # Candles where the bot would place an order if the pair is free
+
+		state = state if state is not None else dict(trades=[], cash=self.initial_balance, free_from=0, pending=None, searched=0)
+		trades = list(state['trades'])   # (signal, entry, exit) indices of the closed trades
+		cash = state['cash']
+		free_from = state['free_from']   # First candle on which the pair can take a new order
+		pending = state['pending']   # (signal, entry) of the trade not closed yet, entry -1 while not filled
+		searched = state['searched']   # First candle not searched yet for the fill of the pending order
+		while True:
+			if pending is None:
+				k = np.searchsorted(candidates, free_from)
+				if k >= len(candidates):
+					break
+
+				i = int(candidates[k])
+				cost = buy_prices[i] * quantities[i] * (1 + self.fee)
+				if cost > cash:   # Not enough balance, the bot skips the signal
+					free_from = i + 1
+					continue
+				pending, searched = (i, -1), i + 1
+
+			i, entry = pending
+			if entry < 0:
+				entry = _FirstCrossing(low, searched, buy_prices[i], below=True)
+				if entry < 0:   # Buy order still open at the end
+					searched = n
+					break
+				pending, searched = (i, entry), entry + 1
+
+			exit = _FirstCrossing(high, searched, take_profit_prices[i], below=False)
+			if exit < 0:   # Sell order still open at the end
+				searched = n
+				break
+
+			trades.append((i, entry, exit))
+			cash += (take_profit_prices[i] * (1 - self.fee) - buy_prices[i] * (1 + self.fee)) * quantities[i]
+			free_from = exit + 1   # The exit is seen at the end of its candle, signals are checked on the next ones
+			pending = None
+
+		results = self.Report(trades + ([(pending[0], pending[1], -1)] if pending is not None else []), close, buy_prices, take_profit_prices, quantities)
+		results['state'] = dict(trades=trades, cash=cash, free_from=free_from, pending=pending, searched=searched)
+
+		return results
+
+#%%
+	def Report(self, trades:list, close:np.ndarray, buy_prices:np.ndarray, take_profit_prices:np.ndarray, quantities:np.ndarray) -> dict:
+		""" Builds the trades dataframe and the equity curve (balance plus the position at the close price) """
+		n = len(close)
+		indices = np.array(trades, dtype=np.int64).reshape(-1, 3)
+		signal, entry, exit = indices.T
+		filled = entry >= 0
+		closed = exit >= 0
+
+		buy_price, sell_price, quantity = buy_prices[signal], take_profit_prices[signal], quantities[signal]
+		entry_fees = np.where(filled, buy_price * quantity * self.fee, 0.)
+		exit_fees = np.where(closed, sell_price * quantity * self.fee, 0.)
+
+		# Balance and position change only on the candles where orders fill
+		cash_changes = np.zeros(n)
+		position_changes = np.zeros(n)
+		np.add.at(cash_changes, entry[filled], -buy_price[filled] * quantity[filled] - entry_fees[filled])
+		np.add.at(position_changes, entry[filled], quantity[filled])
+		np.add.at(cash_changes, exit[closed], sell_price[closed] * quantity[closed] - exit_fees[closed])
+		np.add.at(position_changes, exit[closed], -quantity[closed])
+
+		equity = self.initial_balance + np.cumsum(cash_changes) + np.cumsum(position_changes) * close
+		drawdown = equity / np.maximum.accumulate(equity) - 1
+
+		times = self.df['time'].to_numpy()
+		trades_df = pd.DataFrame(dict(
+			signal_time = times[signal],
+			entry_time = np.where(filled, times[entry], np.nan),
+			exit_time = np.where(closed, times[exit], np.nan),
+			buy_price = buy_price,
+			sell_price = sell_price,
+			quantity = quantity,
+			fees = entry_fees + exit_fees,
+			profit = np.where(closed, (sell_price - buy_price) * quantity - entry_fees - exit_fees, np.nan)))
+
+		return dict(
+			trades = trades_df,
+			equity = equity,
+			drawdown = drawdown,
+			max_drawdown = float(drawdown.min()) if n > 0 else 0.,
+			fees = float(trades_df['fees'].sum()),
+			profit = float(equity[-1] - self.initial_balance) if n > 0 else 0.,
+			closed_trades = int(closed.sum()),
+			win_rate = float((trades_df['profit'] > 0).sum() / max(closed.sum(), 1)),
+			open_trades = int((~closed).sum()))
+
+#%%
+	def Signals(self, results:dict):
+		""" Returns the buy and sell signals of the trades, as TradingModel.plotData takes them """
+		trades = results['trades']
+		filled = trades[~trades['entry_time'].isna()]
+		closed = trades[~trades['exit_time'].isna()]
+
+		return list(zip(filled['entry_time'], filled['buy_price'])), list(zip(closed['exit_time'], closed['sell_price']))
+
+#%%
+def _LoopBacktest(backtester:Backtester) -> list:
+	""" Same simulation as Backtester.Run, candle by candle. Returns the (signal, entry, exit) indices of the trades """
+	df = backtester.df
+	low, high = df['low'].to_numpy(), df['high'].to_numpy()
+	signals = GetSignals(backtester.strategy, df)
+	buy_prices, take_profit_prices, quantities, valid = backtester.Orders(signals)
+
+	trades = []
+	cash = backtester.initial_balance
+	order = None   # [signal, entry, exit] of the current trade
+	for i in range(len(df)):
+		if order is not None and order[1] < 0 and low[i] <= buy_prices[order[0]]:
+			order[1] = i
+		elif order is not None and order[1] >= 0 and high[i] >= take_profit_prices[order[0]]:
+			order[2] = i
+			s = order[0]
+			cash += (take_profit_prices[s] * (1 - backtester.fee) - buy_prices[s] * (1 + backtester.fee)) * quantities[s]
+			trades.append(tuple(order))
+			order = None
+			continue
+
+		if order is None and valid[i] and buy_prices[i] * quantities[i] * (1 + backtester.fee) <= cash:
+			order = [i, -1, -1]
+
+	if order is not None:
+		trades.append(tuple(order))
+
+	return trades
+
+#%%
+def Main():
+
+	from Strategies import strategies_dict
+
+	# 1M candles of 1m (about two years), cycles with noise so that all the strategies trade often
+	n = 1000000
+	t = np.arange(n)
+	close = 100 * np.exp(0.1 * np.sin(t / 800) + 0.05 * np.sin(t / 130) + np.random.normal(0, 0.01, n))
+	spread = np.abs(np.random.normal(0, 0.002, n))
+	df = pd.DataFrame(dict(time=np.arange(n) * 60000., open=np.roll(close, 1), high=close * (1 + spread),
+		low=close * (1 - spread), close=close, volume=1.))
+	df.loc[0, 'open'] = close[0]
+
+	for name, strategy in strategies_dict.items():
+		frame = df.copy()
+		start = time.perf_counter()
+		backtester = Backtester(frame, strategy, profit_target=1.012)
+		results = backtester.Run()
+		elapsed = time.perf_counter() - start
+		print(name, ":", round(elapsed, 2), "s,", results['closed_trades'], "trades,", results['open_trades'], "open, profit",
+			round(results['profit'], 2), ", fees", round(results['fees'], 2), ", max drawdown", round(results['max_drawdown'] * 100, 2), "%")
+
+		# Same trades as the simulation candle by candle, on the first candles
+		small = Backtester(frame.iloc[:20000].reset_index(drop=True), strategy, profit_target=1.012)
+		fast = small.Run()['trades']
+		looped = _LoopBacktest(small)
+		times = small.df['time'].to_numpy()
+		same = len(looped) == len(fast) and all(
+			times[s] == fast['signal_time'][k] and (e < 0 or times[e] == fast['entry_time'][k]) and (x < 0 or times[x] == fast['exit_time'][k])
+			for k, (s, e, x) in enumerate(looped))
+		print("    same trades as candle by candle:", same)
+
+		# Resuming the backtest of the first half on all the candles gives the trades of a single run
+		half = Backtester(small.df.iloc[:10000].copy(), strategy, profit_target=1.012).Run()
+		resumed = Backtester(small.df.copy(), strategy, profit_target=1.012).Run(state=half['state'])
+		assert resumed['state'] == small.Run()['state'] and resumed['trades'].equals(fast), "resumed backtest differs"
+
+#%%
+if __name__ == '__main__':
+	Main()
@@ -1,13 +1,23 @@
 import requests
-import json
+import threading
 import decimal
 import hmac
 import time
 import pandas as pd
 import hashlib
 from decimal import Decimal
+from multiprocessing.pool import ThreadPool as Pool
+from functools import partial
+from requests.adapters import HTTPAdapter
+from CandleStore import CandleStore
+from RateLimiter import RateLimiter
+from SymbolRules import SymbolRules
+from KlineParser import KlinesToDataFrame, loads
+
+class BinanceCommon:
+	""" Urls, signing and parsing of the requests, and the state shared by the synchronous client (Binance)
+	and the asynchronous one (AsyncBinance), which send the requests their own way """
 
-class Binance:
 	# Order Status
 	ORDER_STATUS_NEW = 'NEW'
 	ORDER_STATUS_PARTIALLY_FILLED = 'PARTIALLY_FILLED'
@@ -33,19 +43,27 @@ class Binance:
 	# Intervals of data
 	KLINE_INTERVALS = ['1m', '3m', '5m', '15m', '30m', '1h', '2h', '4h', '6h', '8h', '12h', '1d', '3d', '1w', '1M']
 
-	def __init__(self, credentials='credentials.txt'):
+	# Length of the intervals in milliseconds ('1M' counts the shortest month so that pages overlap rather than leave gaps)
+	KLINE_INTERVALS_MS = {
+		'1m': 60000, '3m': 180000, '5m': 300000, '15m': 900000, '30m': 1800000,
+		'1h': 3600000, '2h': 7200000, '4h': 14400000, '6h': 21600000, '8h': 28800000, '12h': 43200000,
+		'1d': 86400000, '3d': 259200000, '1w': 604800000, '1M': 2419200000}
+
+	def __init__(self, credentials='credentials.txt', timeout:float=10, weight_limit:int=6000, exchange_info_ttl:float=3600):
 		self.base = 'https://api.binance.com'   # Base of any API request with Binance
 
 		self.endpoints = {
 			"order": '/api/v3/order',   # Send in a new order.
 			"testOrder": '/api/v3/order/test',   # Test new order creation and signature/recvWindow long. Creates and validates a new order but does not send it into the matching engine.
 			"allOrders": '/api/v3/allOrders',   # Get all account orders; active, canceled, or filled.
+			"openOrders": '/api/v3/openOrders',   # Get all open orders on a symbol. Careful when accessing this with no symbol.
 			"klines": '/api/v3/klines',   # Kline/candlestick bars for a symbol. Klines are uniquely identified by their open time.
 			"exchangeInfo": '/api/v3/exchangeInfo',   # Current exchange trading rules and symbol information
 			"24hrTicker" : '/api/v3/ticker/24hr',   # 24 hour rolling window price change statistics. Careful when accessing this with no symbol.
 			"averagePrice" : '/api/v3/avgPrice',   # Current average price for a symbol.
 			"orderBook" : '/api/v3/depth',   # Get current Orderbook data.
-			"account" : '/api/v3/account'   # Get current account information.
+			"account" : '/api/v3/account',   # Get current account information.
+			"time" : '/api/v3/time'   # Test connectivity to the Rest API and get the current server time.
 		}   # API requests endpoints used
 
 		f = open(credentials, "r")   # Read the creditential file (anonymous)
@@ -54,17 +72,224 @@ class Binance:
 
 		self.headers = {"X-MBX-APIKEY": self.binance_keys['api_key']}
 
+		self.timeout = timeout   # Seconds to wait for an answer of the exchange before giving up
+		self.requests_sent = 0   # Number of requests sent through the session (to compare with the number of connections opened)
+		self.stats_lock = threading.Lock()
+
+		self.rate_limiter = RateLimiter(self.endpoints, weight_limit)   # Requests wait instead of going over the weight allowed per minute
+
+		self.exchange_info = dict()   # Data of every symbol from exchangeInfo, indexed by symbol
+		self.exchange_info_time = 0   # When exchangeInfo was downloaded
+		self.exchange_info_ttl = exchange_info_ttl   # Seconds before exchangeInfo is downloaded again
+		self.symbol_rules = dict()   # SymbolRules of the symbols already traded, built from exchangeInfo
+
+#%%
+	def _ParseResponse(self, url, text) -> dict:
+		""" Converts the answer of the exchange to a dictionnary (shared by the synchronous and asynchronous clients) """
+		data = loads(text)
+		if isinstance(data, dict):   # Some endpoints answer with a list
+			data['url'] = url
+
+		return data
+
+#%%
+	def _ErrorResponse(self, url, e) -> dict:
+		""" Returns the dictionnary describing a request that failed """
+		print("Exception occured when trying to access "+url)
+		print(e)
+
+		return {'code': '-1', 'url':url, 'msg': e}
+
+#%%
+	def InvalidateExchangeInfo(self):
+		""" Forces the next access to exchangeInfo to download it again """
+		self.exchange_info_time = 0
+
+#%%
+	def _ExchangeInfoExpired(self) -> bool:
+		return time.time() - self.exchange_info_time > self.exchange_info_ttl
+
+#%%
+	def _SetExchangeInfo(self, data:dict):
+		""" Indexes the symbols of exchangeInfo, the previous ones are kept if the request failed """
+		if data.__contains__('code'):
+			return
+
+		self.exchange_info = {pair['symbol']: pair for pair in data['symbols']}
+		self.exchange_info_time = time.time()
+		self.symbol_rules = dict()
+
+#%%
+	def _TradingSymbols(self, exchange_info:dict, symbols:list=None):
+		""" Returns the data of the symbols which are tradable (all of them if symbols is None) """
+		if symbols is None:
+			symbols = exchange_info.keys()
+		elif isinstance(symbols, str):
+			symbols = [symbols]
+
+		symbols_list = []
+		for symbol in symbols:
+			pair = exchange_info.get(symbol, None)
+			if pair is not None and pair['status'] == 'TRADING':   # There are pairs available but not 'tradable'
+				symbols_list.append(pair)
+
+		return symbols_list   # return pairs with the quoteAsset we are looking for
+
+#%%
+	def _PageEndTimes(self, interval:str, limit:int, end_time=False) -> list:
+		""" Returns the end time of every page of 1000 candles needed to get limit candles """
+		if not end_time:
+			end_time = int(round(time.time()*1000))   # Pages are counted backwards from the present moment
+
+		pages = -(-limit // 1000)   # Number of requests needed to get all the historical data required
+		page_span = 1000 * self.KLINE_INTERVALS_MS[interval]   # Time covered by a page of 1000 candles
+
+		return [int(end_time) - page * page_span for page in range(pages)]   # From the most recent page to the oldest one
+
+#%%
+	def _JoinPages(self, dfs:list, limit:int):
+		""" Joins pages of candles (most recent first) into one dataframe of the limit most recent candles """
+		df = pd.concat(dfs[::-1], ignore_index=True)   # Oldest page first
+		df = df.drop_duplicates(subset='time', keep='last')   # A candle can be returned by two pages at their edges
+		df = df.sort_values('time').tail(limit).reset_index(drop=True)   # Keep only the limit most recent candles
+
+		return df
+
+#%%
+	def _KlinesUrl(self, symbol:str, interval:str, limit:int=1000, end_time=False):
+		""" Returns the url requesting limit candles of a symbol (1000 at most) """
+		params = '?&symbol='+symbol+'&interval='+interval+'&limit='+str(limit)   # Define the quote necessary for the request
+		if end_time:
+			params = params + '&endTime=' + str(int(end_time))   # Update the quote if we have a special end_time
+
+		return self.base + self.endpoints['klines'] + params   # Define the url request (with the param/quote)
+
+#%%
+	def _ParseKlines(self, raw, symbol:str=None, interval:str=None):
+		""" Converts the candles sent by the exchange (raw bytes of the answer) to a dataframe """
+		return KlinesToDataFrame(raw, symbol, interval)
+
+#%%
+	def _OrderParams(self, symbol:str, side:str, orderType:str, quantity:float=0, price:float=0) -> dict:
+		""" Returns the (unsigned) params of a new order """
+		params = {
+			'symbol': symbol,
+			'side': side,   # BUY or SELL
+			'type': orderType,   # MARKET, LIMIT, STOP LOSS etc
+			'quantity': quantity,
+			'timestamp': int(round(time.time()*1000)),   # timestamp (millisecond) is the time when the request was created and sent
+			'recvWindow': 60000   # recvWindow specify the number of milliseconds after timestamp the request is valid for (60000 max)
+		}
+		if orderType != 'MARKET':
+			params['timeInForce'] = 'GTC'   # GTC (GoodTillCancelled) : An order will be on the book unless the order is canceled
+			params['price'] = Binance.floatToString(price)
+
+		return params
+
+#%%
+	def _OrderUrl(self, test:bool):
+		if test: 
+			return self.base + self.endpoints['testOrder']   # url to test new order creation and signature/recvWindow long. Creates and validates a new order but does not send it into the matching engine.
+		else:
+			return self.base + self.endpoints['order']   # url to send in a new order.
+
+#%%
+	def _SignedParams(self, params:dict) -> dict:
+		""" Adds the timestamp and recvWindow to the params of a request, then signs them """
+		params['timestamp'] = int(round(time.time()*1000))   # timestamp (millisecond) is the time when the request was created and sent
+		params['recvWindow'] = 60000   # recvWindow specify the number of milliseconds after timestamp the request is valid for (60000 max)
+		self.signRequest(params)   # Request needs to be signed by creditential info to be valid
+
+		return params
+
+#%%
+	def signRequest(self, params:dict):
+		""" Signs the request to the Binance API """
+		query_string = '&'.join(["{}={}".format(d, params[d]) for d in params])
+		signature = hmac.new(self.binance_keys['secret_key'].encode('utf-8'), query_string.encode('utf-8'), hashlib.sha256)
+		params['signature'] = signature.hexdigest()
+
+#%%
+	@classmethod
+	def floatToString(cls, f:float):
+		""" Converts the given float to a string, without resorting to the scientific notation """
+		ctx = decimal.Context()
+		ctx.prec = 12
+		d1 = ctx.create_decimal(repr(f))
+
+		return format(d1, 'f')
+
+#%%
+	@classmethod
+	def get10Factor(cls, num):
+		""" Returns the number of 0s before the first non-0 digit of a number 
+		(if |num| is < than 1) or negative the number of digits between the first 
+		integer digit and the last, (if |num| >= 1) 
+		   |get10Factor(0.00000164763) = 6
+		   |get10Factor(1600623.3) = -6	"""
+		p = 0
+		for i in range(-20, 20):
+			if num == num % 10**i:
+				p = -(i - 1)
+				break
+
+		return p
+
+#%%
+	@classmethod
+	def RoundToValidPrice(cls, symbol_data, desired_price, round_up:bool=False) -> Decimal:
+		""" Returns the price of a symbol we can buy, closest to desiredPrice
+		(prefer the SymbolRules of GetSymbolRules, which parse the filters only once) """
+		return SymbolRules(symbol_data).RoundPrice(desired_price, round_up)
+
+#%%
+	@classmethod
+	def RoundToValidQuantity(cls, symbol_data, desired_quantity, round_up:bool=False) -> Decimal:
+		""" Returns the minimum quantity of a symbol we can buy,
+		closest to desiredPrice (prefer the SymbolRules of GetSymbolRules) """
+		return SymbolRules(symbol_data).RoundQuantity(desired_quantity, round_up)
+
+#%%
+class Binance(BinanceCommon):
+
+	def __init__(self, credentials='credentials.txt', pool_size:int=10, timeout:float=10, candles_dir=None, weight_limit:int=6000, exchange_info_ttl:float=3600, page_workers:int=8, pool_connections:int=4):
+		BinanceCommon.__init__(self, credentials, timeout, weight_limit, exchange_info_ttl)
+
+		self.session = requests.Session()   # Connections are kept alive in the session and reused by every request
+		adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_size, pool_block=True)   # pool_size connections for each of pool_connections hosts, threads wait for a free one instead of opening throwaway connections
+		self.session.mount('https://', adapter)
+		self.session.mount('http://', adapter)
+
+		self.exchange_info_lock = threading.Lock()   # Threads asking for exchangeInfo at the same time wait for one download
+
+		self.page_workers = page_workers   # Threads downloading the pages of candles of GetSymbolKlinesExtra
+		self.page_pool = None   # Created by the first request of more than 1000 candles, kept until Close
+		self.page_pool_lock = threading.Lock()
+
+		self.candle_store = None   # Candles already downloaded are kept on the disk, in candles_dir (no store if None)
+		if candles_dir:
+			self.candle_store = CandleStore(candles_dir)
+
+#%%
+	def _request(self, method:str, url, params=None, headers=None):
+		""" Sends a request through the pooled session """
+		endpoint, weight, priority = self.rate_limiter.RequestWeight(method, url, params)
+		self.rate_limiter.Acquire(weight, priority)   # Waits if the request would go over the weight limit
+		response = self.session.request(method, url, params=params, headers=headers, timeout=self.timeout)
+		self.rate_limiter.Update(response.status_code, response.headers)   # Weight used as counted by the exchange
+		with self.stats_lock:
+			self.requests_sent += 1
+
+		return response
+
 #%%
 	def _get(self, url, params=None, headers=None) -> dict:
 		""" Makes a Get Request """
 		try: 
-			response = requests.get(url, params=params, headers=headers)
-			data = json.loads(response.text)
-			data['url'] = url
+			response = self._request('GET', url, params=params, headers=headers)
+			data = self._ParseResponse(url, response.text)
 		except Exception as e:
-			print("Exception occured when trying to access "+url)
-			print(e)
-			data = {'code': '-1', 'url':url, 'msg': e}
+			data = self._ErrorResponse(url, e)
 
 		return data
 
@@ -72,31 +297,96 @@ class Binance:
 	def _post(self, url, params=None, headers=None) -> dict:
 		""" Makes a Post Request """
 		try: 
-			response = requests.post(url, params=params, headers=headers)
-			data = json.loads(response.text)
-			data['url'] = url
+			response = self._request('POST', url, params=params, headers=headers)
+			data = self._ParseResponse(url, response.text)
 		except Exception as e:
-			print("Exception occured when trying to access "+url)
-			print(e)
-			data = {'code': '-1', 'url':url, 'msg': e}
+			data = self._ErrorResponse(url, e)
 
 		return data
 
+#%%
+	def _delete(self, url, params=None, headers=None) -> dict:
+		""" Makes a Delete Request """
+		try: 
+			response = self._request('DELETE', url, params=params, headers=headers)
+			data = self._ParseResponse(url, response.text)
+		except Exception as e:
+			data = self._ErrorResponse(url, e)
+
+		return data
+
+#%%
+	def GetConnectionStats(self) -> dict:
+		""" Returns the number of requests sent and of connections opened for them, as counted by the
+		connection pools of urllib3 (the pools of hosts evicted beyond pool_connections are not counted) """
+		connections = 0
+		pooled_requests = 0
+		for adapter in set(self.session.adapters.values()):
+			pools = adapter.poolmanager.pools
+			for key in pools.keys():
+				pool = pools.get(key)
+				if pool is not None:
+					connections += pool.num_connections   # Connections opened by the pool of this host
+					pooled_requests += pool.num_requests   # Requests sent through them, including the retries
+
+		with self.stats_lock:
+			requests_sent = self.requests_sent
+
+		return dict(
+			requests = requests_sent,
+			connections_opened = connections,
+			connections_reused = max(pooled_requests - connections, 0))
+
+#%%
+	def Close(self):
+		""" Closes all the connections kept alive by the session, and the threads downloading the pages of candles """
+		with self.page_pool_lock:
+			if self.page_pool is not None:
+				self.page_pool.close()
+				self.page_pool.join()
+				self.page_pool = None
+		self.session.close()
+
+#%%
+	def _PagePool(self):
+		""" Returns the pool downloading the pages of candles, created once for all the requests """
+		with self.page_pool_lock:
+			if self.page_pool is None:
+				self.page_pool = Pool(self.page_workers)
+
+			return self.page_pool
+
 #%%
 	def GetSymbolDataOfSymbols(self, symbols:list=None):
-		""" Gets All symbols which are tradable (currently) """
-		url = self.base + self.endpoints["exchangeInfo"]   # Define the url request
-		data = self._get(url)   # Call the _get function with the url to get data
-		if data.__contains__('code'):
-			return []
+		""" Gets All symbols which are tradable (currently), from the cached exchangeInfo """
+		return self._TradingSymbols(self.GetExchangeInfo(), symbols)
 
-		symbols_list = []
-		for pair in data['symbols']:
-			if pair['status'] == 'TRADING':   # There are pairs available but not 'tradable'
-				if symbols != None and pair['symbol'] in symbols:
-					symbols_list.append(pair)
+#%%
+	def GetExchangeInfo(self) -> dict:
+		""" Returns the data of every symbol indexed by symbol. exchangeInfo is several MB,
+		so it is downloaded again only once exchange_info_ttl seconds have passed """
+		with self.exchange_info_lock:   # Threads asking at the same time wait for one download
+			if self._ExchangeInfoExpired():
+				url = self.base + self.endpoints["exchangeInfo"]   # Define the url request
+				self._SetExchangeInfo(self._get(url))   # Call the _get function with the url to get data
 
-		return symbols_list   # return pairs with the quoteAsset we are looking for
+			return self.exchange_info
+
+#%%
+	def GetSymbolData(self, symbol:str):
+		""" Returns the data of one symbol (None if it doesn't exist) """
+		return self.GetExchangeInfo().get(symbol, None)
+
+#%%
+	def GetSymbolRules(self, symbol:str) -> SymbolRules:
+		""" Returns the trading rules of a symbol, parsed only once from exchangeInfo """
+		exchange_info = self.GetExchangeInfo()   # Rules are dropped when exchangeInfo is downloaded again
+		rules = self.symbol_rules.get(symbol, None)
+		if rules is None and symbol in exchange_info:
+			rules = SymbolRules(exchange_info[symbol])
+			self.symbol_rules[symbol] = rules
+
+		return rules
 
 #%%
 	def GetAccountData(self) -> dict:
@@ -110,6 +400,13 @@ class Binance:
 
 		return self._get(url, params, self.headers)
 
+#%%
+	def GetServerTime(self) -> dict:
+		""" Gets the time of the exchange in milliseconds ({'serverTime': ...}) """
+		url = self.base + self.endpoints['time']
+
+		return self._get(url)
+
 #%%
 	def Get24hrTicker(self, symbol:str):
 		url = self.base + self.endpoints['24hrTicker'] + "?symbol="+symbol   # Define the url request
@@ -117,32 +414,45 @@ class Binance:
 		return self._get(url)   # Return a bunch of informations about the 24h ticker on the requested symbol
 
 #%%
-	def GetSymbolKlinesExtra(self, symbol:str, interval:str, limit:int=1000, end_time=False):
-		# Basicaly, we are calling the GetSymbolKlines as many times as needed
-		# in order to get all the historical data required (based on the limit parameter)
-		# and finally, results get merged into one long dataframe.
-		repeat_rounds = 0
-		if limit > 1000:   # We can get only 1000 candles per request
-			repeat_rounds = int(limit/1000)   # So we have to define the number of requests needed to get all the historical data required
-
-		initial_limit = limit % 1000   # Residual
-		if initial_limit == 0:   # To avoid launching an empty request
-			initial_limit = 1000
-
-		# First, we get the last initial_limit candles, starting FROM end_time and going
-		# backwards (or starting in the present moment, if end_time is False)
-		df = self.GetSymbolKlines(symbol, interval, limit=initial_limit, end_time=end_time)
-		while repeat_rounds > 0:
-			# Then, for every other 1000 candles, we get them, but starting at the beginning
-			# of the previously received candles.
-			df2 = self.GetSymbolKlines(symbol, interval, limit=1000, end_time=df['time'][0])
-			df = df2.append(df, ignore_index = True)
-			repeat_rounds -= 1
+	def Get24hrTickers(self):
+		""" Gets the 24h tickers of all the symbols in one request (heavier than one symbol, lighter than a few dozens) """
+		url = self.base + self.endpoints['24hrTicker']
 
-		return df
+		return self._get(url)   # List of tickers (a dict if something went wrong)
 
 #%%
-	def GetSymbolKlines(self, symbol:str, interval:str, limit:int=1000, end_time=False):
+	def GetOrderBook(self, symbol:str, limit:int=100):
+		""" Gets the bids and asks of a symbol, limit levels on each side """
+		url = self.base + self.endpoints['orderBook'] + "?symbol="+symbol+"&limit="+str(limit)   # Define the url request
+
+		return self._get(url)   # Return lastUpdateId, bids and asks as lists of [price, quantity]
+
+#%%
+	def GetSymbolKlinesExtra(self, symbol:str, interval:str, limit:int=1000, end_time=False, max_workers:int=None, use_store:bool=True):
+		if use_store and self.candle_store is not None:   # Read from the disk, only the missing candles are downloaded
+			download = lambda l, e: self.GetSymbolKlinesExtra(symbol, interval, l, e, max_workers, use_store=False)
+			df = self.candle_store.GetKlines(download, symbol, interval, self.KLINE_INTERVALS_MS[interval], limit, end_time)
+			df.attrs.update(symbol=symbol, interval=interval)
+			return df
+
+		# We can get only 1000 candles per request, so the window is cut into pages of 1000 candles.
+		# The end time of every page is computed up front from the interval length, which lets us
+		# download all the pages concurrently (at most max_workers at a time, page_workers if None) and join them only once.
+		page_end_times = self._PageEndTimes(interval, limit, end_time)
+		if len(page_end_times) == 0:   # limit <= 0, nothing to download
+			return self._ParseKlines(b'[]', symbol, interval)
+
+		pool = self._PagePool()
+		download = partial(self.GetSymbolKlines, symbol, interval, 1000, use_store=False)
+		step = max_workers if max_workers else len(page_end_times)
+		dfs = []
+		for i in range(0, len(page_end_times), step):
+			dfs.extend(pool.map(download, page_end_times[i:i+step]))
+
+		return self._JoinPages(dfs, limit)
+
+#%%
+	def GetSymbolKlines(self, symbol:str, interval:str, limit:int=1000, end_time=False, use_store:bool=True):
 		"""	Gets trading data for one symbol 
 		
 		Parameters
@@ -154,26 +464,23 @@ class Binance:
 				hours        '1h' '2h' '4h' '6h' '8h' '12h'
 				days         '1d' '3d'
 				weeks        '1w'
-				months       '1M' """
+				months       '1M' 
 
-		if limit > 1000:   # We can get only 1000 candles per request
-			return self.GetSymbolKlinesExtra(symbol, interval, limit, end_time)   # So we use a function that decimate our request in smaller ones
+			use_store bool:    Read the candles from the disk and download only the missing ones """
 
-		params = '?&symbol='+symbol+'&interval='+interval+'&limit='+str(limit)   # Define the quote necessary for the request
-		if end_time:
-			params = params + '&endTime=' + str(int(end_time))   # Update the quote if we have a special end_time
+		if limit > 1000:   # We can get only 1000 candles per request
+			return self.GetSymbolKlinesExtra(symbol, interval, limit, end_time, use_store=use_store)   # So we use a function that decimate our request in smaller ones
 
-		url = self.base + self.endpoints['klines'] + params   # Define the url request (with the param/quote)
+		if use_store and self.candle_store is not None:   # Read from the disk, only the missing candles are downloaded
+			download = lambda l, e: self.GetSymbolKlines(symbol, interval, l, e, use_store=False)
+			df = self.candle_store.GetKlines(download, symbol, interval, self.KLINE_INTERVALS_MS[interval], limit, end_time)
+			df.attrs.update(symbol=symbol, interval=interval)
+			return df
 
-		data = requests.get(url)   # download data
-		df = pd.DataFrame.from_dict(json.loads(data.text))   # Convert data to pd dataframe using the json dictionnary
-		df = df.drop(range(6, 12), axis=1)   # Clean-up the dataframe by removing data we're not interested in
-		df.columns = ['time', 'open', 'high', 'low', 'close', 'volume']   # rename columns
-		for col in df.columns:
-			df[col] = df[col].astype(float)   # transform values from strings to floats
-		df['date'] = pd.to_datetime(df['time'] * 1000000, infer_datetime_format=True)   # convert the time data to a date data
+		url = self._KlinesUrl(symbol, interval, limit, end_time)
+		data = self._request('GET', url)   # download data
 
-		return df
+		return self._ParseKlines(data.content, symbol, interval)
 
 #%%
 	def PlaceOrderFromDict(self, params, test:bool=False):
@@ -182,12 +489,7 @@ class Binance:
 		params['recvWindow'] = 60000   # recvWindow specify the number of milliseconds after timestamp the request is valid for (60000 max)
 		self.signRequest(params)   # Request needs to be signed by creditential info to be valid
 
-		if test: 
-			url = self.base + self.endpoints['testOrder']   # testOrder url
-		else:
-			url = self.base + self.endpoints['order']   # Order url
-
-		return self._post(url, params, self.headers)
+		return self._post(self._OrderUrl(test), params, self.headers)
 
 #%%
 	def PlaceOrder(self, symbol:str, side:str, orderType:str, quantity:float=0, price:float=0, test:bool=True):
@@ -198,25 +500,10 @@ class Binance:
 			side str:          The side of the order 'BUY' or 'SELL'
 			type str:          The type, 'LIMIT', 'MARKET', 'STOP_LOSS'
 			quantity float:    ..... """
-		params = {
-			'symbol': symbol,
-			'side': side,   # BUY or SELL
-			'type': orderType,   # MARKET, LIMIT, STOP LOSS etc
-			'quantity': quantity,
-			'timestamp': int(round(time.time()*1000)),   # timestamp (millisecond) is the time when the request was created and sent
-			'recvWindow': 60000   # recvWindow specify the number of milliseconds after timestamp the request is valid for (60000 max)
-		}
-		if orderType != 'MARKET':
-			params['timeInForce'] = 'GTC'   # GTC (GoodTillCancelled) : An order will be on the book unless the order is canceled
-			params['price'] = Binance.floatToString(price)
+		params = self._OrderParams(symbol, side, orderType, quantity, price)
 		self.signRequest(params)   # Request needs to be signed by creditential info to be valid
 
-		if test: 
-			url = self.base + self.endpoints['testOrder']   # url to test new order creation and signature/recvWindow long. Creates and validates a new order but does not send it into the matching engine.
-		else:
-			url = self.base + self.endpoints['order']   # url to send in a new order.
-
-		return self._post(url, params=params, headers=self.headers)   # Posting the order (even if it's a test)
+		return self._post(self._OrderUrl(test), params=params, headers=self.headers)   # Posting the order (even if it's a test)
 
 #%%
 	def CancelOrder(self, symbol:str, orderId:str):
@@ -229,15 +516,8 @@ class Binance:
 		}
 		self.signRequest(params)   # Request needs to be signed by creditential info to be valid
 		url = self.base + self.endpoints['order']   # url to send in a new order.
-		try: 
-			response = requests.delete(url, params=params, headers=self.headers)   # Sending the request to cancel an order
-			data = response.text   # converting the response into a dictionnary
-		except Exception as e:   # an exception generally occure when the order is already filled
-			print("Exception occured when trying to cancel order on "+url)
-			print(e)
-			data = {'code': '-1', 'msg':e}
 
-		return json.loads(data)   # returns -in all cases- the response
+		return self._delete(url, params=params, headers=self.headers)   # returns -in all cases- the response (an error generally occurs when the order is already filled)
 
 #%%
 	def GetOrderInfo(self, symbol:str, orderId:str):
@@ -254,86 +534,22 @@ class Binance:
 		return self._get(url, params=params, headers=self.headers)   # Getting the orderInfo
 
 #%%
-	def signRequest(self, params:dict):
-		""" Signs the request to the Binance API """
-		query_string = '&'.join(["{}={}".format(d, params[d]) for d in params])
-		signature = hmac.new(self.binance_keys['secret_key'].encode('utf-8'), query_string.encode('utf-8'), hashlib.sha256)
-		params['signature'] = signature.hexdigest()
+	def GetOpenOrders(self, symbol:str=None):
+		""" Gets the open orders of a symbol, or of all symbols in one request if symbol is None """
+		params = dict(symbol=symbol) if symbol is not None else dict()
+		url = self.base + self.endpoints['openOrders']
 
-#%%
-	@classmethod
-	def floatToString(cls, f:float):
-		""" Converts the given float to a string, without resorting to the scientific notation """
-		ctx = decimal.Context()
-		ctx.prec = 12
-		d1 = ctx.create_decimal(repr(f))
-
-		return format(d1, 'f')
+		return self._get(url, params=self._SignedParams(params), headers=self.headers)   # List of orders (a dict if something went wrong)
 
 #%%
-	@classmethod
-	def get10Factor(cls, num):
-		""" Returns the number of 0s before the first non-0 digit of a number 
-		(if |num| is < than 1) or negative the number of digits between the first 
-		integer digit and the last, (if |num| >= 1) 
-		   |get10Factor(0.00000164763) = 6
-		   |get10Factor(1600623.3) = -6	"""
-		p = 0
-		for i in range(-20, 20):
-			if num == num % 10**i:
-				p = -(i - 1)
-				break
-
-		return p
-
-#%%
-	@classmethod
-	def RoundToValidPrice(cls, symbol_data, desired_price, round_up:bool=False) -> Decimal:
-		""" Returns the price of a symbol we can buy, closest to desiredPrice """
-		
-		pr_filter = {}
-		
-		for fil in symbol_data["filters"]:
-			if fil["filterType"] == "PRICE_FILTER":
-				pr_filter = fil
-				break
-		
-		if not pr_filter.keys().__contains__("tickSize"):
-			raise Exception("Couldn't find tickSize or PRICE_FILTER in symbol_data.")
-			return
-
-		round_off_number = int(cls.get10Factor((float(pr_filter["tickSize"]))))
-
-		number = round(Decimal(desired_price), round_off_number)
-		if round_up:
-			number = number + Decimal(pr_filter["tickSize"])
-
-		return number
-
-#%%
-	@classmethod
-	def RoundToValidQuantity(cls, symbol_data, desired_quantity, round_up:bool=False) -> Decimal:
-		""" Returns the minimum quantity of a symbol we can buy,
-		closest to desiredPrice """
-		
-		lot_filter = {}
-		
-		for fil in symbol_data["filters"]:
-			if fil["filterType"] == "LOT_SIZE":
-				lot_filter = fil
-				break
-		
-		if not lot_filter.keys().__contains__("stepSize"):
-			raise Exception("Couldn't find stepSize or PRICE_FILTER in symbol_data.")
-			return
-
-		round_off_number = int(cls.get10Factor((float(lot_filter["stepSize"]))))
-
-		number = round(Decimal(desired_quantity), round_off_number)
-		if round_up:
-			number = number + Decimal(lot_filter["stepSize"])
-
-		return number
+	def GetAllOrders(self, symbol:str, start_time=None, limit:int=1000):
+		""" Gets the orders (open, canceled or filled) of a symbol placed since start_time """
+		params = dict(symbol=symbol, limit=limit)
+		if start_time is not None:
+			params['startTime'] = int(start_time)
+		url = self.base + self.endpoints['allOrders']
+
+		return self._get(url, params=self._SignedParams(params), headers=self.headers)   # List of orders (a dict if something went wrong)
 
 #%%
 def Main():
@@ -1,4 +1,6 @@
 import time
+import threading
+import numpy as np
 from requests import exceptions 
 
 from uuid import uuid1
@@ -10,6 +12,12 @@ from Binance import Binance
 from multiprocessing.pool import ThreadPool as Pool
 from functools import partial
 from Database import BotDatabase
+from KlineStream import KlineStream
+from OrderBook import DepthStream
+from Universe import Universe
+from Pipeline import Pipeline
+from IndicatorPlanner import IndicatorPlanner
+from Scheduler import Scheduler
 
 from TradingModel import TradingModel
 
@@ -20,86 +28,160 @@ from Strategies import *
 #%%
 class BotRunner:
 
-	def __init__(self, sp, exchange, database):
+	def __init__(self, sp, exchange, database, kline_stream=None, depth_stream=None, universe=None, batch:bool=False,
+		workers:dict=None, queue_size:int=64, orders_every:float=10, close_delay:float=2):
 		self.sp = sp
 		self.exchange = exchange
 		self.database = database
+		self.kline_stream = kline_stream   # When given, candles are read from the streams instead of REST requests
+		self.depth_stream = depth_stream   # When given, entries are priced from the order books kept in memory
+		self.universe = universe   # When given, each bot checks only its best ranked symbols (by volume, volatility and spread)
+		self.batch = batch   # When True, the signals of all the symbols of a bot are computed at once on 2D arrays (see RunBatch)
+		self.planner = IndicatorPlanner()   # Indicators declared by the strategies of all the bots, computed once per symbol and interval
+		self.frames = None   # (symbol, interval): candles with their indicators, shared by the bots during a tick (see NewTick)
+		self.frames_lock = threading.Lock()
+		# Threads kept for the whole run : the entries go through fetch -> evaluate -> order -> persist stages
+		# connected by bounded queues (see Pipeline.py), the exits and the batch downloads use the pool
+		self.workers = dict(fetch=8, evaluate=2, order=4, persist=1, pool=4)   # Threads of each stage, persist alone keeps the database writes in order
+		self.workers.update(workers if workers is not None else dict())
+		self.pipeline = Pipeline([
+			('fetch', self.FetchStage, self.workers['fetch']),
+			('evaluate', self.EvaluateStage, self.workers['evaluate']),
+			('order', self.OrderStage, self.workers['order']),
+			('persist', self.PersistStage, self.workers['persist'])], queue_size)
+		self.pool = None
+		self.Open()
+		self.orders_every = orders_every   # Seconds between two checks of the open orders
+		self.close_delay = close_delay   # Seconds after the close of a candle before checking the signals on it
+		self.scheduler = None   # Wakes the bots at the close of the candles of their interval (see StartExecution)
+		self.symbol_offsets = dict()   # First symbol to check on the next tick for each bot, when the weight doesn't allow checking all of them
 		self.update_balance = True
 		self.ask_permission = False
 		getcontext().prec = 33
 
 #%%
-	def EntryOrder(self, bot_params, strategy_function, pairs, symbol_data):
+	def EntryParams(self, bot_params, symbol_data, df, buy):
+		""" Returns the parameters of the buy order of a signal found on the last candle of df,
+		None if the order can't be placed (trading rules, permission refused) """
 		sp = self.sp
 		exchange = self.exchange
-		database = self.database
 
-		# get dataframe & check for signal
 		symbol = symbol_data['symbol']
-		df = exchange.GetSymbolKlines(symbol, bot_params['interval'])
-		buy = strategy_function(df, len(df['close'])-1)
-
-		sp.text = "Checking signals on "+symbol
-		# if signal, place buy order
-		if buy is not False:   # if buy side is True
-			i = len(df) - 1   # len of the data available on this symbol
-			order_id = str(uuid1())   # making a unique id for the order
-			# buy at 0.4% lower than current price
-			q_qty = Decimal(bot_params['trade_allocation'])   # Defining the available qtity tradable
-
-			buy_price = exchange.RoundToValidPrice(   # Returns the price of a symbol we can buy, closest to desiredPrice
-				symbol_data = symbol_data, 
-				desired_price = Decimal(df['close'][i]) * Decimal(0.99))
-
-			quantity = exchange.RoundToValidQuantity(   # Returns the minimum quantity of a symbol we can buy, closest to desiredPrice
-				symbol_data = symbol_data, 
-				desired_quantity = q_qty / buy_price)
-
-			order_params = dict(
-				symbol = symbol,
-				side = "BUY",   # BUY or SELL
-				type = "LIMIT",   # MARKET, LIMIT, STOP LOSS etc
-				timeInForce = "GTC",   # GTC (GoodTillCancelled) : An order will be on the book unless the order is canceled
-				price = format(buy_price, 'f'),
-				quantity = format(quantity, 'f'),
-				newClientOrderId = order_id)   # Giving to the order an ID
-
-			if self.ask_permission:   # Every time the bot finds a signal, it needs our permission to buy
-
-				model = TradingModel(symbol, bot_params['interval'])   # make a trading model
-				model.df = df
-				model.plotData(buy_signals=[(df['time'][i], buy)], plot_title=symbol)   # model that we plot to give a vision of the signal
+		i = len(df) - 1   # len of the data available on this symbol
+		order_id = str(uuid1())   # making a unique id for the order
+		# buy at 0.4% lower than current price
+		q_qty = Decimal(bot_params['trade_allocation'])   # Defining the available qtity tradable
+		rules = exchange.GetSymbolRules(symbol)   # Tick size, step size, min notional... of the symbol
+
+		reference_price = Decimal(df['close'][i])
+		book = self.depth_stream.GetOrderBook(symbol) if self.depth_stream is not None else None
+		if book is not None and book.Mid() is not None:
+			reference_price = Decimal(book.Mid())   # Current price from the order book rather than the close of the candle
+
+		buy_price = rules.RoundPrice(reference_price * Decimal(0.99))   # Returns the price of a symbol we can buy, closest to desiredPrice
+		if book is not None and book.BestAsk() is not None and buy_price > Decimal(book.BestAsk()[0]):
+			buy_price = rules.RoundPrice(Decimal(book.BestAsk()[0]))   # Never pay more than the best ask
+		quantity = rules.RoundQuantity(q_qty / buy_price)   # Returns the minimum quantity of a symbol we can buy, closest to desiredPrice
+
+		if not rules.IsValid(buy_price, quantity):   # The exchange would reject the order (below min notional, ...)
+			sp.text = "Order on "+symbol+" doesn't follow the trading rules, skipping"
+			return None
+
+		order_params = dict(
+			symbol = symbol,
+			side = "BUY",   # BUY or SELL
+			type = "LIMIT",   # MARKET, LIMIT, STOP LOSS etc
+			timeInForce = "GTC",   # GTC (GoodTillCancelled) : An order will be on the book unless the order is canceled
+			price = format(buy_price, 'f'),
+			quantity = format(quantity, 'f'),
+			newClientOrderId = order_id)   # Giving to the order an ID
+
+		if self.ask_permission:   # Every time the bot finds a signal, it needs our permission to buy
+
+			model = TradingModel(symbol, bot_params['interval'])   # make a trading model
+			model.df = df
+			model.plotData(buy_signals=[(df['time'][i], buy)], plot_title=symbol)   # model that we plot to give a vision of the signal
 
-				sp.stop()   # Spinning animation stop meaning that the bot isn't running anymore
-				print(order_params)   # give the params for de permission
-				permission = input("Signal found on "+ symbol +", place order (y / n)?")   # need an answer (y or n)
-				sp.start()   # Spinning animation confirming that the bot is running
-				if permission != 'y':
-					return
+			sp.stop()   # Spinning animation stop meaning that the bot isn't running anymore
+			print(order_params)   # give the params for de permission
+			permission = input("Signal found on "+ symbol +", place order (y / n)?")   # need an answer (y or n)
+			sp.start()   # Spinning animation confirming that the bot is running
+			if permission != 'y':
+				return None
 
-			# buy from exchange
-			order_result = self.PlaceOrder(order_params, bot_params['test_run'])   # Places order on Pair based on params. Returns False if unsuccesful, or the order_info received from the exchange if succesful
+		return order_params
 
-			if order_result is not False:   # Order is a success
+#%%
+	def SaveEntry(self, bot_params, pairs, symbol_data, order_params, order_result):
+		""" Saves a buy order placed on the exchange and sets its pair on the sell side """
+		database = self.database
+		symbol = symbol_data['symbol']
+		order_id = order_params['newClientOrderId']
 
-				self.update_balance = True   # setting update_balance to True so that the Balance is refreshed
+		if order_result is not False:   # Order is a success
 
-				# Save order
-				db_order = self.OrderResultToDatabase(order_result, symbol_data, bot_params, True)   # Building the frame to save the order into the DB
-				database.SaveOrder(db_order)   # saving the order into the DB
+			self.update_balance = True   # setting update_balance to True so that the Balance is refreshed
 
-				pairs[symbol]['is_active'] = False   # setting the symbol on sell side (we can only have one trade per symbol at the time)
-				pairs[symbol]['current_order_id'] = order_id   # giving to the symbol the current order ID
+			# Save order
+			db_order = self.OrderResultToDatabase(order_result, symbol_data, bot_params, True)   # Building the frame to save the order into the DB
+			database.SaveOrder(db_order)   # saving the order into the DB
 
-				# Change pair state to inactive
-				database.UpdatePair(
-					bot=bot_params, 
-					symbol=symbol, 
-					pair=pairs[symbol]
-				)
+			pairs[symbol]['is_active'] = False   # setting the symbol on sell side (we can only have one trade per symbol at the time)
+			pairs[symbol]['current_order_id'] = order_id   # giving to the symbol the current order ID
+
+			# Change pair state to inactive
+			database.UpdatePair(
+				bot=bot_params, 
+				symbol=symbol, 
+				pair=pairs[symbol]
+			)
+
+#%%
+	def NewTick(self):
+		""" Starts a tick, the candles and indicators of each (symbol, interval) are fetched and computed once during it """
+		with self.frames_lock:
+			self.frames = dict()
+
+#%%
+	def GetFrame(self, symbol:str, interval:str, indicators:bool=True):
+		""" Returns the candles of symbol, with the indicators the bots trading it need unless indicators is False.
+		During a tick, the bots trading the same (symbol, interval) share one download and one computation,
+		each one gets its own copy """
+		key = (symbol, interval)
+		with self.frames_lock:
+			frames = self.frames
+			if frames is not None:
+				if key not in frames:
+					frames[key] = (threading.Lock(), [None, False])
+				lock, frame = frames[key]
+			else:   # Outside of a tick nothing is shared
+				lock, frame = threading.Lock(), [None, False]
+
+		with lock:   # The first bot asking for it fetches it, the others wait for it
+			if frame[0] is None:   # [candles, whether the indicators were added]
+				if self.kline_stream is not None and self.kline_stream.IsSubscribed(symbol, interval):
+					frame[0] = self.kline_stream.GetSymbolKlines(symbol, interval)   # candles kept up to date in memory by the stream
+				else:
+					frame[0] = self.exchange.GetSymbolKlines(symbol, interval)
+				if self.scheduler is not None:
+					frame[0] = self.ClosedCandles(frame[0], interval)
+			if indicators and not frame[1]:
+				self.planner.Compute(frame[0], symbol, interval)
+				frame[1] = True
+
+		return frame[0].copy()
 
 #%%
-	def ExitOrder(self, bot_params, pairs, order:dict):
+	def ClosedCandles(self, df, interval:str):
+		""" Drops the candle opened since the last close, the strategies check the candles that closed """
+		closed = df['time'] + Binance.KLINE_INTERVALS_MS[interval] <= self.scheduler.ServerTime() * 1000
+		if closed.all():
+			return df
+
+		return df[closed].reset_index(drop=True)
+
+#%%
+	def ExitOrder(self, bot_params, pairs, order:dict, exchange_order_info:dict=None):
 		# Check order has been filled, if it has, update order in database and then
 		# place a new order at target price, OCO-type if we also have stop loss enabled
 		sp = self.sp
@@ -110,7 +192,8 @@ class BotRunner:
 			return   # end
 
 		symbol = order['symbol']   # setting the symbols with orders
-		exchange_order_info = exchange.GetOrderInfo(symbol, order['id'])   # getting info on the orders
+		if exchange_order_info is None:   # not already known from ReconcileOrders
+			exchange_order_info = exchange.GetOrderInfo(symbol, order['id'])   # getting info on the orders
 
 		if not self.CheckRequestValue(exchange_order_info):   # if something went wrong
 			return 
@@ -125,14 +208,10 @@ class BotRunner:
 			if order['is_entry_order']:   # and if the order is an entry order (on buy side)
 				# place the exit order
 				order_id = str(uuid1())   # making a unique id for the order
+				rules = exchange.GetSymbolRules(symbol)   # Tick size, step size, min notional... of the symbol
 
-				sell_price = exchange.RoundToValidPrice(   # Returns the price of a symbol we can sell, closest to desiredPrice
-					symbol_data = self.all_symbol_datas[symbol], 
-					desired_price = Decimal(order['take_profit_price']))
-
-				quantity = exchange.RoundToValidQuantity(   # Returns the minimum quantity of a symbol we can sell, closest to desiredPrice
-					symbol_data = self.all_symbol_datas[symbol], 
-					desired_quantity = Decimal(order['executed_quantity']))
+				sell_price = rules.RoundPrice(Decimal(order['take_profit_price']))   # Returns the price of a symbol we can sell, closest to desiredPrice
+				quantity = rules.RoundQuantity(Decimal(order['executed_quantity']))   # Returns the minimum quantity of a symbol we can sell, closest to desiredPrice
 
 				order_params = dict(
 					symbol = symbol,
@@ -194,6 +273,54 @@ class BotRunner:
 
 		database.UpdateOrder(order)   # Update the DB
 
+#%%
+	def ReconcileOrders(self, orders:list):
+		""" Returns (order, exchange_order_info) for the open orders of the database whose
+		status changed on the exchange. The open orders of the account come in one request,
+		and the orders which left the book in one request per symbol, instead of one per order """
+		exchange = self.exchange
+
+		# Open orders of the account in one request, or symbol by symbol when that weights less
+		symbols = set(order['symbol'] for order in orders if not order['is_closed'])
+		url = exchange.base + exchange.endpoints['openOrders']
+		all_weight = exchange.rate_limiter.RequestWeight('GET', url)[1]
+		symbol_weight = exchange.rate_limiter.RequestWeight('GET', url, dict(symbol=''))[1]
+		if len(symbols) * symbol_weight < all_weight:
+			responses = [exchange.GetOpenOrders(symbol) for symbol in symbols]
+		else:
+			responses = [exchange.GetOpenOrders()]
+
+		on_book = dict()
+		for open_orders in responses:
+			if not isinstance(open_orders, list):
+				self.CheckRequestValue(open_orders)   # Something went wrong
+				return []
+			on_book.update({info['clientOrderId']: info for info in open_orders})
+
+		changed = []
+		left_book = dict()   # Orders not open anymore (filled, canceled, expired...) by symbol
+		for order in orders:
+			if order['is_closed']:
+				continue
+
+			info = on_book.get(order['id'], None)
+			if info is None:
+				left_book.setdefault(order['symbol'], []).append(order)
+			elif info['status'] != order['status'] or Decimal(info['executedQty']) != Decimal(order['executed_quantity']):
+				changed.append((order, info))   # Partially filled since the last check
+
+		for symbol, symbol_orders in left_book.items():
+			start_time = min(int(order['time']) for order in symbol_orders)   # The history starts at the oldest of these orders
+			history = exchange.GetAllOrders(symbol, start_time)
+			infos = {info['clientOrderId']: info for info in history} if isinstance(history, list) else dict()
+			for order in symbol_orders:
+				if order['id'] in infos:
+					changed.append((order, infos[order['id']]))
+				else:
+					changed.append((order, None))   # Not found in the history, ExitOrder asks for this order alone
+
+		return changed
+
 #%%
 	def PlaceOrder(self, params, test):
 		''' Places order on Pair based on params. Returns False if unsuccesful, 
@@ -242,15 +369,12 @@ class BotRunner:
 		exchange = self.exchange
 
 		order = dict()
-		if symbol_data == None:
-			symbol_data = exchange.GetSymbolDataOfSymbols([order_result['symbol']])
 		order['id'] = order_result['clientOrderId']
 		order['bot_id'] = bot_params['id']
 		order['symbol'] = order_result['symbol']
 		order['time'] = order_result['transactTime']
 		order['price'] = order_result['price']
-		order['take_profit_price'] = exchange.RoundToValidPrice(
-			symbol_data = symbol_data,
+		order['take_profit_price'] = exchange.GetSymbolRules(order_result['symbol']).RoundPrice(
 			desired_price = Decimal(order_result['price']) * Decimal(bot_params['profit_target']), 
 			round_up=True)
 		order['original_quantity'] =  Decimal(order_result['origQty'])
@@ -336,7 +460,7 @@ class BotRunner:
 			for pair in pairs:
 				symbols.append(pair['symbol'])   # from each pair extract the symbol and put it in a list
 
-			symbol_datas = exchange.GetSymbolDataOfSymbols(symbols)   # Getting information about symbols set (Tradable or not, ...)
+			symbol_datas = exchange.GetSymbolDataOfSymbols(symbols)   # Getting information about symbols set (Tradable or not, ...), exchangeInfo is downloaded only for the first bot
 			symbol_datas_dict = dict()
 			for sd in symbol_datas:
 				symbol_datas_dict[sd['symbol']] = sd   # converting symbol_datas list to a dictionnary symbol_datas_dict with symbols as items
@@ -383,9 +507,10 @@ class BotRunner:
 #%%
 	def StartExecution(self, bots):
 		""" This is the main execution loop. It has two parts : 
-			ONE - it checks all pairs for symbols, and places orders if symbolsmatch.
-			TWO - it checks all unfilled orders that were placed on the bot to see if
-			they were filled, and places subsequent orders/closes trades based on that."""
+			ONE - at the close of each candle, it checks all pairs of the bots of that interval
+			for signals, and places orders if symbols match (EntryTick).
+			TWO - every orders_every seconds, it checks all unfilled orders that were placed on the
+			bots to see if they were filled, and places subsequent orders/closes trades based on that (ExitTick)."""
 
 		database = self.database
 
@@ -403,98 +528,276 @@ class BotRunner:
 			for pair in pairs:
 				self.all_symbol_datas[pair['symbol']] = sd[pair['symbol']]   # from each pair extract the symbol and put it in a list
 
-		while True:
-			with yaspin(Spinners.growHorizontal) as sp:
-				self.sp = sp   # Spinning animation confirming that the bot is running
+		for bot, sd in bots:
+			self.planner.Register(list(sd.keys()), bot['interval'], strategies_dict[bot['strategy_name']])   # Indicators computed before the strategies run
+
+		if self.kline_stream is not None:
+			self.sp.text = "Subscribing to the kline streams..."
+			for bot, sd in bots:
+				self.kline_stream.Subscribe(list(sd.keys()), bot['interval'])   # Downloads the candles once, the streams keep them up to date
+			self.kline_stream.Start()
+
+		if self.depth_stream is not None:
+			self.sp.text = "Subscribing to the depth streams..."
+			for bot, sd in bots:
+				self.depth_stream.Subscribe(list(sd.keys()))   # Books are synced from a snapshot and kept up to date by the streams
+			self.depth_stream.Start()
+
+		self.Open()   # Closed by the end of a previous execution
+
+		# Signals are checked once per candle of each interval, right after its close, and the open orders on their own cadence
+		self.scheduler = Scheduler(self.exchange, self.close_delay)
+		intervals = dict()
+		for bot, sd in bots:
+			intervals.setdefault(bot['interval'], []).append((bot, sd))   # Bots of the same interval share their candles in a tick
+		for interval, interval_bots in intervals.items():
+			self.scheduler.AddCandleJob(interval, partial(self.EntryTick, interval_bots), name='signals ' + interval)
+		self.scheduler.AddPeriodicJob(self.orders_every, partial(self.ExitTick, bots), name='orders')
+
+		with yaspin(Spinners.growHorizontal) as sp:
+			self.sp = sp   # Spinning animation confirming that the bot is running
+			try:
+				self.scheduler.Run()   # Sleeps between the jobs until stopped
+			except KeyboardInterrupt:   # Stopping the bot by [ctrl+c]
+				sp.stop()   # Spinning animation stop meaning that the bot isn't running anymore
+				print("\nExiting...\n")
+
+		if self.kline_stream is not None:
+			self.kline_stream.Stop()
+		if self.depth_stream is not None:
+			self.depth_stream.Stop()
+		self.Close()
+
+#%%
+	def EntryTick(self, bots):
+		""" Checks the signals of bots on the candles that just closed and places their entries """
+		database = self.database
+		sp = self.sp
+		self.NewTick()   # Fresh candles for this tick, shared by the bots
+
+		# Only request balances if order was placed recently
+		if self.update_balance:
+			account_data, balances_text, buy_on_bot = self.GetBalances(bots)   # Get Balances of all Assets From Exchange
+			if account_data is False:   # if getting balance hasn't worked
+				self.scheduler.Stop()
+				return
+			sp.stop()   # Spinning animation stop meaning that the bot isn't running anymore
+			print(balances_text)   # print the error message + the reason
+			sp.start()   # Spinning animation start meaning that the bot is running
+			self.update_balance = False   # setting update_balance to False to not run it infinitely
+
+		# Find Signals on Bots
+		for bot, symbol_datas_dict in bots:
+
+			# Get Active Pairs per Bot
+			ap_symbol_datas = []
+			aps = database.GetActivePairsOfBot(bot)   # Gets all the active pairs from a bot
+			pairs = dict()
+			for pair in aps:
+				if symbol_datas_dict.get(pair['symbol'], None) == None:
+					sp.text = "Couldn't find " + pair['symbol'] + " looking for it later..."   # There is no active pairs
+				else:
+					ap_symbol_datas.append(symbol_datas_dict[pair['symbol']])   # add each symbol_data of active pairs to the list ap_symbol_datas
+					pairs[pair['symbol']] = pair   # add each symbol of active pairs to the list pairs
+
+			if self.universe is not None:
+				ap_symbol_datas = self.universe.Top(ap_symbol_datas)   # Only the top_n symbols by 24h ticker are worth their candles
+
+			# If Enough Balance on bot, try finding signals
+			try:
+				run = self.RunBatch if self.batch else self.Run   # all the symbols at once, or one by one
+				run(bot, strategies_dict[bot['strategy_name']], pairs, self.SymbolsThisTick(bot, ap_symbol_datas))   # signals and entries through the stages of the pipeline
+			except exceptions.SSLError:
+				sp.text = "SSL Error caught!"
+			except exceptions.ConnectionError:
+				sp.text = "Having trouble connecting... retry"
+
+#%%
+	def ExitTick(self, bots):
+		""" Checks the open orders of all the bots, places the exits of the filled entries and closes the trades """
+		database = self.database
+		sp = self.sp
+
+		# Get All Pairs
+		aps = [] 
+		for bot, sd in bots:
+			aps.extend(database.GetAllPairsOfBot(bot))   # add all symbol_data from all bots to this list aps (allPairsSymbols)
+		all_pairs = dict()
+		for pair in aps:
+			all_pairs[pair['symbol']] = pair   # add all pairs from all symbols_data from all bots to this list all_pairs
+
+		for bot, symbol_datas_dict in bots:
+			open_orders = database.GetOpenOrdersOfBot(bot)   # Getting all the open orders and copy to open_order list
+
+			# If we have open orders saved in the DB, see if they exited
+			if len(open_orders) > 0:   # If we have an open order
+				sp.text = (str(len(open_orders)) + " orders open on " + bot['name'] + ", looking to close.")   # Spinning animation writting text
 				try:
-					# Get All Pairs
-					aps = [] 
-					for bot, sd in bots:
-						aps.extend(database.GetAllPairsOfBot(bot))   # add all symbol_data from all bots to this list aps (allPairsSymbols)
-					all_pairs = dict()
-					for pair in aps:
-						all_pairs[pair['symbol']] = pair   # add all pairs from all symbols_data from all bots to this list all_pairs
-
-					# Only request balances if order was placed recently
-					if self.update_balance:
-						account_data, balances_text, buy_on_bot = self.GetBalances(bots)   # Get Balances of all Assets From Exchange
-						if account_data is False:   # if getting balance hasn't worked
-							return
-						sp.stop()   # Spinning animation stop meaning that the bot isn't running anymore
-						print(balances_text)   # print the error message + the reason
-						sp.start()   # Spinning animation start meaning that the bot is running
-						self.update_balance = False   # setting update_balance to False to not run it infinitely
-
-					# Find Signals on Bots
-					for bot, symbol_datas_dict in bots:
-
-						# Get Active Pairs per Bot
-						ap_symbol_datas = []
-						aps = database.GetActivePairsOfBot(bot)   # Gets all the active pairs from a bot
-						pairs = dict()
-						for pair in aps:
-							if symbol_datas_dict.get(pair['symbol'], None) == None:
-								sp.text = "Couldn't find " + pair['symbol'] + " looking for it later..."   # There is no active pairs
-							else:
-								ap_symbol_datas.append(symbol_datas_dict[pair['symbol']])   # add each symbol_data of active pairs to the list ap_symbol_datas
-								pairs[pair['symbol']] = pair   # add each symbol of active pairs to the list pairs
-
-						# If Enough Balance on bot, try finding signals
-						try:
-							self.Run(bot, strategies_dict[bot['strategy_name']], pairs, ap_symbol_datas)   # wrapper around the EntryOrder function
-						except exceptions.SSLError:
-							sp.text = "SSL Error caught!"
-						except exceptions.ConnectionError:
-							sp.text = "Having trouble connecting... retry"
-
-						open_orders = database.GetOpenOrdersOfBot(bot)   # Getting all the open orders and copy to open_order list
-
-						# If we have open orders saved in the DB, see if they exited
-						if len(open_orders) > 0:   # If we have an open order
-							sp.text = (str(len(open_orders)) + " orders open on " + bot['name'] + ", looking to close.")   # Spinning animation writting text
-							try:
-								self.Exit(bot, all_pairs, open_orders)   # wrapper around the ExitOrder function
-							except exceptions.SSLError:
-								sp.text = "SSL Error caught!"
-							except exceptions.ConnectionError:
-								sp.text = "Having trouble connecting... retry"
-						else:
-							sp.text = "No orders open on "+ bot['name']
-
-				except KeyboardInterrupt:   # Stopping the bot by [ctrl+c]
-					sp.stop()   # Spinning animation stop meaning that the bot isn't running anymore
-					print("\nExiting...\n")
-					return
+					self.Exit(bot, all_pairs, open_orders)   # wrapper around the ExitOrder function
+				except exceptions.SSLError:
+					sp.text = "SSL Error caught!"
+				except exceptions.ConnectionError:
+					sp.text = "Having trouble connecting... retry"
+			else:
+				sp.text = "No orders open on "+ bot['name']
+
+#%%
+	def SymbolsThisTick(self, bot_params, symbol_datas):
+		""" Returns the symbols on which signals can be checked this tick without going over
+		the weight limit of the exchange. When some must wait, the next tick starts where this one stopped """
+		if self.kline_stream is not None or len(symbol_datas) == 0:   # Candles come from the streams, checking signals costs no weight
+			return symbol_datas
+
+		rate_limiter = self.exchange.rate_limiter
+		endpoint, weight, priority = rate_limiter.RequestWeight('GET', self.exchange.base + self.exchange.endpoints['klines'])
+		budget = rate_limiter.GetHeadroom() // weight   # Number of candles requests we can afford this minute
+		if budget >= len(symbol_datas):
+			return symbol_datas
+
+		start = self.symbol_offsets.get(bot_params['id'], 0) % len(symbol_datas)
+		self.symbol_offsets[bot_params['id']] = start + budget
+		self.sp.text = "Weight limit reached, checking " + str(budget) + " symbols of " + bot_params['name']
+
+		return (symbol_datas[start:] + symbol_datas[:start])[:budget]
 
 #%%
 	def Run(self, bot_params, strategy_function, pairs, symbol_datas):
-		"""This is a wrapper around the EntryOrder function which allows
-		us to check for signals and for filled orders in parallel
-		(because we have to check signals on hundreds of pairs, potentially)"""
-		pool = Pool(4)
-		func1 = partial(self.EntryOrder, bot_params, strategy_function, pairs)
-		pool.map(func1, symbol_datas)
-		pool.close()
-		pool.join()
+		"""Checks for signals on all the symbols and places the entries, one job per symbol
+		through the stages of the pipeline : while some symbols are downloaded, others are evaluated
+		and others get their orders (because we have to check signals on hundreds of pairs, potentially)"""
+		for symbol_data in symbol_datas:
+			self.pipeline.Submit(dict(bot_params=bot_params, strategy_function=strategy_function, pairs=pairs, symbol_data=symbol_data))
+		self.pipeline.Join()
+
+#%%
+	def FetchStage(self, job:dict):
+		job['df'] = self.GetFrame(job['symbol_data']['symbol'], job['bot_params']['interval'])
+		return job
+
+	def EvaluateStage(self, job:dict):
+		""" Checks the signal (unless already known, as in RunBatch) and prepares the order """
+		df = job['df']
+		if 'buy' not in job:
+			self.sp.text = "Checking signals on " + job['symbol_data']['symbol']
+			job['buy'] = job['strategy_function'](df, len(df['close'])-1)
+		if job['buy'] is False:
+			return None
+
+		job['order_params'] = self.EntryParams(job['bot_params'], job['symbol_data'], df, job['buy'])
+		return job if job['order_params'] is not None else None
+
+	def OrderStage(self, job:dict):
+		job['order_result'] = self.PlaceOrder(job['order_params'], job['bot_params']['test_run'])
+		return job if job['order_result'] is not False else None
+
+	def PersistStage(self, job:dict):
+		self.SaveEntry(job['bot_params'], job['pairs'], job['symbol_data'], job['order_params'], job['order_result'])
+
+#%%
+	@staticmethod
+	def StackFrames(frames:dict) -> list:
+		""" Groups the candles {symbol: df} having the same times, and stacks each group into 2D arrays
+		(one row per symbol). Returns a list of (symbols, {column: 2D array}) """
+		groups = dict()
+		for symbol, df in frames.items():
+			if len(df) > 0:
+				times = df['time'].to_numpy()
+				groups.setdefault((len(df), times[0], times[-1]), []).append(symbol)   # Contiguous candles, same first and last times : same times
+
+		return [(symbols, {col: np.stack([frames[symbol][col].to_numpy(dtype=np.float64) for symbol in symbols])
+			for col in ['time', 'open', 'high', 'low', 'close', 'volume']}) for symbols in groups.values()]
+
+#%%
+	def SymbolsWithSignals(self, bot_params, strategy_function, symbol_datas) -> tuple:
+		""" Returns the symbols having a signal on their last candle, with the buy prices and the candles of all the
+		symbols. The candles of all the symbols are stacked into 2D arrays, on which the indicators and the vectorized
+		strategy are computed once for all of them instead of once per symbol """
+		symbols = [sd['symbol'] for sd in symbol_datas]
+		dfs = self.pool.map(partial(self.GetFrame, interval=bot_params['interval'], indicators=False), symbols)   # Downloads (or reads from the streams) the candles of all the symbols
+		frames = dict(zip(symbols, dfs))
+
+		buys = dict()
+		if not hasattr(strategy_function, 'signals'):   # No vectorized form, one symbol at a time
+			for symbol, df in frames.items():
+				buys[symbol] = strategy_function(df, len(df) - 1) if len(df) > 0 else False
+		else:
+			for group, arrays in self.StackFrames(frames):
+				try:
+					last_signals = strategy_function.signals(arrays)[:, -1]   # One pass for all the symbols of the group
+				except ValueError:   # Fewer candles than a period, the symbols of the group are checked one by one
+					for symbol in group:
+						buys[symbol] = self.SymbolSignal(bot_params, strategy_function, symbol)
+					continue
+				for symbol, buy in zip(group, last_signals):
+					buys[symbol] = False if np.isnan(buy) else buy
+
+		return [symbol for symbol in symbols if buys.get(symbol, False) is not False], buys, frames
+
+#%%
+	def SymbolSignal(self, bot_params, strategy_function, symbol:str):
+		""" Signal on the last candle of one symbol, with the indicators of the planner (NaN when the history
+		is too short for them). False when the strategy can't be evaluated on it """
+		df = self.GetFrame(symbol, bot_params['interval'])
+		try:
+			return strategy_function(df, len(df) - 1) if len(df) > 0 else False
+		except Exception as e:
+			self.sp.text = "Couldn't check the signal of " + symbol + ": " + str(e)
+			return False
+
+#%%
+	def RunBatch(self, bot_params, strategy_function, pairs, symbol_datas):
+		""" Same as Run, with the signals of all the symbols computed at once (see SymbolsWithSignals).
+		Only the symbols with a signal go on to place an order """
+		if len(symbol_datas) == 0:
+			return
+
+		self.sp.text = "Checking signals on " + str(len(symbol_datas)) + " symbols of " + bot_params['name']
+		symbols, buys, frames = self.SymbolsWithSignals(bot_params, strategy_function, symbol_datas)
+		symbol_datas_dict = {sd['symbol']: sd for sd in symbol_datas}
+
+		for symbol in symbols:   # Signals already known, the orders go through the last stages of the pipeline
+			self.pipeline.Submit(dict(bot_params=bot_params, strategy_function=strategy_function, pairs=pairs,
+				symbol_data=symbol_datas_dict[symbol], df=frames[symbol], buy=buys[symbol]), stage='evaluate')
+		self.pipeline.Join()
 
 #%%
 	def Exit(self, bot_params, pairs, orders):
 		"""This is a wrapper around the ExitOrder function which allows
 		us to check for signals and for filled orders in parallel
-		(because we have to check signals on hundreds of pairs, potentially)"""
-		pool = Pool(4)
+		(because we have to check signals on hundreds of pairs, potentially).
+		Only the orders whose status changed on the exchange go to ExitOrder"""
+		changed_orders = self.ReconcileOrders(orders)
+		if len(changed_orders) == 0:
+			return
+
 		func1 = partial(self.ExitOrder, bot_params, pairs)
-		pool.map(func1, orders)
-		pool.close()
-		pool.join()
+		self.pool.starmap(func1, changed_orders)
+
+#%%
+	def Open(self):
+		""" Starts the pool (again after Close, when the bot is executed once more) """
+		if self.pool is None:
+			self.pool = Pool(self.workers['pool'])
+
+#%%
+	def Close(self):
+		""" Stops the threads of the pipeline and the pool, Open and Pipeline.Submit start them again """
+		self.pipeline.Stop()
+		if self.pool is not None:
+			self.pool.close()
+			self.pool.join()
+			self.pool = None
 
 #%%
 def Main():
 
 	sp = yaspin(Spinners.growHorizontal)   # horizontal growing bar during botRunning
-	exchange = Binance(credentials = 'credentials.txt')   # access to the exchange (adapted for Binance only)
+	exchange = Binance(credentials = 'credentials.txt', candles_dir = 'candles')   # access to the exchange (adapted for Binance only), candles kept on the disk
 	database = BotDatabase("database.db")   # access to the local database
-	prog = BotRunner(sp, exchange, database)   # initializing the tradingBot
+	kline_stream = KlineStream(exchange)   # candles of the traded symbols streamed from the exchange
+	depth_stream = DepthStream(exchange)   # order books of the traded symbols streamed from the exchange
+	universe = Universe(exchange, top_n=20)   # symbols ranked from the 24h tickers of the exchange
+	prog = BotRunner(sp, exchange, database, kline_stream, depth_stream, universe)   # initializing the tradingBot
 
 	i = input("Execute or Quit? (e or q)\n")   # Execute the tradingBot ?
 	while i not in ['q']:
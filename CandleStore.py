@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+import pandas as pd
+
+# CandleStore.py keeps the candles downloaded from the exchange on the disk, one file per (symbol, interval).
+# Candles are saved as raw float64 rows (time, open, high, low, close, volume) that are memory-mapped
+# when read, so that only the candles missing on the disk are ever downloaded again.
+
+COLUMNS = ['time', 'open', 'high', 'low', 'close', 'volume']
+ROW_BYTES = len(COLUMNS) * 8   # Size of one candle in the files
+
+#%%
+def CandlesToDataFrame(candles:np.ndarray, copy:bool=True):
+	""" Builds the dataframe returned by Binance.GetSymbolKlines from rows of candles.
+	With copy False the columns are views of candles (shared memory, memmaps) """
+	df = pd.DataFrame(candles, columns=COLUMNS, copy=copy)
+	df['date'] = pd.to_datetime(df['time'] * 1000000)   # convert the time data to a date data
+
+	return df
+
+#%%
+class CandleStore:
+
+	def __init__(self, directory:str='candles'):
+		self.directory = directory
+		os.makedirs(directory, exist_ok=True)
+
+		self.locks = dict()   # One lock per (symbol, interval), bots can read different symbols at the same time
+		self.locks_lock = threading.Lock()
+
+		self.heads_path = os.path.join(directory, 'heads.json')   # Open time of the first candle listed by the exchange, once we reached it
+		self.heads = dict()
+		if os.path.exists(self.heads_path):
+			with open(self.heads_path, 'r') as f:
+				self.heads = json.load(f)
+
+		self.gaps_path = os.path.join(directory, 'gaps.json')   # [after, before] open times of the candles missing between two stored ones
+		self.gaps = dict()
+		if os.path.exists(self.gaps_path):
+			with open(self.gaps_path, 'r') as f:
+				self.gaps = json.load(f)
+
+#%%
+	def _Name(self, symbol:str, interval:str):
+		return symbol + '_' + interval.replace('M', 'mo')   # '1M' and '1m' would be the same file on case insensitive file systems
+
+#%%
+	def _Lock(self, symbol:str, interval:str):
+		with self.locks_lock:
+			return self.locks.setdefault((symbol, interval), threading.Lock())
+
+#%%
+	def Load(self, symbol:str, interval:str) -> np.ndarray:
+		""" Memory-maps the candles stored for a symbol, one row per candle
+		(time, open, high, low, close, volume), oldest first """
+		path = os.path.join(self.directory, self._Name(symbol, interval) + '.bin')
+		rows = os.path.getsize(path) // ROW_BYTES if os.path.exists(path) else 0   # An interrupted write can leave an incomplete row
+		if rows == 0:
+			return np.empty((0, len(COLUMNS)))
+
+		return np.memmap(path, dtype=np.float64, mode='r', shape=(rows, len(COLUMNS)))
+
+#%%
+	def Save(self, symbol:str, interval:str, candles:np.ndarray):
+		""" Merges candles contiguous with the stored ones into the store.
+		Candles overlapping the stored ones replace them (the last stored candle
+		may not have been closed yet when it was saved) """
+		candles = np.ascontiguousarray(candles, dtype=np.float64)
+		if len(candles) == 0:
+			return
+
+		path = os.path.join(self.directory, self._Name(symbol, interval) + '.bin')
+		stored = self.Load(symbol, interval)
+
+		if len(stored) > 0 and candles[0, 0] < stored[0, 0]:
+			# Backfilling older candles, the whole file is rewritten with them in front
+			older = candles[candles[:, 0] < stored[0, 0]]
+			merged = np.concatenate([older, stored])
+			candles = candles[candles[:, 0] >= stored[0, 0]]
+			tmp_path = path + '.tmp'
+			merged.tofile(tmp_path)
+			del stored
+			os.replace(tmp_path, path)
+			stored = self.Load(symbol, interval)
+
+		if len(candles) == 0:
+			return
+
+		if len(stored) > 0 and candles[-1, 0] < stored[-1, 0]:
+			# Filling a gap, the whole file is rewritten with the candles in their place
+			keep = (stored[:, 0] < candles[0, 0]) | (stored[:, 0] > candles[-1, 0])
+			merged = np.concatenate([stored[keep], candles])
+			merged = merged[np.argsort(merged[:, 0], kind='stable')]
+			tmp_path = path + '.tmp'
+			merged.tofile(tmp_path)
+			del stored
+			os.replace(tmp_path, path)
+			return
+
+		# Candles from the first one we received onward are overwritten and the file extended
+		start = int(np.searchsorted(stored[:, 0], candles[0, 0])) if len(stored) > 0 else 0
+		del stored
+		with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+			f.seek(start * ROW_BYTES)
+			f.write(candles.tobytes())
+			f.truncate(f.tell())
+
+#%%
+	def _SetHead(self, symbol:str, interval:str, first_time:float):
+		""" Remembers that no candle exists before first_time on the exchange """
+		with self.locks_lock:
+			self.heads[self._Name(symbol, interval)] = first_time
+			with open(self.heads_path, 'w') as f:
+				json.dump(self.heads, f)
+
+#%%
+	def _SetGaps(self, symbol:str, interval:str, gaps:list):
+		""" Remembers the [after, before] gaps of the stored candles, whose candles weren't downloaded yet """
+		with self.locks_lock:
+			self.gaps[self._Name(symbol, interval)] = sorted(gaps)
+			with open(self.gaps_path, 'w') as f:
+				json.dump(self.gaps, f)
+
+#%%
+	def GetKlines(self, download, symbol:str, interval:str, interval_ms:int, limit:int=1000, end_time=False):
+		""" Returns the limit candles of a symbol ending at end_time (or now) from the disk.
+		Only the candles missing on the disk are requested with download(limit, end_time),
+		which must return a dataframe of candles like Binance.GetSymbolKlines """
+		with self._Lock(symbol, interval):
+			end = int(end_time) if end_time else int(round(time.time()*1000))
+			stored = self.Load(symbol, interval)
+			last_time = float(stored[-1, 0]) if len(stored) > 0 else None
+			del stored   # Save may replace the file, which can't be done while it is mapped on Windows
+
+			if last_time is None:
+				self.Save(symbol, interval, download(limit, end_time)[COLUMNS].to_numpy(dtype=np.float64))
+			elif end >= last_time:
+				# Download the tail from the last stored candle, which may have changed since we saved it
+				missing = int((end - last_time) // interval_ms) + 1
+				tail = download(min(missing, limit), end_time)[COLUMNS].to_numpy(dtype=np.float64)
+				if missing > limit and len(tail) > 0 and tail[0, 0] > last_time:
+					# Only the limit last candles are downloaded, the ones between are fetched when a request reaches them
+					self._SetGaps(symbol, interval, self.gaps.get(self._Name(symbol, interval), []) + [[last_time, float(tail[0, 0])]])
+				self.Save(symbol, interval, tail)
+
+			stored = self.Load(symbol, interval)
+			last = int(np.searchsorted(stored[:, 0], end, side='right'))   # Candles after end_time are not returned
+			for after, before in reversed(self.gaps.get(self._Name(symbol, interval), [])):
+				if last == 0 or before > stored[last - 1, 0] or after < stored[max(last - limit, 0), 0]:
+					continue   # Gap outside of the candles returned
+				# Download the candles missing just before the gap, as many as the request lacks (after is downloaded again, it may not have been closed)
+				missing = limit - (last - int(np.searchsorted(stored[:, 0], before)))
+				del stored
+				filled = download(missing, int(before) - 1)[COLUMNS].to_numpy(dtype=np.float64)
+				gaps = [gap for gap in self.gaps[self._Name(symbol, interval)] if gap != [after, before]]
+				if len(filled) > 0 and filled[0, 0] > after:
+					gaps.append([after, float(filled[0, 0])])   # Still missing
+				self._SetGaps(symbol, interval, gaps)
+				self.Save(symbol, interval, filled[filled[:, 0] >= after])
+				stored = self.Load(symbol, interval)
+				last = int(np.searchsorted(stored[:, 0], end, side='right'))
+
+			head = self.heads.get(self._Name(symbol, interval), None)
+			if last < limit and len(stored) > 0 and head != stored[0, 0]:
+				# Backfill the older candles, including the ones between end_time and the first stored candle
+				first_time = float(stored[0, 0])
+				del stored
+				missing = limit - last + max(int((first_time - end) // interval_ms), 0)
+				older = download(missing, int(first_time) - 1)[COLUMNS].to_numpy(dtype=np.float64)
+				older = older[older[:, 0] < first_time]
+				if len(older) < missing:   # The start of the history, or a gap of the exchange (downtime) : checked with one more candle
+					oldest = older[0, 0] if len(older) > 0 else first_time
+					before = download(1, int(oldest) - 1)[COLUMNS].to_numpy(dtype=np.float64)
+					if not np.any(before[:, 0] < oldest):
+						self._SetHead(symbol, interval, oldest)   # The exchange has nothing older
+				self.Save(symbol, interval, older)
+				stored = self.Load(symbol, interval)
+				last = int(np.searchsorted(stored[:, 0], end, side='right'))
+
+			candles = np.array(stored[max(last - limit, 0):last])   # Copy, the file can change after we release the lock
+
+		return CandlesToDataFrame(candles)
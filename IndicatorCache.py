@@ -0,0 +1,123 @@
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+
+# IndicatorCache.py keeps the indicators already computed, so that bots trading the same symbol and
+# interval with the same indicators compute them once. Entries are keyed by a fingerprint of the candles
+# (symbol, interval, number of candles, open time of the first and last ones, last prices) and the
+# least recently used ones are evicted once the cache is full, in entries or in bytes of arrays.
+
+#%%
+class IndicatorCache:
+
+	def __init__(self, max_entries:int=1024, max_bytes:int=256 * 2**20):
+		self.max_entries = max_entries
+		self.max_bytes = max_bytes   # Arrays kept at most, values bigger than it alone are computed without being kept
+		self.entries = OrderedDict()   # key: value, from the least to the most recently used
+		self.sizes = dict()   # key: bytes of the arrays of its value
+		self.bytes = 0
+		self.in_flight = dict()   # key: Event of the thread computing it, the others wait for its result
+		self.lock = threading.Lock()
+
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+#%%
+	@staticmethod
+	def Fingerprint(df) -> tuple:
+		""" Identifies the candles of a dataframe. The last prices are part of it because the last candle
+		changes until it closes. Without symbol and interval in df.attrs, the closes are hashed """
+		if len(df) == 0:
+			return ('empty',)
+
+		last = df.iloc[-1]
+		prices = (float(last['close']), float(last['high']) if 'high' in df else None, float(last['low']) if 'low' in df else None)
+		symbol, interval = df.attrs.get('symbol', None), df.attrs.get('interval', None)
+		if symbol is None:
+			symbol = hashlib.blake2b(df['close'].to_numpy(dtype=np.float64).tobytes(), digest_size=16).hexdigest()
+
+		times = (float(df['time'].iloc[0]), float(last['time'])) if 'time' in df else (None, None)
+
+		return (symbol, interval, len(df)) + times + prices
+
+#%%
+	def Get(self, key):
+		""" Returns the value of key, None if it isn't cached """
+		with self.lock:
+			value = self.entries.get(key, None)
+			if value is None:
+				self.misses += 1
+			else:
+				self.hits += 1
+				self.entries.move_to_end(key)
+
+			return value
+
+#%%
+	def Put(self, key, value):
+		""" Caches value (arrays are made read-only, they are shared). The least recently used
+		entries are evicted until the cache fits in max_entries and max_bytes """
+		arrays = [array for array in (value.values() if isinstance(value, dict) else [value]) if isinstance(array, np.ndarray)]
+		size = sum(array.nbytes for array in arrays)
+		if size > self.max_bytes:
+			return
+
+		for array in arrays:
+			array.flags.writeable = False
+
+		with self.lock:
+			self.bytes += size - self.sizes.get(key, 0)
+			self.entries[key] = value
+			self.sizes[key] = size
+			self.entries.move_to_end(key)
+			while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+				evicted, _ = self.entries.popitem(last=False)
+				self.bytes -= self.sizes.pop(evicted)
+				self.evictions += 1
+
+#%%
+	def GetOrCompute(self, key, compute):
+		""" Returns the cached value of key, or computes it. Threads asking for a key being
+		computed wait for it instead of computing it too """
+		while True:
+			value = self.Get(key)
+			if value is not None:
+				return value
+
+			with self.lock:
+				event = self.in_flight.get(key, None)
+				if event is None:
+					event = self.in_flight[key] = threading.Event()
+					break
+			event.wait()   # Computed by another thread, read it from the cache
+
+		try:
+			value = compute()
+			self.Put(key, value)
+		finally:
+			with self.lock:
+				del self.in_flight[key]
+			event.set()
+
+		return value
+
+#%%
+	def Clear(self):
+		with self.lock:
+			self.entries.clear()
+			self.sizes.clear()
+			self.bytes = 0
+
+#%%
+	def GetStats(self) -> dict:
+		with self.lock:
+			requests = self.hits + self.misses
+			return dict(
+				hits = self.hits,
+				misses = self.misses,
+				evictions = self.evictions,
+				entries = len(self.entries),
+				bytes = self.bytes,
+				hit_rate = self.hits / requests if requests > 0 else 0.)
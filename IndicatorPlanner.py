@@ -0,0 +1,188 @@
+import threading
+import numpy as np
+
+from IndicatorCache import IndicatorCache
+from Indicators import Indicators, SmoothedMovingAverage, ExponentialMovingAverage, SimpleMovingAverage, \
+	RollingStd, RollingMax, RollingMin, Shift
+
+# IndicatorPlanner.py computes the indicators declared by the strategies (strategy.indicators) before they run.
+# The indicators of all the bots trading a (symbol, interval) are merged into one graph of computations,
+# where every computation shared by several indicators (the same ema, the moving average and std of
+# both bollinger bands, the rolling highs and lows of the ichimoku cloud) is done once per set of candles.
+# The columns of a graph are kept in Indicators.CACHE, keyed by the fingerprint of the candles, so candles
+# that didn't change since the last tick aren't computed again.
+
+#%%
+def _Nodes(indicator_name:str, args) -> tuple:
+	""" Returns the computations of an indicator {key: (function, dependencies)} and its
+	columns {col_name: key}. Keys starting with 'input' are columns of the candles """
+	close, high, low = ('input', 'close'), ('input', 'high'), ('input', 'low')
+
+	if indicator_name == "sma":
+		return {('sma', args): (lambda x: SmoothedMovingAverage(x, args), [close])}, ('sma', args)
+	if indicator_name == "ema":
+		return {('ema', args): (lambda x: ExponentialMovingAverage(x, args), [close])}, ('ema', args)
+	if indicator_name in ["lbb", "ubb"]:
+		sign = -1 if indicator_name == "lbb" else 1
+		return {
+			('mean', args): (lambda x: SimpleMovingAverage(x, args), [close]),
+			('std', args): (lambda x: RollingStd(x, args), [close]),
+			(indicator_name, args): (lambda mean, std: mean + sign * std * 2.0, [('mean', args), ('std', args)]),
+		}, (indicator_name, args)
+	if indicator_name == "ichimoku":
+		nodes = dict()
+		for window in [9, 26, 52]:   # Rolling windows shared by the lines
+			nodes[('max', window)] = (lambda x, window=window: RollingMax(x, window), [high])
+			nodes[('min', window)] = (lambda x, window=window: RollingMin(x, window), [low])
+			nodes[('middle', window)] = (lambda h, l: (h + l) / 2, [('max', window), ('min', window)])
+		nodes[('senkou_a',)] = (lambda tenkansen, kijunsen: Shift((tenkansen + kijunsen) / 2, 26), [('middle', 9), ('middle', 26)])
+		nodes[('senkou_b',)] = (lambda middle: Shift(middle, 52), [('middle', 52)])
+		nodes[('chikouspan',)] = (lambda x: Shift(x, -26), [close])
+		return nodes, dict(tenkansen=('middle', 9), kijunsen=('middle', 26), senkou_a=('senkou_a',), senkou_b=('senkou_b',), chikouspan=('chikouspan',))
+
+	raise Exception("Unknown indicator " + str(indicator_name))
+
+#%%
+class IndicatorGraph:
+	""" Computations of a set of indicators, each one done once """
+
+	def __init__(self, indicators:list):
+		self.nodes = dict()   # key: (function, dependencies)
+		self.columns = dict()   # col_name: key of the computation giving it
+		for indicator_name, col_name, args in indicators:
+			nodes, output = _Nodes(indicator_name, args)
+			self.nodes.update(nodes)   # The same key is the same computation, kept once
+			if isinstance(output, dict):
+				self.columns.update(output)
+			else:
+				self.columns[col_name] = output
+
+		self.order = []   # Keys sorted so that every computation comes after its dependencies
+		for key in self.nodes:
+			self._Visit(key, set())
+		self.key = tuple(sorted(self.columns.items(), key=str))   # Identifies the graph in the cache
+
+#%%
+	def _Visit(self, key, visiting:set):
+		if key in self.order or key[0] == 'input':
+			return
+		if key in visiting:
+			raise Exception("Cycle in the indicators at " + str(key))
+
+		visiting.add(key)
+		for dependency in self.nodes[key][1]:
+			self._Visit(dependency, visiting)
+		self.order.append(key)
+
+#%%
+	def Values(self, df) -> dict:
+		""" Computes the columns of all the indicators {col_name: array}. An indicator needing more candles
+		than df has is all NaN, the strategies find no signal on it """
+		values = {('input', col): df[col].to_numpy(dtype=np.float64) for col in ['close', 'high', 'low'] if col in df}
+		for key in self.order:
+			function, dependencies = self.nodes[key]
+			try:
+				values[key] = function(*[values[dependency] for dependency in dependencies])
+			except ValueError:   # Period longer than the history of the symbol
+				values[key] = np.full(len(df), np.nan)
+
+		return {col: values[key] for col, key in self.columns.items()}
+
+#%%
+	def Compute(self, df, use_cache:bool=True):
+		""" Adds the columns of all the indicators to df, read from Indicators.CACHE when
+		they were already computed on the same candles """
+		if use_cache:
+			values = Indicators.CACHE.GetOrCompute((IndicatorCache.Fingerprint(df), 'graph', self.key), lambda: self.Values(df))
+		else:
+			values = self.Values(df)
+
+		for col, column_values in values.items():
+			df[col] = column_values
+
+		return df
+
+#%%
+class IndicatorPlanner:
+	""" Indicators needed on each (symbol, interval) by the strategies of all the bots """
+
+	def __init__(self):
+		self.requirements = dict()   # (symbol, interval): set of (indicator_name, col_name, args)
+		self.graphs = dict()   # frozenset of requirements: IndicatorGraph, symbols with the same needs share it
+		self.lock = threading.Lock()
+
+#%%
+	def Register(self, symbols:list, interval:str, strategy):
+		""" Adds the indicators declared by a strategy to the needs of the symbols it trades """
+		with self.lock:
+			for symbol in symbols:
+				self.requirements.setdefault((symbol, interval), set()).update(getattr(strategy, 'indicators', []))
+
+#%%
+	def GetGraph(self, symbol:str, interval:str):
+		""" Returns the graph of the indicators needed on a (symbol, interval), None if there are none """
+		with self.lock:
+			requirements = frozenset(self.requirements.get((symbol, interval), set()))
+			if len(requirements) == 0:
+				return None
+			if requirements not in self.graphs:
+				self.graphs[requirements] = IndicatorGraph(sorted(requirements, key=str))
+
+			return self.graphs[requirements]
+
+#%%
+	def Compute(self, df, symbol:str, interval:str, use_cache:bool=True):
+		""" Adds the indicators needed on (symbol, interval) to its candles """
+		graph = self.GetGraph(symbol, interval)
+		if graph is not None:
+			df.attrs.setdefault('symbol', symbol)   # Part of the fingerprint of the candles in the cache
+			df.attrs.setdefault('interval', interval)
+			graph.Compute(df, use_cache)
+
+		return df
+
+#%%
+def Main():
+
+	import time
+	import pandas as pd
+	from Strategies import strategies_dict
+
+	n = 1000
+	close = 100 * np.exp(np.cumsum(np.random.normal(0, 0.01, n)))
+	df = pd.DataFrame(dict(time=np.arange(n) * 60000., close=close, high=close * 1.01, low=close * 0.99))
+
+	planner = IndicatorPlanner()
+	for strategy in strategies_dict.values():
+		planner.Register(['BTCUSDT'], '1m', strategy)
+	graph = planner.GetGraph('BTCUSDT', '1m')
+	print(len(graph.order), "computations for", len(graph.columns), "columns")
+
+	# Same columns as the indicators computed one by one
+	planned, separate = df.copy(), df.copy()
+	start = time.perf_counter()
+	planner.Compute(planned, 'BTCUSDT', '1m', use_cache=False)
+	print("Planner:", round((time.perf_counter() - start) * 1000, 2), "ms")
+	start = time.perf_counter()
+	for indicator_name, col_name, args in sorted(planner.requirements[('BTCUSDT', '1m')], key=str):
+		Indicators.AddIndicator(separate, indicator_name, col_name, args, use_cache=False)
+	print("One by one:", round((time.perf_counter() - start) * 1000, 2), "ms")
+	print("Same values:", all(np.allclose(planned[col], separate[col], equal_nan=True) for col in graph.columns))
+
+	# The same candles on the next tick are read from the cache
+	hits = Indicators.CACHE.hits
+	cached = df.copy()
+	start = time.perf_counter()
+	planner.Compute(cached, 'BTCUSDT', '1m')
+	planner.Compute(cached.copy(), 'BTCUSDT', '1m')
+	print("Cached:", round((time.perf_counter() - start) * 1000, 2), "ms for two ticks,", Indicators.CACHE.hits - hits, "hit")
+	print("Same values:", all(np.allclose(planned[col], cached[col], equal_nan=True) for col in graph.columns))
+
+	# A symbol with fewer candles than the periods gets NaN columns, no signal, instead of an error
+	short = df.iloc[:20].copy()
+	planner.Compute(short, 'BTCUSDT', '1m')
+	print("Short history:", all(col in short for col in graph.columns), "columns,", int(short['ema_200'].notna().sum()), "values of ema_200")
+
+#%%
+if __name__ == '__main__':
+	Main()
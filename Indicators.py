@@ -1,13 +1,194 @@
 # Class used to compute indicators on a dataframe. We're creating it in order to separate it from the rest of the code that is not related.
-# Here, we import indicators from external libraries, but also write our own functions for computing indicators
+# Here, we import indicators from external libraries, but also write our own functions for computing indicators.
+# The default indicators are numpy kernels working on whole float64 arrays (along their last axis, so that
+# the rows of a 2D array are computed at once), the pyti ones are kept as a reference.
+
+import time
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
 from pyti.smoothed_moving_average import smoothed_moving_average as sma
 from pyti.exponential_moving_average import exponential_moving_average as ema
 from pyti.bollinger_bands import lower_bollinger_band as lbb
 from pyti.bollinger_bands import upper_bollinger_band as ubb
 
+from IndicatorCache import IndicatorCache
+
+WINDOWS_PER_CHUNK = 1 << 16   # Rolling windows computed at once, bounds the memory of the sliding views
+
+#%%
+def _CheckPeriod(data:np.ndarray, period:int):
+	""" Same error as pyti when the period is longer than the data """
+	if data.shape[-1] < int(period):
+		raise ValueError("Error: data_len < period")
+
+#%%
+def _Recursive(data:np.ndarray, period:int, alpha:float) -> np.ndarray:
+	""" y[t] = (1 - alpha) * y[t-1] + alpha * x[t] along the last axis, seeded with the mean of the first period
+	values (after the leading NaNs, like pyti). The recursion is solved in closed form chunk by chunk :
+	y[c+k] = a^(k+1) * (y[c-1] + alpha * sum_j<=k x[c+j] * a^-(j+1)), chunks short enough for a^-k to stay finite """
+	data = np.asarray(data, dtype=np.float64)
+	_CheckPeriod(data, period)
+	period = int(period)
+
+	starts = np.argmax(~np.isnan(data), axis=-1) if data.size > 0 else np.zeros(data.shape[:-1], dtype=int)
+	starts = np.where(np.isnan(data).all(axis=-1), data.shape[-1], starts)
+	if np.ndim(starts) > 0 and len(np.unique(starts)) > 1:   # Rows with different warm-ups, one at a time
+		return np.stack([_Recursive(row, period, alpha) for row in data])
+
+	out = np.full(data.shape, np.nan)
+	seed = int(np.max(starts)) + period - 1
+	if seed >= data.shape[-1]:
+		return out
+
+	out[..., seed] = data[..., seed - period + 1:seed + 1].mean(axis=-1)
+	a = 1 - alpha
+	if a <= 0:   # No memory, the average is the value itself
+		out[..., seed + 1:] = data[..., seed + 1:]
+		return out
+
+	chunk = max(int(30 * np.log(10) / -np.log(a)), 1)   # a^-chunk <= 1e30
+	powers = a ** -np.arange(1, chunk + 1)
+	previous = out[..., seed]
+	for c in range(seed + 1, data.shape[-1], chunk):
+		x = data[..., c:c + chunk]
+		k = x.shape[-1]
+		y = (previous[..., None] + alpha * np.cumsum(x * powers[:k], axis=-1)) / powers[:k]
+		out[..., c:c + k] = y
+		previous = y[..., -1]
+
+	return out
+
+#%%
+def SmoothedMovingAverage(data, period:int) -> np.ndarray:
+	""" Smoothed moving average (Wilder) : SMMAt = (SMMAt-1 * (N - 1) + Pt) / N """
+	return _Recursive(data, period, 1 / float(period))
+
+#%%
+def ExponentialMovingAverage(data, period:int) -> np.ndarray:
+	""" Exponential moving average : EMAt = alpha * Pt + (1 - alpha) * EMAt-1, alpha = 2 / (N + 1) """
+	return _Recursive(data, period, 2 / float(period + 1))
+
+#%%
+def SimpleMovingAverage(data, period:int) -> np.ndarray:
+	""" Mean of the last period values (NaN while the window isn't full or holds a NaN) """
+	data = np.asarray(data, dtype=np.float64)
+	_CheckPeriod(data, period)
+	period = int(period)
+
+	nans = np.isnan(data)
+	zeros = np.zeros(data.shape[:-1] + (1,))
+	sums = np.concatenate([zeros, np.cumsum(np.where(nans, 0, data), axis=-1)], axis=-1)
+	counts = np.concatenate([zeros, np.cumsum(nans, axis=-1)], axis=-1)
+
+	out = np.full(data.shape, np.nan)
+	means = (sums[..., period:] - sums[..., :-period]) / period
+	out[..., period - 1:] = np.where(counts[..., period:] - counts[..., :-period] > 0, np.nan, means)
+
+	return out
+
+#%%
+def _Rolling(data:np.ndarray, window:int, reduce) -> np.ndarray:
+	""" reduce(windows, axis=-1) over the rolling windows of the last axis, NaN while the window isn't full """
+	data = np.asarray(data, dtype=np.float64)
+	window = int(window)
+	out = np.full(data.shape, np.nan)
+	if data.shape[-1] < window:
+		return out
+
+	windows = sliding_window_view(data, window, axis=-1)   # No copy
+	for c in range(0, windows.shape[-2], WINDOWS_PER_CHUNK):
+		out[..., window - 1 + c:window - 1 + c + WINDOWS_PER_CHUNK] = reduce(windows[..., c:c + WINDOWS_PER_CHUNK, :], axis=-1)
+
+	return out
+
+#%%
+def RollingStd(data, period:int) -> np.ndarray:
+	""" Standard deviation (population, like np.std) of the last period values """
+	return _Rolling(data, period, np.std)
+
+#%%
+def _RollingExtremum(data, window:int, ufunc, neutral:float) -> np.ndarray:
+	""" Max (or min) of the rolling windows of the last axis in O(n) (van Herk / Gil-Werman) :
+	the values are cut into blocks of window values, the extremum of a window is the one of the
+	suffix of the block where it starts and of the prefix of the block where it ends """
+	data = np.asarray(data, dtype=np.float64)
+	window = int(window)
+	n = data.shape[-1]
+	out = np.full(data.shape, np.nan)
+	if n < window:
+		return out
+
+	blocks = -(-n // window)
+	padded = np.full(data.shape[:-1] + (blocks * window,), neutral)   # The padding of the last block never wins
+	padded[..., :n] = data
+	padded = padded.reshape(data.shape[:-1] + (blocks, window))
+	prefix = ufunc.accumulate(padded, axis=-1).reshape(data.shape[:-1] + (-1,))
+	suffix = ufunc.accumulate(padded[..., ::-1], axis=-1)[..., ::-1].reshape(data.shape[:-1] + (-1,))
+
+	out[..., window - 1:] = ufunc(suffix[..., :n - window + 1], prefix[..., window - 1:n])
+
+	return out
+
+#%%
+def RollingMax(data, window:int) -> np.ndarray:
+	return _RollingExtremum(data, window, np.maximum, -np.inf)
+
+#%%
+def RollingMin(data, window:int) -> np.ndarray:
+	return _RollingExtremum(data, window, np.minimum, np.inf)
+
+#%%
+def LowerBollingerBand(data, period:int, std_mult:float=2.0) -> np.ndarray:
+	""" SMA(t) - STD(t-n:t) * std_mult """
+	data = np.asarray(data, dtype=np.float64)
+	_CheckPeriod(data, period)
+
+	return SimpleMovingAverage(data, period) - RollingStd(data, period) * std_mult
+
+#%%
+def UpperBollingerBand(data, period:int, std_mult:float=2.0) -> np.ndarray:
+	""" SMA(t) + STD(t-n:t) * std_mult """
+	data = np.asarray(data, dtype=np.float64)
+	_CheckPeriod(data, period)
+
+	return SimpleMovingAverage(data, period) + RollingStd(data, period) * std_mult
+
+#%%
+def Shift(data:np.ndarray, periods:int) -> np.ndarray:
+	""" Like pandas shift along the last axis """
+	out = np.full(data.shape, np.nan)
+	if periods >= 0:
+		out[..., periods:] = data[..., :data.shape[-1] - periods]
+	else:
+		out[..., :periods] = data[..., -periods:]
+
+	return out
+
+#%%
+def IchimokuLines(high, low, close) -> dict:
+	""" Lines of the Ichimoku cloud from arrays of high, low and close """
+	tenkansen = (RollingMax(high, 9) + RollingMin(low, 9)) / 2   # Tenkan-sen (Conversion Line): (9-period hign + 9-period low)/2
+	kijunsen = (RollingMax(high, 26) + RollingMin(low, 26)) / 2   # Kijun-sen (Base Line): (26-period high + 26-period low)/2
+
+	return dict(
+		tenkansen = tenkansen,
+		kijunsen = kijunsen,
+		senkou_a = Shift((tenkansen + kijunsen) / 2, 26),   # Senkou Span A (Leading Span A): (Conversion Line + Base Line)/2
+		senkou_b = Shift((RollingMax(high, 52) + RollingMin(low, 52)) / 2, 52),   # Senkou Span B
+		chikouspan = Shift(np.asarray(close, dtype=np.float64), -26))   # Chikou Span: Most recent closing price, plotted 26 periods behind (optional)
+
 #%%
 def ComputeIchimokuCloud(df):
+	""" Adds the lines of the Ichimoku cloud to the dataframe """
+	lines = IchimokuLines(*[df[col].to_numpy(dtype=np.float64) for col in ['high', 'low', 'close']])
+	for col, values in lines.items():
+		df[col] = values
+
+	return df
+
+#%%
+def ComputeIchimokuCloudPandas(df):
 	""" Taken from the python for finance blog """
 
 	# Tenkan-sen (Conversion Line): (9-period hign + 9-period low)/2
@@ -40,26 +221,103 @@ class Indicators:
 	# number of indicators here); The purpose of this dict will become apparent
 
 	INDICATORS_DICT = {
+		"sma": SmoothedMovingAverage,
+		"ema": ExponentialMovingAverage,
+		"lbb": LowerBollingerBand,
+		"ubb": UpperBollingerBand,
+		"ichimoku": ComputeIchimokuCloud,
+	}
+
+	# Same indicators from pyti (and pandas), slower but used as a reference
+	PYTI_INDICATORS_DICT = {
 		"sma": sma,
 		"ema": ema,
 		"lbb": lbb,
 		"ubb": ubb,
-		"ichimoku": ComputeIchimokuCloud,
+		"ichimoku": ComputeIchimokuCloudPandas,
 	}
 
+	BACKENDS = dict(numpy=INDICATORS_DICT, pyti=PYTI_INDICATORS_DICT)
+
+	ICHIMOKU_COLUMNS = ['tenkansen', 'kijunsen', 'senkou_a', 'senkou_b', 'chikouspan']
+
+	# Indicators already computed, shared by all the bots and threads (256 MB of arrays at most)
+	CACHE = IndicatorCache(max_entries=1024, max_bytes=256 * 2**20)
+
 #%%
 	@staticmethod
-	def AddIndicator(df, indicator_name, col_name, args):
+	def AddIndicator(df, indicator_name, col_name, args, backend:str='numpy', use_cache:bool=True):
 		""" df is the dataframe to which we will add the indicator
 		indicator_name is the name of the indicator as found in the dict above
 		col_name is the name that the indicator will appear under in the dataframe
-		args are arguments that might be used when calling the indicator function"""
+		args are arguments that might be used when calling the indicator function
+		backend is 'numpy' (default) or 'pyti'
+		use_cache reads the indicator from Indicators.CACHE when it was already computed on the same candles """
 		try:
-			if indicator_name == "ichimoku": 
+			indicators_dict = Indicators.BACKENDS[backend]
+			if indicator_name == "ichimoku":
 				# this is a special case, because it will create more columns in the df
-				df = ComputeIchimokuCloud(df)
+				def compute():
+					cloud = indicators_dict[indicator_name](df[['high', 'low', 'close']].copy())
+					return {col: cloud[col].to_numpy() for col in Indicators.ICHIMOKU_COLUMNS}
+			else:
+				compute = lambda: indicators_dict[indicator_name](df['close'].to_numpy(dtype=np.float64), args)
+
+			if use_cache:
+				key = (IndicatorCache.Fingerprint(df), backend, indicator_name, args)
+				values = Indicators.CACHE.GetOrCompute(key, compute)
+			else:
+				values = compute()
+
+			if isinstance(values, dict):
+				for col, column_values in values.items():
+					df[col] = column_values
 			else:
-				df[col_name] = Indicators.INDICATORS_DICT[indicator_name](df['close'].tolist(), args)
+				df[col_name] = values
 		except Exception as e:
 			print("\nException raised when trying to compute "+indicator_name)
-			print(e)
\ No newline at end of file
+			print(e)
+
+#%%
+	@staticmethod
+	def AddMissing(df, indicators:list, use_cache:bool=True):
+		""" Adds the indicators (indicator_name, col_name, args) whose columns aren't in df yet.
+		df can also be a dict of arrays, with one symbol per row for 2D arrays (never cached) """
+		for indicator_name, col_name, args in indicators:
+			columns = Indicators.ICHIMOKU_COLUMNS if indicator_name == "ichimoku" else [col_name]
+			if all(df.__contains__(col) for col in columns):
+				continue
+
+			if not isinstance(df, dict):
+				Indicators.AddIndicator(df, indicator_name, col_name, args, use_cache=use_cache)
+			elif indicator_name == "ichimoku":
+				df.update(IchimokuLines(*[np.asarray(df[col], dtype=np.float64) for col in ['high', 'low', 'close']]))
+			else:
+				df[col_name] = Indicators.INDICATORS_DICT[indicator_name](np.asarray(df['close'], dtype=np.float64), args)
+
+#%%
+def Main():
+
+	import pandas as pd
+
+	for n in [10000, 1000000]:
+		close = 100 * np.exp(np.cumsum(np.random.normal(0, 0.001, n)))
+		df = pd.DataFrame(dict(close=close, high=close * 1.001, low=close * 0.999))
+		print(n, "candles")
+
+		for indicator_name, args in [("sma", 30), ("ema", 50), ("ema", 200), ("lbb", 14), ("ubb", 14), ("ichimoku", None)]:
+			times, dfs = dict(), dict()
+			for backend in ['pyti', 'numpy']:
+				dfs[backend] = df.copy()
+				start = time.perf_counter()
+				Indicators.AddIndicator(dfs[backend], indicator_name, 'indicator', args, backend, use_cache=False)
+				times[backend] = time.perf_counter() - start
+
+			cols = [col for col in dfs['numpy'].columns if col not in df.columns]
+			same = all(np.allclose(dfs['numpy'][col], dfs['pyti'][col], rtol=1e-9, atol=1e-9, equal_nan=True) for col in cols)
+			print("   ", indicator_name, args, ": pyti", round(times['pyti'] * 1000, 1), "ms, numpy", round(times['numpy'] * 1000, 1),
+				"ms, x" + str(round(times['pyti'] / times['numpy'], 1)), "same values:", same)
+
+#%%
+if __name__ == '__main__':
+	Main()
@@ -0,0 +1,111 @@
+import json
+import time
+import warnings
+import numpy as np
+import pandas as pd
+
+try:
+	import orjson   # Faster JSON decoder, used when it is installed
+except ImportError:
+	orjson = None
+
+from CandleStore import COLUMNS, CandlesToDataFrame
+
+# KlineParser.py converts the candles sent by the exchange straight from the raw bytes of the answer
+# to rows of float64 (time, open, high, low, close, volume), without building a python object per value.
+# The dataframe is only built at the end, on top of the array.
+
+KLINE_FIELDS = 12   # Values sent by the exchange for each candle
+STRIPPED = b'[]" \n\r\t'   # Removed from the answer, only the values and their separators are left
+
+#%%
+def loads(raw):
+	""" json.loads, with orjson when it is installed """
+	if orjson is not None:
+		return orjson.loads(raw)
+
+	return json.loads(raw)
+
+#%%
+def ParseKlines(raw) -> np.ndarray:
+	""" Returns the rows of candles of an answer of the klines endpoint (bytes or str) """
+	if isinstance(raw, str):
+		raw = raw.encode()
+
+	values = raw.translate(None, STRIPPED)   # The answer is only numbers, and strings of numbers
+	if len(values) == 0:   # No candle before the listing of the symbol
+		return np.empty((0, len(COLUMNS)), dtype=np.float64)
+
+	try:
+		with warnings.catch_warnings():
+			warnings.simplefilter('error')   # numpy only warns when it can't read the whole text
+			values = np.fromstring(values, dtype=np.float64, sep=',')
+		if len(values) % KLINE_FIELDS != 0:
+			raise ValueError("Unexpected number of values")
+	except (ValueError, DeprecationWarning):   # Not a list of candles (an error of the exchange) or an unexpected format
+		return _ParseKlinesJson(raw)
+
+	return values.reshape(-1, KLINE_FIELDS)[:, :len(COLUMNS)]   # View on the columns we're interested in
+
+#%%
+def _ParseKlinesJson(raw) -> np.ndarray:
+	""" Slower path through the json decoder """
+	data = loads(raw)
+	if isinstance(data, dict):
+		raise Exception("Error getting klines: " + str(data.get('msg', data)))
+
+	return np.array([kline[:len(COLUMNS)] for kline in data], dtype=np.float64).reshape(-1, len(COLUMNS))
+
+#%%
+def KlinesToDataFrame(raw, symbol:str=None, interval:str=None):
+	""" Builds the dataframe returned by Binance.GetSymbolKlines from an answer of the klines endpoint """
+	df = CandlesToDataFrame(ParseKlines(raw))
+	if symbol is not None:
+		df.attrs['symbol'] = symbol   # Candles know which symbol and interval they belong to
+		df.attrs['interval'] = interval
+
+	return df
+
+#%%
+def LegacyParseKlines(text):
+	""" Previous parsing of the candles (json, dataframe of strings, then one conversion per column), kept for the benchmark """
+	df = pd.DataFrame.from_dict(json.loads(text))
+	if len(df) == 0:
+		df = pd.DataFrame(columns=range(12))
+	df = df.drop(range(6, 12), axis=1)
+	df.columns = COLUMNS
+	for col in df.columns:
+		df[col] = df[col].astype(float)
+	df['date'] = pd.to_datetime(df['time'] * 1000000)
+
+	return df
+
+#%%
+def FakeKlines(n:int, start:int=1600000000000, interval_ms:int=60000) -> bytes:
+	""" Answer of the klines endpoint with n random candles """
+	close = 100 * np.exp(np.cumsum(np.random.normal(0, 0.001, n)))
+	klines = [[start + i * interval_ms, "%.8f" % c, "%.8f" % (c * 1.001), "%.8f" % (c * 0.999), "%.8f" % c, "%.8f" % v,
+		start + (i + 1) * interval_ms - 1, "%.8f" % (c * v), 100, "%.8f" % (v / 2), "%.8f" % (c * v / 2), "0"]
+		for i, (c, v) in enumerate(zip(close, np.random.uniform(1, 100, n)))]
+
+	return json.dumps(klines, separators=(',', ':')).encode()
+
+#%%
+def Main():
+
+	for n in [1000, 10000]:
+		raw = FakeKlines(n)
+		legacy = LegacyParseKlines(raw)
+		df = KlinesToDataFrame(raw)
+		print(n, "candles, same values:", (legacy[COLUMNS].to_numpy() == df[COLUMNS].to_numpy()).all())
+
+		for name, parse in [('legacy', LegacyParseKlines), ('KlineParser', KlinesToDataFrame), ('ParseKlines (no dataframe)', ParseKlines)]:
+			repeats = 20
+			start = time.perf_counter()
+			for _ in range(repeats):
+				parse(raw)
+			print("   ", name, round((time.perf_counter() - start) / repeats * 1000, 2), "ms")
+
+#%%
+if __name__ == '__main__':
+	Main()
@@ -0,0 +1,292 @@
+import json
+import time
+import asyncio
+import threading
+import numpy as np
+import websockets
+
+from CandleStore import COLUMNS, CandlesToDataFrame
+from Scheduler import Scheduler
+
+# KlineStream.py keeps the candles of every traded symbol up to date in memory from the
+# combined kline streams of Binance, so that the bots read their candles without any REST request.
+# KlineReplayServer is a local stand-in of the stream server replaying recorded candles.
+# Symbols subscribed once the streams are running are added to the open connections with SUBSCRIBE
+# requests, as the Binance stream server allows it.
+
+#%%
+class KlineStream:
+
+	def __init__(self, exchange, base:str='wss://stream.binance.com:9443', limit:int=1000, streams_per_connection:int=200):
+		self.exchange = exchange   # Used to get the initial candles (and the missed ones after a disconnection)
+		self.base = base   # Base of the stream urls
+		self.limit = limit   # Number of candles kept for each symbol
+		self.streams_per_connection = streams_per_connection   # Binance accepts up to 1024 streams per connection
+
+		self.frames = dict()   # Candles of each (symbol, interval), rows of (time, open, high, low, close, volume)
+		self.stale = set()   # (symbol, interval) whose frame missed candles and must be downloaded again
+		self.lock = threading.Lock()
+
+		self.loop = None
+		self.thread = None
+		self.connections = []   # {streams, ws} of each connection, ws is None while it is not connected
+		self.tasks = []   # Listening task of each connection
+		self.stopping = None   # asyncio.Event set by Stop
+		self.request_id = 0   # Id of the last SUBSCRIBE request
+
+#%%
+	def Subscribe(self, symbols:list, interval:str):
+		""" Adds symbols to the streams, their frames are downloaded now and kept up to date once started.
+		Once started, the new streams are subscribed on the open connections """
+		streams = []
+		for symbol in symbols:
+			if (symbol, interval) not in self.frames:
+				self._Seed(symbol, interval)
+				streams.append(symbol.lower() + '@kline_' + interval)
+
+		if self.thread is not None and len(streams) > 0:
+			asyncio.run_coroutine_threadsafe(self._Add(streams), self.loop).result()
+
+#%%
+	def _Seed(self, symbol:str, interval:str):
+		""" Downloads the frame of a symbol from the exchange """
+		df = self.exchange.GetSymbolKlines(symbol, interval, self.limit)
+		with self.lock:
+			self.frames[(symbol, interval)] = df[COLUMNS].to_numpy(dtype=np.float64)
+			self.stale.discard((symbol, interval))
+
+#%%
+	def Start(self):
+		""" Connects to the streams of all the subscribed symbols in a background thread """
+		if self.thread is not None:
+			self.Stop()
+
+		streams = [symbol.lower() + '@kline_' + interval for symbol, interval in self.frames]
+		self.connections = [dict(streams=streams[i:i+self.streams_per_connection], ws=None)
+			for i in range(0, len(streams), self.streams_per_connection)]
+		self.tasks = []
+		self.stopping = asyncio.Event()
+		self.loop = asyncio.new_event_loop()
+		self.thread = threading.Thread(target=self.loop.run_until_complete, args=(self._Run(),), daemon=True)
+		self.thread.start()
+
+#%%
+	def Stop(self):
+		""" Disconnects from the streams """
+		if self.thread is None:
+			return
+
+		self.loop.call_soon_threadsafe(self.stopping.set)   # The tasks are cancelled from the thread of the loop
+		self.thread.join()
+		self.loop.close()
+		self.loop = None
+		self.thread = None
+
+#%%
+	async def _Run(self):
+		self.tasks = [asyncio.ensure_future(self._Listen(connection)) for connection in self.connections]
+		await self.stopping.wait()
+		for task in self.tasks:
+			task.cancel()
+		await asyncio.gather(*self.tasks, return_exceptions=True)
+
+#%%
+	async def _Add(self, streams:list):
+		""" Adds streams to the last connection while it has room, to new connections after """
+		added = dict()   # index of the connection: its new streams
+		for stream in streams:
+			if len(self.connections) == 0 or len(self.connections[-1]['streams']) >= self.streams_per_connection:
+				self.connections.append(dict(streams=[], ws=None))
+				self.tasks.append(asyncio.ensure_future(self._Listen(self.connections[-1])))   # Connects with its streams in the url
+			self.connections[-1]['streams'].append(stream)
+			added.setdefault(len(self.connections) - 1, []).append(stream)
+
+		for k, new_streams in added.items():
+			ws = self.connections[k]['ws']
+			if ws is not None:   # Otherwise they are sent once it connects
+				await self._SendSubscribe(ws, new_streams)
+
+#%%
+	async def _SendSubscribe(self, ws, streams:list):
+		self.request_id += 1
+		await ws.send(json.dumps(dict(method='SUBSCRIBE', params=streams, id=self.request_id)))
+
+#%%
+	async def _Listen(self, connection:dict):
+		""" Reads the messages of a combined stream, reconnecting when the connection drops """
+		while True:
+			streams = list(connection['streams'])   # Streams of the url, the ones added while connecting are subscribed after
+			url = self.base + '/stream?streams=' + '/'.join(streams)
+			try:
+				async with websockets.connect(url) as ws:
+					connection['ws'] = ws
+					added = connection['streams'][len(streams):]
+					if len(added) > 0:
+						await self._SendSubscribe(ws, added)
+					async for message in ws:
+						self.OnMessage(message)
+			except asyncio.CancelledError:
+				raise
+			except Exception as e:
+				print("Exception occured on kline stream "+url)
+				print(e)
+			finally:
+				connection['ws'] = None
+
+			with self.lock:   # Candles may have been missed while disconnected
+				for stream in connection['streams']:
+					symbol, interval = stream.split('@kline_')
+					self.stale.add((symbol.upper(), interval))
+			await asyncio.sleep(1)
+
+#%%
+	def OnMessage(self, message):
+		""" Updates the frame of a symbol from a kline event """
+		message = json.loads(message)
+		if 'data' not in message:   # Answer to a SUBSCRIBE request
+			return
+		kline = message['data']['k']
+		key = (kline['s'], kline['i'])
+		row = np.array([kline['t'], kline['o'], kline['h'], kline['l'], kline['c'], kline['v']], dtype=np.float64)
+
+		with self.lock:
+			frame = self.frames.get(key, None)
+			if frame is None or len(frame) == 0:
+				return
+
+			if row[0] == frame[-1, 0]:   # The last candle is still open, it gets updated
+				frame[-1] = row
+			elif row[0] > frame[-1, 0]:   # A new candle opened
+				if row[0] > round(Scheduler.NextClose(key[1], frame[-1, 0] / 1000) * 1000):   # Next open time, months have different lengths
+					self.stale.add(key)   # Candles are missing in between
+				self.frames[key] = np.concatenate([frame[1:] if len(frame) >= self.limit else frame, row[None, :]])
+
+#%%
+	def IsSubscribed(self, symbol:str, interval:str):
+		return (symbol, interval) in self.frames
+
+#%%
+	def GetSymbolKlines(self, symbol:str, interval:str):
+		""" Returns the candles of a symbol like Binance.GetSymbolKlines, from memory """
+		if (symbol, interval) in self.stale:
+			self._Seed(symbol, interval)
+
+		with self.lock:
+			candles = np.array(self.frames[(symbol, interval)])   # Copy, the frame keeps changing
+
+		df = CandlesToDataFrame(candles)
+		df.attrs.update(symbol=symbol, interval=interval)
+
+		return df
+
+#%%
+class KlineReplayServer:
+	""" Local stand-in of the Binance stream server, sends recorded candles
+	as kline events to every client subscribed to their streams """
+
+	def __init__(self, candles:dict, delay:float=0.01, host:str='127.0.0.1', port:int=0):
+		self.candles = candles   # {(symbol, interval): dataframe of candles like Binance.GetSymbolKlines}
+		self.delay = delay   # Seconds between two events of a stream
+		self.host = host
+		self.port = port
+
+		self.loop = None
+		self.thread = None
+		self.server = None
+
+#%%
+	def Start(self) -> str:
+		""" Starts the server in a background thread, returns the base of its urls """
+		self.loop = asyncio.new_event_loop()
+		self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+		self.thread.start()
+		asyncio.run_coroutine_threadsafe(self._Serve(), self.loop).result()
+
+		return 'ws://' + self.host + ':' + str(self.port)
+
+#%%
+	def Stop(self):
+		self.server.close()
+		asyncio.run_coroutine_threadsafe(self.server.wait_closed(), self.loop).result()
+		self.loop.call_soon_threadsafe(self.loop.stop)
+		self.thread.join()
+
+#%%
+	async def _Serve(self):
+		self.server = await websockets.serve(self._Replay, self.host, self.port)
+		self.port = self.server.sockets[0].getsockname()[1]
+
+#%%
+	async def _Replay(self, ws, path=None):
+		request = getattr(ws, 'request', None)
+		path = request.path if request is not None else path
+		streams = path.split('streams=')[1].split('/')
+		replays = [asyncio.ensure_future(self._ReplayStream(ws, stream)) for stream in streams]
+		try:
+			async for message in ws:   # Like Binance, the connection stays open once there is nothing new to send
+				request = json.loads(message)
+				if request.get('method', None) == 'SUBSCRIBE':
+					replays.extend(asyncio.ensure_future(self._ReplayStream(ws, stream)) for stream in request['params'])
+					await ws.send(json.dumps(dict(result=None, id=request.get('id', None))))
+		except websockets.ConnectionClosed:
+			pass
+		finally:
+			for replay in replays:
+				replay.cancel()
+
+#%%
+	async def _ReplayStream(self, ws, stream:str):
+		symbol, interval = stream.split('@kline_')
+		symbol = symbol.upper()
+		df = self.candles.get((symbol, interval), None)
+		if df is None:
+			return
+
+		for row in df[COLUMNS].itertuples(index=False):
+			kline = dict(t=int(row.time), s=symbol, i=interval, o=str(row.open), h=str(row.high),
+				l=str(row.low), c=str(row.close), v=str(row.volume), x=True)
+			event = dict(e='kline', E=int(time.time()*1000), s=symbol, k=kline)
+			await ws.send(json.dumps(dict(stream=stream, data=event)))
+			await asyncio.sleep(self.delay)
+
+#%%
+def Main():
+
+	import os
+	import tempfile
+	from Binance import Binance
+	from MockBinance import MockBinance
+
+	# The candles come from a local MockBinance, the streams from the replay server : runs without network
+	symbols = ['BTCUSDT', 'ETHUSDT', 'BNBUSDT']
+	mock = MockBinance(symbols)
+	exchange = Binance(mock.SaveCredentials(os.path.join(tempfile.mkdtemp(), 'credentials.txt')), candles_dir=None)
+	exchange.base = mock.Start()
+
+	# The next 100 candles of each symbol, replayed as if they were happening now
+	interval_ms = Binance.KLINE_INTERVALS_MS['1m']
+	upcoming = dict()
+	for symbol in symbols:
+		df = exchange.GetSymbolKlines(symbol, '1m', 100)
+		df['time'] = df['time'] + 100 * interval_ms
+		upcoming[(symbol, '1m')] = df
+	server = KlineReplayServer(upcoming)
+	stream = KlineStream(exchange, base=server.Start())
+
+	stream.Subscribe(symbols[:2], '1m')
+	stream.Start()
+	stream.Subscribe(symbols[2:], '1m')   # Sent on the open connection
+	time.sleep(3)
+	stream.Stop()
+	server.Stop()
+	mock.Stop()
+
+	for symbol in symbols:
+		times = stream.GetSymbolKlines(symbol, '1m')['time'].to_numpy()
+		replayed = upcoming[(symbol, '1m')]['time'].to_numpy()
+		assert (times[-100:] == replayed).all() and (symbol, '1m') not in stream.stale
+		print(symbol, "up to date:", True)
+
+#%%
+if __name__ == '__main__':
+	Main()
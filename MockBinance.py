@@ -0,0 +1,711 @@
+import os
+import json
+import hmac
+import time
+import zlib
+import random
+import hashlib
+import tempfile
+import threading
+import numpy as np
+from decimal import Decimal
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl
+
+from Binance import Binance
+from RateLimiter import RateLimiter
+
+# MockBinance.py is a local stand-in of the Binance REST API : same endpoints, same answers, same errors,
+# signatures checked with the keys of the mock, latency and weight limits of our choice, and candles
+# generated as random walks (or replayed). Pointing Binance.base at it runs the bots offline.
+
+ENDPOINTS = {   # Same paths as Binance.endpoints
+	"order": '/api/v3/order',
+	"testOrder": '/api/v3/order/test',
+	"allOrders": '/api/v3/allOrders',
+	"openOrders": '/api/v3/openOrders',
+	"klines": '/api/v3/klines',
+	"exchangeInfo": '/api/v3/exchangeInfo',
+	"24hrTicker" : '/api/v3/ticker/24hr',
+	"averagePrice" : '/api/v3/avgPrice',
+	"orderBook" : '/api/v3/depth',
+	"account" : '/api/v3/account',
+	"time" : '/api/v3/time'
+}
+
+SIGNED_ENDPOINTS = ["order", "testOrder", "allOrders", "openOrders", "account"]   # Need the api key and a signature
+
+DEFAULT_SYMBOLS = ['BTCUSDT', 'ETHUSDT', 'BNBUSDT', 'LTCUSDT', 'ADAUSDT', 'XRPUSDT', 'EOSUSDT', 'XLMUSDT',
+	'TRXUSDT', 'VETUSDT', 'LINKUSDT', 'BATUSDT', 'XMRUSDT', 'ATOMUSDT', 'ALGOUSDT', 'QTUMUSDT']
+
+#%%
+class MockError(Exception):
+	""" Error answered by the exchange, with its code and http status """
+
+	def __init__(self, code:int, msg:str, status:int=400):
+		Exception.__init__(self, msg)
+		self.code = code
+		self.msg = msg
+		self.status = status
+
+#%%
+def FormatNumber(value) -> str:
+	""" Numbers are sent as strings with 8 decimals, like Binance """
+	return "%.8f" % value
+
+#%%
+class MockBinance:
+
+	def __init__(self, symbols:list=None, api_key:str='mock_api_key', secret_key:str='mock_secret_key',
+		latency:float=0, jitter:float=0, weight_limit:int=6000, min_notional:float=10, balance:float=10000,
+		candles:dict=None, history:int=5000, seed:int=0, host:str='127.0.0.1', port:int=0, clock_offset:float=0):
+
+		self.symbols = list(symbols) if symbols is not None else list(DEFAULT_SYMBOLS)
+		self.api_key = api_key
+		self.secret_key = secret_key
+		self.latency = latency   # Seconds added before answering any request
+		self.jitter = jitter   # Up to jitter more seconds, at random
+		self.weight_limit = weight_limit   # Weight allowed per minute, answers 429 above
+		self.min_notional = min_notional
+		self.history = history   # Number of candles generated before now for each (symbol, interval)
+		self.seed = seed
+		self.host = host
+		self.port = port
+		self.clock_offset = clock_offset   # Seconds the clock of the mock is ahead of the local one, as the exchange's can be
+
+		self.lock = threading.RLock()
+		self.rate_limiter = RateLimiter(ENDPOINTS)   # Only used to know the weight of the requests
+		self.minute = 0
+		self.used_weight = 0
+		self.stats = dict(requests=0, weight=0, rejected=0, errors=0)
+
+		self.prices = {symbol: self._BasePrice(symbol) for symbol in self.symbols}
+		self.ticks = {symbol: 10 ** (np.floor(np.log10(price)) - 4) for symbol, price in self.prices.items()}   # About 5 significant digits
+		self.steps = {symbol: min(10 ** np.floor(np.log10(0.01 / price)), 1) for symbol, price in self.prices.items()}   # Steps worth about a cent at most
+		self.exchange_info = json.dumps(self._ExchangeInfo()).encode()   # The same bytes are sent every time
+
+		self.candles = dict()   # (symbol, interval): rows of (time, open, high, low, close, volume), extended as time goes
+		for (symbol, interval), df in (candles or dict()).items():   # Replayed candles, followed by random ones
+			self.candles[(symbol, interval)] = df[['time', 'open', 'high', 'low', 'close', 'volume']].to_numpy(dtype=np.float64)
+
+		self.balances = {'USDT': [Decimal(balance), Decimal(0)]}   # asset: [free, locked]
+		self.orders = dict()   # orderId: order
+		self.client_order_ids = dict()   # clientOrderId: orderId
+		self.next_order_id = 1
+		self.last_update_id = 1   # Of the order books
+
+		self.routes = {
+			('order', 'POST'): self.NewOrder,
+			('order', 'GET'): self.QueryOrder,
+			('order', 'DELETE'): self.CancelOrder,
+			('testOrder', 'POST'): self.TestOrder,
+			('allOrders', 'GET'): self.AllOrders,
+			('openOrders', 'GET'): self.OpenOrders,
+			('klines', 'GET'): self.Klines,
+			('exchangeInfo', 'GET'): lambda params: self.exchange_info,
+			('24hrTicker', 'GET'): self.Ticker24hr,
+			('averagePrice', 'GET'): self.AveragePrice,
+			('orderBook', 'GET'): self.Depth,
+			('account', 'GET'): self.Account,
+			('time', 'GET'): lambda params: dict(serverTime=int(self.Now() * 1000)),
+		}
+
+		self.server = None
+		self.thread = None
+
+#%%
+	def Now(self) -> float:
+		""" Time of the mock in seconds, the times it answers and the candles follow it """
+		return time.time() + self.clock_offset
+
+#%%
+	def Start(self) -> str:
+		""" Starts the server in a background thread, returns the base of its urls (for Binance.base) """
+		mock = self
+
+		class Handler(_Handler):
+			pass
+		Handler.mock = mock
+
+		self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+		self.server.daemon_threads = True
+		self.port = self.server.server_address[1]
+		self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+		self.thread.start()
+
+		return 'http://' + self.host + ':' + str(self.port)
+
+#%%
+	def Stop(self):
+		self.server.shutdown()
+		self.server.server_close()
+		self.thread.join()
+
+#%%
+	def SaveCredentials(self, path:str) -> str:
+		""" Writes the keys of the mock in a credentials file for Binance, returns its path """
+		with open(path, 'w') as f:
+			f.write(self.api_key + '\n' + self.secret_key)
+
+		return path
+
+#%%
+	def GetStats(self) -> dict:
+		with self.lock:
+			return dict(self.stats)
+
+#%%
+	def Handle(self, method:str, path:str, body:str, headers) -> tuple:
+		""" Answers a request, returns (status, headers, body) """
+		if self.latency > 0 or self.jitter > 0:
+			time.sleep(self.latency + random.random() * self.jitter)
+
+		split_path = urlsplit(path)
+		total_params = split_path.query + ('&' if split_path.query and body else '') + body   # Signed the same way by Binance
+		params = dict(parse_qsl(total_params))
+		endpoint, weight, priority = self.rate_limiter.RequestWeight(method, split_path.path, params)
+
+		with self.lock:
+			now = self.Now()
+			if int(now // 60) != self.minute:
+				self.minute = int(now // 60)
+				self.used_weight = 0
+			self.stats['requests'] += 1
+			self.used_weight += weight
+			used_weight = self.used_weight
+			over_limit = used_weight > self.weight_limit
+
+		answer_headers = {'X-MBX-USED-WEIGHT-1M': str(used_weight), 'Content-Type': 'application/json;charset=UTF-8'}
+		if over_limit:
+			with self.lock:
+				self.stats['rejected'] += 1
+			answer_headers['Retry-After'] = str(int(60 - now % 60) + 1)
+			return 429, answer_headers, self._Error(MockError(-1003, "Too many requests; current limit is "
+				+ str(self.weight_limit) + " request weight per 1 MINUTE.", 429))
+
+		route = self.routes.get((endpoint, method), None)
+		try:
+			if route is None:
+				raise MockError(-1000, "Unknown endpoint " + method + " " + split_path.path, 404)
+			if endpoint in SIGNED_ENDPOINTS:
+				self._CheckSignature(headers, total_params, params)
+			data = route(params)
+		except MockError as e:
+			with self.lock:
+				self.stats['errors'] += 1
+			return e.status, answer_headers, self._Error(e)
+
+		with self.lock:
+			self.stats['weight'] += weight
+
+		return 200, answer_headers, data if isinstance(data, bytes) else json.dumps(data).encode()
+
+#%%
+	def _Error(self, e:MockError) -> bytes:
+		return json.dumps(dict(code=e.code, msg=e.msg)).encode()
+
+#%%
+	def _CheckSignature(self, headers, total_params:str, params:dict):
+		""" Checks the api key, the signature and the timestamp of a signed request like Binance """
+		if headers.get('X-MBX-APIKEY', None) != self.api_key:
+			raise MockError(-2015, "Invalid API-key, IP, or permissions for action.", 401)
+
+		if 'signature' not in params:
+			raise MockError(-1102, "Mandatory parameter 'signature' was not sent, was empty/null, or malformed.")
+		signed = '&'.join(part for part in total_params.split('&') if part and not part.startswith('signature='))
+		signature = hmac.new(self.secret_key.encode('utf-8'), signed.encode('utf-8'), hashlib.sha256).hexdigest()
+		if not hmac.compare_digest(signature, params['signature']):
+			raise MockError(-1022, "Signature for this request is not valid.")
+
+		timestamp = int(self._Param(params, 'timestamp'))
+		recv_window = int(params.get('recvWindow', 5000))
+		now = int(self.Now() * 1000)
+		if recv_window > 60000:
+			raise MockError(-1131, "recvWindow must be less than 60000")
+		if timestamp > now + 1000 or now - timestamp > recv_window:
+			raise MockError(-1021, "Timestamp for this request is outside of the recvWindow.")
+
+#%%
+	def _Param(self, params:dict, name:str):
+		if params.get(name, '') == '':
+			raise MockError(-1102, "Mandatory parameter '" + name + "' was not sent, was empty/null, or malformed.")
+
+		return params[name]
+
+#%%
+	def _Symbol(self, params:dict) -> str:
+		symbol = self._Param(params, 'symbol')
+		if symbol not in self.prices:
+			raise MockError(-1121, "Invalid symbol.")
+
+		return symbol
+
+#%%
+	def _BasePrice(self, symbol:str) -> float:
+		""" Price of a symbol when the candles start, the same for a seed """
+		rng = np.random.default_rng(zlib.crc32(symbol.encode()) + self.seed)
+
+		return float(10 ** rng.uniform(-1, 4.5))
+
+#%%
+	def _ExchangeInfo(self) -> dict:
+		symbols = []
+		for symbol in self.symbols:
+			base_asset = symbol[:-4] if symbol.endswith('USDT') else symbol[:-3]
+			symbols.append(dict(
+				symbol = symbol,
+				status = 'TRADING',
+				baseAsset = base_asset,
+				baseAssetPrecision = 8,
+				quoteAsset = symbol[len(base_asset):],
+				quotePrecision = 8,
+				orderTypes = ['LIMIT', 'MARKET'],
+				isSpotTradingAllowed = True,
+				filters = [
+					dict(filterType='PRICE_FILTER', minPrice=FormatNumber(self.ticks[symbol]), maxPrice='1000000.00000000', tickSize=FormatNumber(self.ticks[symbol])),
+					dict(filterType='LOT_SIZE', minQty=FormatNumber(self.steps[symbol]), maxQty='9000000.00000000', stepSize=FormatNumber(self.steps[symbol])),
+					dict(filterType='MIN_NOTIONAL', minNotional=FormatNumber(self.min_notional), applyToMarket=True, avgPriceMins=5)]))
+
+		return dict(
+			timezone = 'UTC',
+			serverTime = int(self.Now() * 1000),
+			rateLimits = [dict(rateLimitType='REQUEST_WEIGHT', interval='MINUTE', intervalNum=1, limit=self.weight_limit)],
+			symbols = symbols)
+
+#%%
+	def _Candles(self, symbol:str, interval:str) -> np.ndarray:
+		""" Candles of a symbol up to the one open now, generated when missing """
+		interval_ms = Binance.KLINE_INTERVALS_MS[interval]
+		now_open = int(self.Now() * 1000) // interval_ms * interval_ms
+		with self.lock:
+			candles = self.candles.get((symbol, interval), None)
+			if candles is None:
+				first_open = now_open - (self.history - 1) * interval_ms
+				candles = self._RandomWalk(symbol, interval, first_open, self.history, self.prices[symbol])
+			elif candles[-1, 0] < now_open:   # Time went on since the last request
+				missing = int((now_open - candles[-1, 0]) // interval_ms)
+				candles = np.concatenate([candles, self._RandomWalk(symbol, interval, candles[-1, 0] + interval_ms, missing, candles[-1, 4])])
+			self.candles[(symbol, interval)] = candles
+
+			return candles
+
+#%%
+	def _RandomWalk(self, symbol:str, interval:str, first_open:int, n:int, open_price:float) -> np.ndarray:
+		""" n candles from first_open, the price following a geometric random walk """
+		interval_ms = Binance.KLINE_INTERVALS_MS[interval]
+		rng = np.random.default_rng([zlib.crc32((symbol + interval).encode()), int(first_open) // 1000, self.seed])
+		volatility = 0.001 * np.sqrt(interval_ms / 60000)   # Of the returns of one candle
+
+		close = open_price * np.exp(np.cumsum(rng.normal(0, volatility, n)))
+		opens = np.concatenate([[open_price], close[:-1]])
+		high = np.maximum(opens, close) * (1 + np.abs(rng.normal(0, volatility / 2, n)))
+		low = np.minimum(opens, close) * (1 - np.abs(rng.normal(0, volatility / 2, n)))
+		tick = self.ticks[symbol]
+		candles = np.column_stack([
+			first_open + np.arange(n) * interval_ms,
+			np.round(opens / tick) * tick, np.round(high / tick) * tick, np.round(low / tick) * tick, np.round(close / tick) * tick,
+			np.round(rng.lognormal(3, 1, n) / self.steps[symbol]) * self.steps[symbol]])
+
+		return candles
+
+#%%
+	def _LastPrice(self, symbol:str) -> float:
+		return float(self._Candles(symbol, '1m')[-1, 4])
+
+#%%
+	def Klines(self, params:dict):
+		symbol = self._Symbol(params)
+		interval = self._Param(params, 'interval')
+		if interval not in Binance.KLINE_INTERVALS_MS:
+			raise MockError(-1120, "Invalid interval.")
+		limit = min(int(params.get('limit', 500)), 1000)
+		interval_ms = Binance.KLINE_INTERVALS_MS[interval]
+
+		candles = self._Candles(symbol, interval)
+		if 'endTime' in params:
+			candles = candles[:np.searchsorted(candles[:, 0], int(params['endTime']), side='right')]
+		if 'startTime' in params:   # The first candles from startTime
+			candles = candles[np.searchsorted(candles[:, 0], int(params['startTime'])):][:limit]
+		else:   # The last candles up to endTime
+			candles = candles[-limit:]
+
+		return [[int(t), FormatNumber(o), FormatNumber(h), FormatNumber(l), FormatNumber(c), FormatNumber(v), int(t) + interval_ms - 1,
+			FormatNumber(c * v), 100, FormatNumber(v / 2), FormatNumber(c * v / 2), "0"] for t, o, h, l, c, v in candles]
+
+#%%
+	def Ticker24hr(self, params:dict):
+		if 'symbol' not in params:   # All the symbols at once
+			return [self._Ticker24hr(symbol) for symbol in self.symbols]
+
+		return self._Ticker24hr(self._Symbol(params))
+
+#%%
+	def _Ticker24hr(self, symbol:str) -> dict:
+		candles = self._Candles(symbol, '1m')[-1440:]   # Last 24 hours
+		open_price, last_price = candles[0, 1], candles[-1, 4]
+		volume = candles[:, 5].sum()
+		quote_volume = (candles[:, 4] * candles[:, 5]).sum()
+
+		return dict(
+			symbol = symbol,
+			priceChange = FormatNumber(last_price - open_price),
+			priceChangePercent = "%.3f" % ((last_price / open_price - 1) * 100),
+			weightedAvgPrice = FormatNumber(quote_volume / volume),
+			prevClosePrice = FormatNumber(candles[-2, 4] if len(candles) > 1 else open_price),
+			lastPrice = FormatNumber(last_price),
+			lastQty = FormatNumber(self.steps[symbol]),
+			bidPrice = FormatNumber(last_price - self.ticks[symbol]),
+			bidQty = FormatNumber(candles[-1, 5] / 10),
+			askPrice = FormatNumber(last_price + self.ticks[symbol]),
+			askQty = FormatNumber(candles[-1, 5] / 10),
+			openPrice = FormatNumber(open_price),
+			highPrice = FormatNumber(candles[:, 2].max()),
+			lowPrice = FormatNumber(candles[:, 3].min()),
+			volume = FormatNumber(volume),
+			quoteVolume = FormatNumber(quote_volume),
+			openTime = int(candles[0, 0]),
+			closeTime = int(self.Now() * 1000),
+			firstId = 0,
+			lastId = 100 * len(candles) - 1,
+			count = 100 * len(candles))
+
+#%%
+	def AveragePrice(self, params:dict):
+		candles = self._Candles(self._Symbol(params), '1m')[-5:]
+
+		return dict(mins=5, price=FormatNumber(candles[:, 4].mean()))
+
+#%%
+	def Depth(self, params:dict):
+		""" Levels of one tick around the last price, with random quantities """
+		symbol = self._Symbol(params)
+		limit = int(params.get('limit', 100))
+		if limit not in [5, 10, 20, 50, 100, 500, 1000, 5000]:
+			raise MockError(-1100, "Illegal characters found in parameter 'limit'; legal range is '5, 10, 20, 50, 100, 500, 1000, 5000'.")
+		limit = min(limit, 1000)
+
+		price, tick = self._LastPrice(symbol), self.ticks[symbol]
+		with self.lock:
+			self.last_update_id += 1
+			last_update_id = self.last_update_id
+		rng = np.random.default_rng(last_update_id)
+		bids = price - tick * np.arange(1, limit + 1)
+		asks = price + tick * np.arange(1, limit + 1)
+		quantities = np.round(rng.lognormal(0, 1, (2, limit)) / self.steps[symbol]) * self.steps[symbol] + self.steps[symbol]
+
+		return dict(
+			lastUpdateId = last_update_id,
+			bids = [[FormatNumber(p), FormatNumber(q)] for p, q in zip(bids, quantities[0]) if p > 0],
+			asks = [[FormatNumber(p), FormatNumber(q)] for p, q in zip(asks, quantities[1])])
+
+#%%
+	def Account(self, params:dict):
+		with self.lock:
+			self._MatchOrders()
+			balances = [dict(asset=asset, free=FormatNumber(free), locked=FormatNumber(locked)) for asset, (free, locked) in self.balances.items()]
+
+		return dict(
+			makerCommission = 10, takerCommission = 10, buyerCommission = 0, sellerCommission = 0,
+			canTrade = True, canWithdraw = True, canDeposit = True,
+			updateTime = int(self.Now() * 1000),
+			accountType = 'SPOT',
+			balances = balances,
+			permissions = ['SPOT'])
+
+#%%
+	def _ValidateOrder(self, params:dict) -> dict:
+		""" Checks the params of a new order against the filters of its symbol """
+		symbol = self._Symbol(params)
+		side = self._Param(params, 'side')
+		order_type = self._Param(params, 'type')
+		if side not in ['BUY', 'SELL']:
+			raise MockError(-1100, "Illegal characters found in parameter 'side'; legal range is 'BUY, SELL'.")
+		if order_type not in ['LIMIT', 'MARKET']:
+			raise MockError(-1116, "Invalid orderType.")
+
+		quantity = Decimal(self._Param(params, 'quantity'))
+		step = Decimal(FormatNumber(self.steps[symbol]))
+		if quantity < step or quantity % step != 0:
+			raise MockError(-1013, "Filter failure: LOT_SIZE")
+
+		if order_type == 'LIMIT':
+			if params.get('timeInForce', None) not in ['GTC', 'IOC', 'FOK']:
+				raise MockError(-1102, "Mandatory parameter 'timeInForce' was not sent, was empty/null, or malformed.")
+			price = Decimal(self._Param(params, 'price'))
+			tick = Decimal(FormatNumber(self.ticks[symbol]))
+			if price < tick or price % tick != 0:
+				raise MockError(-1013, "Filter failure: PRICE_FILTER")
+		else:
+			price = Decimal(FormatNumber(self._LastPrice(symbol)))
+
+		if price * quantity < Decimal(FormatNumber(self.min_notional)):
+			raise MockError(-1013, "Filter failure: MIN_NOTIONAL")
+
+		return dict(symbol=symbol, side=side, type=order_type, price=price, quantity=quantity)
+
+#%%
+	def TestOrder(self, params:dict):
+		self._ValidateOrder(params)
+
+		return dict()
+
+#%%
+	def NewOrder(self, params:dict):
+		""" Places an order, its funds are locked until it is filled or canceled """
+		new = self._ValidateOrder(params)
+		symbol, side, price, quantity = new['symbol'], new['side'], new['price'], new['quantity']
+		base_asset = symbol[:-4] if symbol.endswith('USDT') else symbol[:-3]
+		quote_asset = symbol[len(base_asset):]
+		asset, amount = (quote_asset, price * quantity) if side == 'BUY' else (base_asset, quantity)
+
+		with self.lock:
+			client_order_id = params.get('newClientOrderId', 'mock' + str(self.next_order_id))
+			if client_order_id in self.client_order_ids:
+				raise MockError(-2010, "Duplicate order sent.")
+
+			balance = self.balances.setdefault(asset, [Decimal(0), Decimal(0)])
+			if balance[0] < amount:
+				raise MockError(-2010, "Account has insufficient balance for requested action.")
+			balance[0] -= amount
+			balance[1] += amount
+
+			order = dict(
+				symbol = symbol,
+				orderId = self.next_order_id,
+				orderListId = -1,
+				clientOrderId = client_order_id,
+				transactTime = int(self.Now() * 1000),
+				price = price if new['type'] == 'LIMIT' else Decimal(0),
+				origQty = quantity,
+				executedQty = Decimal(0),
+				cummulativeQuoteQty = Decimal(0),
+				status = 'NEW',
+				timeInForce = params.get('timeInForce', 'GTC'),
+				type = new['type'],
+				side = side,
+				base_asset = base_asset, quote_asset = quote_asset, limit_price = price)   # Kept by the mock only
+			self.orders[order['orderId']] = order
+			self.client_order_ids[client_order_id] = order['orderId']
+			self.next_order_id += 1
+
+			if new['type'] == 'MARKET':
+				self._Fill(order, price)
+			else:
+				self._MatchOrders(symbol)
+
+			return self._OrderAnswer(order, transact_time=True)
+
+#%%
+	def _Fill(self, order:dict, price:Decimal):
+		""" Fills an order entirely, the locked funds are exchanged """
+		quantity = order['origQty']
+		if order['side'] == 'BUY':
+			self.balances[order['quote_asset']][1] -= order['limit_price'] * quantity
+			self.balances[order['quote_asset']][0] += (order['limit_price'] - price) * quantity   # Filled below the limit
+			self.balances.setdefault(order['base_asset'], [Decimal(0), Decimal(0)])[0] += quantity
+		else:
+			self.balances[order['base_asset']][1] -= quantity
+			self.balances.setdefault(order['quote_asset'], [Decimal(0), Decimal(0)])[0] += price * quantity
+
+		order['executedQty'] = quantity
+		order['cummulativeQuoteQty'] = price * quantity
+		order['status'] = 'FILLED'
+		order['updateTime'] = int(self.Now() * 1000)
+
+#%%
+	def _MatchOrders(self, symbol:str=None):
+		""" Fills the open limit orders whose price was reached by a candle since they were placed """
+		for order in self.orders.values():
+			if order['status'] != 'NEW' or (symbol is not None and order['symbol'] != symbol):
+				continue
+
+			candles = self._Candles(order['symbol'], '1m')
+			candles = candles[np.searchsorted(candles[:, 0], order['transactTime'] // 60000 * 60000):]
+			price = order['limit_price']
+			if order['side'] == 'BUY' and len(candles) > 0 and candles[:, 3].min() <= float(price):
+				self._Fill(order, price)
+			elif order['side'] == 'SELL' and len(candles) > 0 and candles[:, 2].max() >= float(price):
+				self._Fill(order, price)
+
+#%%
+	def _OrderAnswer(self, order:dict, transact_time:bool=False) -> dict:
+		""" The order as sent by the exchange """
+		answer = dict(
+			symbol = order['symbol'],
+			orderId = order['orderId'],
+			orderListId = -1,
+			clientOrderId = order['clientOrderId'],
+			price = FormatNumber(order['price']),
+			origQty = FormatNumber(order['origQty']),
+			executedQty = FormatNumber(order['executedQty']),
+			cummulativeQuoteQty = FormatNumber(order['cummulativeQuoteQty']),
+			status = order['status'],
+			timeInForce = order['timeInForce'],
+			type = order['type'],
+			side = order['side'])
+		if transact_time:   # Answer to a new order
+			answer['transactTime'] = order['transactTime']
+		else:
+			answer['time'] = order['transactTime']
+			answer['updateTime'] = order.get('updateTime', order['transactTime'])
+			answer['isWorking'] = True
+
+		return answer
+
+#%%
+	def _FindOrder(self, params:dict, error:MockError) -> dict:
+		""" Order of the request, from its orderId or its clientOrderId """
+		symbol = self._Symbol(params)
+		if params.get('orderId', '') != '':
+			try:
+				order_id = int(params['orderId'])
+			except ValueError:
+				raise MockError(-1100, "Illegal characters found in parameter 'orderId'; legal range is '^[0-9]{1,20}$'.")
+		elif params.get('origClientOrderId', '') != '':
+			order_id = self.client_order_ids.get(params['origClientOrderId'], None)
+		else:
+			raise MockError(-1102, "Param 'origClientOrderId' or 'orderId' must be sent, but both were empty/null!")
+
+		order = self.orders.get(order_id, None)
+		if order is None or order['symbol'] != symbol:
+			raise error
+
+		return order
+
+#%%
+	def QueryOrder(self, params:dict):
+		with self.lock:
+			order = self._FindOrder(params, MockError(-2013, "Order does not exist."))
+			self._MatchOrders(order['symbol'])
+
+			return self._OrderAnswer(order)
+
+#%%
+	def CancelOrder(self, params:dict):
+		with self.lock:
+			order = self._FindOrder(params, MockError(-2011, "Unknown order sent."))
+			self._MatchOrders(order['symbol'])
+			if order['status'] != 'NEW':   # Filled in the meantime
+				raise MockError(-2011, "Unknown order sent.")
+
+			if order['side'] == 'BUY':   # The locked funds are free again
+				amount, asset = order['limit_price'] * order['origQty'], order['quote_asset']
+			else:
+				amount, asset = order['origQty'], order['base_asset']
+			self.balances[asset][0] += amount
+			self.balances[asset][1] -= amount
+			order['status'] = 'CANCELED'
+			order['updateTime'] = int(self.Now() * 1000)
+
+			return self._OrderAnswer(order)
+
+#%%
+	def OpenOrders(self, params:dict):
+		symbol = self._Symbol(params) if 'symbol' in params else None
+		with self.lock:
+			self._MatchOrders(symbol)
+
+			return [self._OrderAnswer(order) for order in self.orders.values()
+				if order['status'] == 'NEW' and (symbol is None or order['symbol'] == symbol)]
+
+#%%
+	def AllOrders(self, params:dict):
+		symbol = self._Symbol(params)
+		start_time = int(params.get('startTime', 0))
+		limit = min(int(params.get('limit', 500)), 1000)
+		with self.lock:
+			self._MatchOrders(symbol)
+			orders = [order for order in self.orders.values() if order['symbol'] == symbol and order['transactTime'] >= start_time]
+
+			return [self._OrderAnswer(order) for order in orders[:limit]]
+
+#%%
+class _Handler(BaseHTTPRequestHandler):
+	""" Passes the requests to the MockBinance of the server """
+	protocol_version = 'HTTP/1.1'   # Connections are kept alive like on Binance
+	mock = None
+
+	def _Answer(self, method:str):
+		length = int(self.headers.get('Content-Length', 0))
+		body = self.rfile.read(length).decode() if length > 0 else ''
+		status, headers, data = self.mock.Handle(method, self.path, body, self.headers)
+
+		self.send_response(status)
+		for name, value in headers.items():
+			self.send_header(name, value)
+		self.send_header('Content-Length', str(len(data)))
+		self.end_headers()
+		self.wfile.write(data)
+
+	def do_GET(self):
+		self._Answer('GET')
+
+	def do_POST(self):
+		self._Answer('POST')
+
+	def do_DELETE(self):
+		self._Answer('DELETE')
+
+	def log_message(self, format, *args):   # Quiet
+		pass
+
+#%%
+class _QuietSpinner:
+	""" Stands for the spinner of BotRunner when benchmarking """
+	text = ''
+
+	def start(self):
+		pass
+
+	def stop(self):
+		pass
+
+#%%
+def Main(n_symbols:int=100, ticks:int=5, latency:float=0.02, batch:bool=False):
+
+	from BotRunner import BotRunner
+	from Database import BotDatabase
+	from Strategies import strategies_dict
+
+	# Mock with n_symbols symbols answering after latency seconds, small min notional so that the bot places orders
+	symbols = ['SYM%03dUSDT' % i for i in range(n_symbols)]
+	mock = MockBinance(symbols, latency=latency, min_notional=0.01)
+	directory = tempfile.mkdtemp()
+
+	exchange = Binance(mock.SaveCredentials(os.path.join(directory, 'credentials.txt')), candles_dir=None)
+	exchange.base = mock.Start()
+	database = BotDatabase(os.path.join(directory, 'database.db'))
+	runner = BotRunner(_QuietSpinner(), exchange, database, batch=batch)
+
+	bot, symbol_datas_dict = runner.CreateBot(name='MockBot', strategy_name='bollinger_simple', interval='1m',
+		trade_allocation=0.1, profit_target=1.001, test=False, symbols=symbols)
+	runner.planner.Register(symbols, bot['interval'], strategies_dict[bot['strategy_name']])
+
+	start = time.perf_counter()
+	for tick in range(ticks):   # Same steps as a tick of BotRunner.StartExecution, for one bot
+		tick_start = time.perf_counter()
+		runner.NewTick()
+		pairs = {pair['symbol']: pair for pair in database.GetActivePairsOfBot(bot)}
+		symbol_datas = runner.SymbolsThisTick(bot, [symbol_datas_dict[symbol] for symbol in pairs])
+		run = runner.RunBatch if batch else runner.Run
+		run(bot, strategies_dict[bot['strategy_name']], pairs, symbol_datas)
+
+		open_orders = database.GetOpenOrdersOfBot(bot)
+		if len(open_orders) > 0:
+			runner.Exit(bot, {pair['symbol']: pair for pair in database.GetAllPairsOfBot(bot)}, open_orders)
+		print("Tick", tick, ":", len(symbol_datas), "symbols checked,", len(open_orders), "orders open,",
+			round(time.perf_counter() - tick_start, 2), "s")
+
+	elapsed = time.perf_counter() - start
+	stats = mock.GetStats()
+	print(stats['requests'], "requests in", round(elapsed, 2), "s :", round(stats['requests'] / elapsed, 1), "requests/s")
+	print("Mock:", stats)
+	print("Connections:", exchange.GetConnectionStats())
+
+	runner.Close()
+	exchange.Close()
+	mock.Stop()
+
+#%%
+if __name__ == '__main__':
+	Main()
@@ -0,0 +1,258 @@
+import json
+import time
+import random
+import sqlite3
+import itertools
+import numpy as np
+from multiprocessing import Pool, shared_memory
+
+from CandleStore import CandlesToDataFrame
+from Indicators import Indicators
+from Strategies import strategies_dict
+from Backtester import Backtester
+
+# Optimizer.py searches the best settings of a bot (strategy, interval, trade_allocation, profit_target and the
+# periods of the indicators of the strategy) by running backtests over a pool of processes. The candles are
+# copied once into shared memory, where every process reads them without pickling, and the results are
+# written to a table of a sqlite database as they come. Configurations losing too much on the first part
+# of the candles are stopped there instead of being backtested on all of them.
+
+#%%
+def Grid(space:dict) -> list:
+	""" Returns every configuration of space {parameter: list of values} """
+	keys = list(space.keys())
+	return [dict(zip(keys, values)) for values in itertools.product(*[space[key] for key in keys])]
+
+#%%
+def RandomSearch(space:dict, n:int, seed=None) -> list:
+	""" Returns n configurations drawn at random from space, without repetition """
+	rng = random.Random(seed)
+	size = int(np.prod([len(values) for values in space.values()]))
+	if n >= size:
+		return Grid(space)
+
+	keys = list(space.keys())
+	seen = set()
+	configs = []
+	while len(configs) < n:
+		values = tuple(rng.randrange(len(space[key])) for key in keys)
+		if values not in seen:
+			seen.add(values)
+			configs.append({key: space[key][k] for key, k in zip(keys, values)})
+
+	return configs
+
+#%%
+_worker = dict(blocks=dict(), frames=dict())   # Shared memory attached by each process of the pool, and the candles read from it
+
+def _InitWorker(blocks:dict):
+	""" Attaches the process to the shared memory holding the candles {interval: (name, shape)} """
+	for interval, (name, shape) in blocks.items():
+		block = shared_memory.SharedMemory(name=name)
+		_worker['blocks'][interval] = block
+		candles = np.ndarray(shape, dtype=np.float64, buffer=block.buf)
+		_worker['frames'][interval] = CandlesToDataFrame(candles, copy=False)   # Columns read from the shared memory, not copied into each process
+
+#%%
+def _Backtest(df, config:dict, state:dict=None) -> dict:
+	""" Backtests a configuration on the candles of df, resuming the backtest of state if given.
+	The indicators are columns of df only, not Indicators.CACHE : they are dropped with df after the configuration """
+	strategy = strategies_dict[config['strategy_name']]
+	indicators = getattr(strategy, 'indicators', [])
+	for indicator_name, col_name, args in indicators:
+		if col_name in config:   # Period of the indicator set by the configuration
+			Indicators.AddIndicator(df, indicator_name, col_name, config[col_name], use_cache=False)
+	Indicators.AddMissing(df, indicators, use_cache=False)
+
+	backtester = Backtester(df, strategy, profit_target=config['profit_target'], trade_allocation=config['trade_allocation'])
+	results = backtester.Run(state=state)
+	del results['trades'], results['equity'], results['drawdown']   # Only the figures go back to the main process
+
+	return results
+
+#%%
+def _RunConfig(config:dict, stages:tuple, max_drawdown:float, min_profit:float) -> dict:
+	""" Backtests a configuration on growing parts of the candles (stages), stopping at the first one
+	where it loses more than min_profit or its drawdown goes below max_drawdown.
+	Each stage resumes the trades of the previous one instead of simulating its candles again. Only the
+	indicators are recomputed from the first candle, as they are cheap next to the backtest """
+	start = time.perf_counter()
+	df = _worker['frames'][config['interval']]
+	state = None
+	for stage in stages:
+		part = df.iloc[:int(len(df) * stage)].copy(deep=False) if stage < 1 else df.copy(deep=False)   # New columns don't reach the shared frame
+		results = _Backtest(part, config, state)
+		state = results.pop('state')
+		stopped = stage < 1 and (results['max_drawdown'] < max_drawdown or results['profit'] < min_profit)
+		if stopped:
+			break
+
+	results.update(config=config, stage=stage, stopped=stopped, elapsed=time.perf_counter() - start)
+	return results
+
+#%%
+class Optimizer:
+
+	def __init__(self, candles:dict, database:str='sweep.db', processes:int=None):
+		""" Configurations are dicts of strategy_name, interval, trade_allocation, profit_target and the periods
+		of the indicators of the strategy by column name (slow_sma = 30 for ma_simple) """
+		self.candles = candles   # interval: candles rows (time, open, high, low, close, volume), as read from CandleStore
+		self.database = database   # sqlite file of the results table
+		self.processes = processes   # Size of the pool, the number of cores if None
+		self.Initialise()
+
+#%%
+	def Initialise(self):
+		""" Creates the results table """
+		conn = sqlite3.connect(self.database)
+		conn.execute('''CREATE TABLE IF NOT EXISTS results (
+			id integer primary key autoincrement,
+			sweep text,
+			config text,
+			strategy_name text,
+			interval text,
+			trade_allocation real,
+			profit_target real,
+			stage real,
+			stopped bool,
+			profit real,
+			max_drawdown real,
+			fees real,
+			closed_trades integer,
+			win_rate real,
+			elapsed real
+			)''')
+		conn.commit()
+		conn.close()
+
+#%%
+	def _SharedBlocks(self) -> dict:
+		""" Copies the candles of each interval into shared memory, once for all the processes """
+		blocks = dict()
+		for interval, candles in self.candles.items():
+			candles = np.ascontiguousarray(candles, dtype=np.float64)
+			block = shared_memory.SharedMemory(create=True, size=max(candles.nbytes, 1))
+			np.ndarray(candles.shape, dtype=np.float64, buffer=block.buf)[:] = candles
+			blocks[interval] = block
+
+		return blocks
+
+#%%
+	def Run(self, configs:list, sweep:str=None, stages:tuple=(0.25, 1), max_drawdown:float=-0.2, min_profit:float=0) -> list:
+		""" Backtests every configuration over the pool, saving each result as soon as it comes.
+		Returns the results from the best profit to the worst """
+		sweep = sweep if sweep is not None else time.strftime('%Y-%m-%d %H:%M:%S')
+		intervals = set(config['interval'] for config in configs)
+		missing = intervals - set(self.candles.keys())
+		if len(missing) > 0:
+			raise Exception("No candles for the intervals " + str(sorted(missing)))
+
+		blocks = self._SharedBlocks()
+		conn = sqlite3.connect(self.database)
+		results = []
+		try:
+			initargs = ({interval: (block.name, self.candles[interval].shape) for interval, block in blocks.items()},)
+			with Pool(self.processes, initializer=_InitWorker, initargs=initargs) as pool:
+				run = pool.imap_unordered(_Run, [(config, stages, max_drawdown, min_profit) for config in configs])
+				for result in run:
+					self.SaveResult(conn, sweep, result)
+					results.append(result)
+		finally:
+			conn.close()
+			for block in blocks.values():
+				block.close()
+				block.unlink()
+
+		return sorted(results, key=lambda result: -result['profit'])
+
+#%%
+	def SaveResult(self, conn, sweep:str, result:dict):
+		config = result['config']
+		conn.execute('''INSERT INTO results (sweep, config, strategy_name, interval, trade_allocation, profit_target,
+			stage, stopped, profit, max_drawdown, fees, closed_trades, win_rate, elapsed) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)''',
+			(sweep, json.dumps(config), config['strategy_name'], config['interval'], config['trade_allocation'], config['profit_target'],
+			result['stage'], result['stopped'], result['profit'], result['max_drawdown'], result['fees'], result['closed_trades'],
+			result['win_rate'], result['elapsed']))
+		conn.commit()   # Results already done are kept if the sweep is interrupted
+
+#%%
+	def GetResults(self, sweep:str, include_stopped:bool=False) -> list:
+		""" Returns the saved results of a sweep from the best profit to the worst """
+		conn = sqlite3.connect(self.database)
+		conn.row_factory = sqlite3.Row
+		query = 'SELECT * FROM results WHERE sweep = ?' + ('' if include_stopped else ' AND NOT stopped') + ' ORDER BY profit DESC'
+		rows = [dict(row) for row in conn.execute(query, (sweep,))]
+		conn.close()
+
+		return rows
+
+#%%
+def _Run(args:tuple) -> dict:
+	return _RunConfig(*args)
+
+#%%
+def _Resample(candles:np.ndarray, factor:int) -> np.ndarray:
+	""" Merges every factor candles into one (1m to 5m with factor 5) """
+	n = len(candles) // factor * factor
+	rows = candles[:n].reshape(-1, factor, 6)
+
+	return np.column_stack([rows[:, 0, 0], rows[:, 0, 1], rows[:, :, 2].max(axis=1), rows[:, :, 3].min(axis=1),
+		rows[:, -1, 4], rows[:, :, 5].sum(axis=1)])
+
+#%%
+def Main():
+
+	import os
+	import tempfile
+
+	# 1M candles of 1m, cycles with noise
+	n = 1000000
+	t = np.arange(n)
+	close = 100 * np.exp(0.1 * np.sin(t / 800) + 0.05 * np.sin(t / 130) + np.random.normal(0, 0.01, n))
+	spread = np.abs(np.random.normal(0, 0.002, n))
+	candles = np.column_stack([t * 60000., np.roll(close, 1), close * (1 + spread), close * (1 - spread), close, np.ones(n)])
+	candles = {'1m': candles, '5m': _Resample(candles, 5), '15m': _Resample(candles, 15)}
+
+	configs = Grid(dict(strategy_name=['ma_simple'], interval=['1m', '5m', '15m'], trade_allocation=[100],
+		profit_target=[1.005, 1.012, 1.02], slow_sma=[20, 30, 50])) + \
+		Grid(dict(strategy_name=['bollinger_simple'], interval=['1m', '5m', '15m'], trade_allocation=[100],
+		profit_target=[1.005, 1.012, 1.02], low_boll=[10, 14, 20]))
+	database = os.path.join(tempfile.mkdtemp(), 'sweep.db')
+
+	# The frames of the workers read the shared memory instead of holding their own copy
+	optimizer = Optimizer(candles, os.path.join(tempfile.mkdtemp(), 'check.db'))
+	blocks = optimizer._SharedBlocks()
+	_InitWorker({interval: (block.name, candles[interval].shape) for interval, block in blocks.items()})
+	for interval in blocks:
+		shared = np.ndarray(candles[interval].shape, dtype=np.float64, buffer=_worker['blocks'][interval].buf)   # The mapping of the block attached by _InitWorker
+		assert all(np.shares_memory(_worker['frames'][interval][col].to_numpy(), shared) for col in ['time', 'open', 'high', 'low', 'close', 'volume'])
+	print("Candles shared by the processes: True")
+
+	# Staged backtests resume the trades of the first part: a survivor ends with the figures of a single run
+	for config in configs[::7]:
+		staged, single = _RunConfig(config, (0.25, 1), -1, -np.inf), _RunConfig(config, (1,), -1, -np.inf)
+		assert all(staged[key] == single[key] for key in ['profit', 'max_drawdown', 'fees', 'closed_trades', 'open_trades']), config
+	assert Indicators.CACHE.GetStats()['entries'] == 0   # The indicators of the configurations are dropped with their frames
+	print("Staged backtests equal to single runs: True")
+	_worker['frames'].clear()
+	for interval, block in blocks.items():
+		_worker['blocks'].pop(interval).close()
+		block.close()
+		block.unlink()
+
+	# Throughput with 1 process, then one per core
+	cores = os.cpu_count()
+	for processes in sorted(set([1, cores])):
+		optimizer = Optimizer(candles, database, processes)
+		start = time.perf_counter()
+		results = optimizer.Run(configs, sweep='processes_' + str(processes))
+		elapsed = time.perf_counter() - start
+		print(processes, "processes:", len(configs), "configurations in", round(elapsed, 2), "s,",
+			round(len(configs) / elapsed, 2), "configurations/s,", sum(result['stopped'] for result in results), "stopped early")
+
+	for row in optimizer.GetResults('processes_' + str(cores))[:5]:
+		print(row['config'], ": profit", round(row['profit'], 2), ", max drawdown", round(row['max_drawdown'] * 100, 2), "%,", row['closed_trades'], "trades")
+
+#%%
+if __name__ == '__main__':
+	Main()
@@ -0,0 +1,383 @@
+import json
+import bisect
+import asyncio
+import threading
+import numpy as np
+import websockets
+
+# OrderBook.py keeps the order book of a symbol in memory, from a snapshot of the depth endpoint
+# and the diff depth stream of Binance, so that the best prices, the spread and the quantity at or ahead
+# of a price are answered without any REST request. The quantities of each side are kept in a dict by price
+# (a diff changing a level is a constant time update) and the prices in a sorted list updated with bisect
+# when a level appears or disappears. Sums over the levels are computed when asked, once per change.
+
+#%%
+class OrderBook:
+
+	def __init__(self, symbol:str):
+		self.symbol = symbol
+		self.lock = threading.Lock()
+		self.Clear()
+
+#%%
+	def Clear(self):
+		""" Empties the book, it waits for a new snapshot """
+		self.bids = dict()   # price: quantity
+		self.asks = dict()
+		self.bid_prices = []   # Ascending, the best bid is the last one
+		self.ask_prices = []   # Ascending, the best ask is the first one
+		self.bid_cumsum = None   # Quantities summed from the best price, computed when needed
+		self.ask_cumsum = None
+		self.last_update_id = None   # Id of the last update applied, None while there is no snapshot
+		self.buffer = []   # Diffs received while waiting for the snapshot
+
+#%%
+	@staticmethod
+	def _Levels(levels) -> tuple:
+		""" Quantities by price and sorted prices of a list of [price, quantity] (as sent by the exchange) """
+		quantities = {float(price): float(quantity) for price, quantity in levels if float(quantity) > 0}
+
+		return quantities, sorted(quantities)
+
+#%%
+	def SetSnapshot(self, depth:dict):
+		""" Sets the book from an answer of the depth endpoint, then applies the diffs received meanwhile """
+		buffer = self.buffer
+		with self.lock:
+			self.Clear()
+			self.bids, self.bid_prices = self._Levels(depth['bids'])
+			self.asks, self.ask_prices = self._Levels(depth['asks'])
+			self.last_update_id = depth['lastUpdateId']
+
+		for event in buffer:
+			if not self.ApplyDiff(event):
+				return False
+
+		return True
+
+#%%
+	@staticmethod
+	def _Update(quantities:dict, prices:list, levels):
+		""" Applies changed levels to one side, a quantity of 0 removes the level. Only the levels
+		appearing or disappearing touch the sorted prices """
+		for price, quantity in levels:
+			price, quantity = float(price), float(quantity)
+			if quantity == 0:
+				if quantities.pop(price, None) is not None:
+					del prices[bisect.bisect_left(prices, price)]
+			else:
+				if price not in quantities:
+					bisect.insort(prices, price)
+				quantities[price] = quantity
+
+#%%
+	def ApplyDiff(self, event:dict) -> bool:
+		""" Applies an event of the diff depth stream. Returns False when updates were missed,
+		the book is then cleared and needs a new snapshot """
+		with self.lock:
+			if self.last_update_id is None:   # Kept until the snapshot arrives
+				self.buffer.append(event)
+				return True
+
+			if event['u'] <= self.last_update_id:   # Already in the snapshot
+				return True
+
+			if event['U'] > self.last_update_id + 1:   # Updates are missing in between
+				self.Clear()
+				return False
+
+			self._Update(self.bids, self.bid_prices, event['b'])
+			self._Update(self.asks, self.ask_prices, event['a'])
+			self.bid_cumsum = None
+			self.ask_cumsum = None
+			self.last_update_id = event['u']
+
+			return True
+
+#%%
+	def IsSynced(self) -> bool:
+		return self.last_update_id is not None
+
+#%%
+	def BestBid(self):
+		""" Returns (price, quantity) of the best bid, None if there is no bid """
+		with self.lock:
+			if len(self.bid_prices) == 0:
+				return None
+			return self.bid_prices[-1], self.bids[self.bid_prices[-1]]
+
+#%%
+	def BestAsk(self):
+		""" Returns (price, quantity) of the best ask, None if there is no ask """
+		with self.lock:
+			if len(self.ask_prices) == 0:
+				return None
+			return self.ask_prices[0], self.asks[self.ask_prices[0]]
+
+#%%
+	def Spread(self):
+		bid, ask = self.BestBid(), self.BestAsk()
+		if bid is None or ask is None:
+			return None
+
+		return ask[0] - bid[0]
+
+#%%
+	def Mid(self):
+		bid, ask = self.BestBid(), self.BestAsk()
+		if bid is None or ask is None:
+			return None
+
+		return (ask[0] + bid[0]) / 2
+
+#%%
+	def DepthAtPrice(self, price:float) -> float:
+		""" Returns the quantity of the level at price (on the bids or on the asks), 0 if there is none """
+		with self.lock:
+			return self.bids.get(price, self.asks.get(price, 0.))
+
+#%%
+	def QuantityAhead(self, side:str, price:float) -> float:
+		""" Returns the quantity a limit order at price would wait for before being filled :
+		the levels of its side at a better or equal price """
+		with self.lock:
+			if side == 'BUY':   # Bids at price or higher
+				if self.bid_cumsum is None:
+					quantities = np.array([self.bids[p] for p in self.bid_prices])
+					self.bid_cumsum = np.cumsum(quantities[::-1])[::-1]   # From the best bid (the last one)
+				i = bisect.bisect_left(self.bid_prices, price)
+				return self.bid_cumsum[i] if i < len(self.bid_cumsum) else 0.
+			else:   # Asks at price or lower
+				if self.ask_cumsum is None:
+					self.ask_cumsum = np.cumsum(np.array([self.asks[p] for p in self.ask_prices]))
+				i = bisect.bisect_right(self.ask_prices, price)
+				return self.ask_cumsum[i - 1] if i > 0 else 0.
+
+#%%
+	def Imbalance(self, levels:int=10):
+		""" Returns (bids - asks) / (bids + asks) of the quantities of the best levels, from -1 (selling) to 1 (buying) """
+		with self.lock:
+			bids = sum(self.bids[p] for p in self.bid_prices[-levels:])
+			asks = sum(self.asks[p] for p in self.ask_prices[:levels])
+		if bids + asks == 0:
+			return None
+
+		return (bids - asks) / (bids + asks)
+
+#%%
+class DepthStream:
+	""" Keeps the order books of subscribed symbols up to date from the diff depth streams """
+
+	def __init__(self, exchange, base:str='wss://stream.binance.com:9443', limit:int=1000, speed:str='100ms', streams_per_connection:int=200):
+		self.exchange = exchange   # Used to get the snapshots of the books
+		self.base = base   # Base of the stream urls
+		self.limit = limit   # Levels of the snapshots (the weight of the request grows with it)
+		self.speed = speed   # Binance sends the diffs every 1000ms or 100ms
+		self.streams_per_connection = streams_per_connection
+
+		self.books = dict()   # symbol: OrderBook
+		self.loop = None
+		self.thread = None
+		self.connections = []   # {streams, ws} of each connection, ws is None while it is not connected
+		self.tasks = []   # Listening task of each connection
+		self.stopping = None   # asyncio.Event set by Stop
+		self.request_id = 0   # Id of the last SUBSCRIBE request
+
+#%%
+	def Subscribe(self, symbols:list):
+		""" Adds symbols to the streams, their books are synced once started.
+		Once started, the new streams are subscribed on the open connections """
+		streams = []
+		for symbol in symbols:
+			if symbol not in self.books:
+				self.books[symbol] = OrderBook(symbol)
+				streams.append(symbol.lower() + '@depth@' + self.speed)
+
+		if self.thread is not None and len(streams) > 0:
+			asyncio.run_coroutine_threadsafe(self._Add(streams), self.loop).result()
+
+#%%
+	def Start(self):
+		""" Connects to the streams of all the subscribed symbols in a background thread """
+		if self.thread is not None:
+			self.Stop()
+
+		streams = [symbol.lower() + '@depth@' + self.speed for symbol in self.books]
+		self.connections = [dict(streams=streams[i:i+self.streams_per_connection], ws=None)
+			for i in range(0, len(streams), self.streams_per_connection)]
+		self.tasks = []
+		self.stopping = asyncio.Event()
+		self.loop = asyncio.new_event_loop()
+		self.thread = threading.Thread(target=self.loop.run_until_complete, args=(self._Run(),), daemon=True)
+		self.thread.start()
+
+#%%
+	def Stop(self):
+		""" Disconnects from the streams """
+		if self.thread is None:
+			return
+
+		self.loop.call_soon_threadsafe(self.stopping.set)   # The tasks are cancelled from the thread of the loop
+		self.thread.join()
+		self.loop.close()
+		self.loop = None
+		self.thread = None
+
+#%%
+	async def _Run(self):
+		self.tasks = [asyncio.ensure_future(self._Listen(connection)) for connection in self.connections]
+		await self.stopping.wait()
+		for task in asyncio.all_tasks():   # The listeners and the syncs of the books, from the loop's own thread
+			if task is not asyncio.current_task():
+				task.cancel()
+		await asyncio.gather(*self.tasks, return_exceptions=True)
+
+#%%
+	async def _Add(self, streams:list):
+		""" Adds streams to the last connection while it has room, to new connections after """
+		added = dict()   # index of the connection: its new streams
+		for stream in streams:
+			if len(self.connections) == 0 or len(self.connections[-1]['streams']) >= self.streams_per_connection:
+				self.connections.append(dict(streams=[], ws=None))
+				self.tasks.append(asyncio.ensure_future(self._Listen(self.connections[-1])))   # Connects with its streams in the url
+			self.connections[-1]['streams'].append(stream)
+			added.setdefault(len(self.connections) - 1, []).append(stream)
+
+		for k, new_streams in added.items():
+			ws = self.connections[k]['ws']
+			if ws is not None:   # Otherwise they are sent once it connects
+				await self._SendSubscribe(ws, new_streams)
+
+#%%
+	async def _SendSubscribe(self, ws, streams:list):
+		""" Subscribes streams on an open connection, then syncs their books """
+		symbols = [stream.split('@')[0].upper() for stream in streams]
+		for symbol in symbols:   # Diffs are buffered from now on, until the snapshot arrives
+			self.books[symbol].Clear()
+		self.request_id += 1
+		await ws.send(json.dumps(dict(method='SUBSCRIBE', params=streams, id=self.request_id)))
+		for symbol in symbols:
+			self.loop.create_task(self._Sync(symbol))
+
+#%%
+	async def _Listen(self, connection:dict):
+		""" Reads the messages of a combined stream, reconnecting when the connection drops """
+		while True:
+			streams = list(connection['streams'])   # Streams of the url, the ones added while connecting are subscribed after
+			url = self.base + '/stream?streams=' + '/'.join(streams)
+			try:
+				async with websockets.connect(url) as ws:
+					connection['ws'] = ws
+					for symbol in [stream.split('@')[0].upper() for stream in streams]:   # Diffs are buffered from now on, until the snapshot arrives
+						self.books[symbol].Clear()
+						self.loop.create_task(self._Sync(symbol))
+					added = connection['streams'][len(streams):]
+					if len(added) > 0:
+						await self._SendSubscribe(ws, added)
+					async for message in ws:
+						self.OnMessage(message)
+			except asyncio.CancelledError:
+				raise
+			except Exception as e:
+				print("Exception occured on depth stream "+url)
+				print(e)
+			finally:
+				connection['ws'] = None
+
+			await asyncio.sleep(1)
+
+#%%
+	async def _Sync(self, symbol:str):
+		""" Gets the snapshot of a book (in a thread, the requests are synchronous) """
+		book = self.books[symbol]
+		depth = await self.loop.run_in_executor(None, self.exchange.GetOrderBook, symbol, self.limit)
+		if 'code' in depth or not book.SetSnapshot(depth):   # Failed, or the diffs received meanwhile don't follow it
+			await asyncio.sleep(1)
+			book.Clear()
+			self.loop.create_task(self._Sync(symbol))
+
+#%%
+	def OnMessage(self, message):
+		""" Updates the book of a symbol from a diff depth event """
+		message = json.loads(message)
+		if 'data' not in message:   # Answer to a SUBSCRIBE request
+			return
+		event = message['data']
+		book = self.books.get(event['s'], None)
+		if book is None:
+			return
+
+		if not book.ApplyDiff(event):   # Updates were missed, a new snapshot is needed
+			self.loop.create_task(self._Sync(event['s']))
+
+#%%
+	def GetOrderBook(self, symbol:str):
+		""" Returns the book of a symbol, None if it isn't synced """
+		book = self.books.get(symbol, None)
+		if book is None or not book.IsSynced():
+			return None
+
+		return book
+
+#%%
+def Main():
+
+	import os
+	import time
+	import random
+	import tempfile
+	from Binance import Binance
+	from MockBinance import MockBinance
+
+	# Snapshot from a local MockBinance, then random diffs as the depth stream sends them
+	mock = MockBinance(['BTCUSDT'])
+	exchange = Binance(mock.SaveCredentials(os.path.join(tempfile.mkdtemp(), 'credentials.txt')), candles_dir=None)
+	exchange.base = mock.Start()
+	depth = exchange.GetOrderBook('BTCUSDT', 1000)
+	mock.Stop()
+
+	book = OrderBook('BTCUSDT')
+	assert book.SetSnapshot(depth)
+	reference = dict(b={float(p): float(q) for p, q in depth['bids']}, a={float(p): float(q) for p, q in depth['asks']})   # Levels as plain dicts
+
+	rng = random.Random(0)
+	best_bid, best_ask = max(reference['b']), min(reference['a'])
+	tick = (best_ask - best_bid) / 2
+	update_id = depth['lastUpdateId']
+	elapsed = 0.
+	n = 20000
+	for k in range(n):
+		event = dict(U=update_id + 1, u=update_id + 1, b=[], a=[])
+		for side, sign, best in [('b', -1, best_bid), ('a', 1, best_ask)]:
+			for level in range(rng.randint(1, 5)):   # Changed, added or removed levels near the best price
+				price = round(best + sign * tick * rng.randint(0, 2400), 8)
+				quantity = 0. if rng.random() < 0.3 else round(rng.uniform(0.001, 5), 3)
+				event[side].append([str(price), str(quantity)])
+				if quantity == 0:
+					reference[side].pop(price, None)
+				else:
+					reference[side][price] = quantity
+		update_id += 1
+
+		start = time.perf_counter()
+		assert book.ApplyDiff(event)
+		elapsed += time.perf_counter() - start
+
+		if k % 1000 == 0:   # Same answers as the reference levels
+			bids, asks = sorted(reference['b']), sorted(reference['a'])
+			assert book.BestBid() == (bids[-1], reference['b'][bids[-1]]) and book.BestAsk() == (asks[0], reference['a'][asks[0]])
+			bid, ask = bids[len(bids) // 2], asks[len(asks) // 2]
+			assert np.isclose(book.QuantityAhead('BUY', bid), sum(q for p, q in reference['b'].items() if p >= bid))
+			assert np.isclose(book.QuantityAhead('SELL', ask), sum(q for p, q in reference['a'].items() if p <= ask))
+			assert book.DepthAtPrice(bid) == reference['b'][bid]
+
+	print(n, "diffs applied in", round(elapsed, 3), "s,", round(elapsed / n * 1e6, 2), "us per diff,", len(book.bid_prices), "bids,", len(book.ask_prices), "asks")
+	print("bid", book.BestBid(), "ask", book.BestAsk(), "spread", book.Spread(), "imbalance", book.Imbalance())
+
+	# A diff that doesn't follow the last one clears the book until a new snapshot
+	assert not book.ApplyDiff(dict(U=update_id + 5, u=update_id + 5, b=[], a=[])) and not book.IsSynced()
+	print("Same levels as the reference: True")
+
+#%%
+if __name__ == '__main__':
+	Main()
@@ -0,0 +1,135 @@
+import time
+import queue
+import threading
+
+# Pipeline.py chains stages (fetch -> evaluate -> order -> persist for the bots) run by long-lived threads.
+# Each stage has its own number of workers and takes its items from a bounded queue, so that the network
+# stages and the computing ones overlap, and a slow stage holds back the ones before it instead of piling
+# up items in memory.
+
+_STOP = object()   # Put in the queues to stop the workers
+
+#%%
+class Pipeline:
+
+	def __init__(self, stages:list, queue_size:int=64):
+		""" stages is a list of (name, function, workers). Each function takes an item and returns the item
+		for the next stage, or None when the item stops there """
+		self.names = [name for name, function, workers in stages]
+		self.functions = [function for name, function, workers in stages]
+		self.workers = [workers for name, function, workers in stages]   # Threads of each stage, the most items it works on at once
+		self.queues = [queue.Queue(maxsize=queue_size) for stage in stages]
+		self.threads = []
+
+		self.pending = 0   # Items submitted and not done yet
+		self.condition = threading.Condition()
+		self.stats = {name: dict(items=0, errors=0, busy=0.) for name in self.names}
+		self.stats_lock = threading.Lock()
+
+#%%
+	def Start(self):
+		""" Starts the workers of all the stages, they wait for items until Stop """
+		if len(self.threads) > 0:
+			return
+
+		for k in range(len(self.names)):
+			for w in range(self.workers[k]):
+				thread = threading.Thread(target=self._Work, args=(k,), name=self.names[k] + '-' + str(w), daemon=True)
+				thread.start()
+				self.threads.append(thread)
+
+#%%
+	def Submit(self, item, stage:str=None):
+		""" Adds an item at the first stage (or at stage), waits while that stage's queue is full """
+		self.Start()
+		with self.condition:
+			self.pending += 1
+		self.queues[0 if stage is None else self.names.index(stage)].put(item)
+
+#%%
+	def Join(self):
+		""" Waits until all the submitted items went through the stages """
+		with self.condition:
+			while self.pending > 0:
+				self.condition.wait()
+
+#%%
+	def Stop(self):
+		""" Finishes the items already submitted, then stops the workers """
+		self.Join()
+		for k in range(len(self.names)):
+			for w in range(self.workers[k]):
+				self.queues[k].put(_STOP)
+		for thread in self.threads:
+			thread.join()
+		self.threads = []
+
+#%%
+	def _Work(self, k:int):
+		function, name = self.functions[k], self.names[k]
+		while True:
+			item = self.queues[k].get()
+			if item is _STOP:
+				return
+
+			start = time.perf_counter()
+			try:
+				result = function(item)
+				errors = 0
+			except Exception as e:   # The item is dropped, the stage goes on with the next ones
+				print("\nException raised in the " + name + " stage")
+				print(e)
+				result, errors = None, 1
+
+			with self.stats_lock:
+				self.stats[name]['items'] += 1
+				self.stats[name]['errors'] += errors
+				self.stats[name]['busy'] += time.perf_counter() - start
+
+			if result is None or k == len(self.names) - 1:
+				with self.condition:
+					self.pending -= 1
+					self.condition.notify_all()
+			else:
+				self.queues[k + 1].put(result)   # Waits while the next stage is full
+
+#%%
+	def GetStats(self) -> dict:
+		""" Items, errors and seconds spent working of each stage """
+		with self.stats_lock:
+			return {name: dict(stats) for name, stats in self.stats.items()}
+
+#%%
+def Main():
+
+	import numpy as np
+
+	# Fetching waits on the network (sleep), evaluating computes, ordering waits again for some items
+	def Fetch(item):
+		time.sleep(0.02)
+		return item
+	def Evaluate(item):
+		x = np.random.normal(size=20000)
+		return item if np.cumsum(x)[-1] > 0 else None
+	def Order(item):
+		time.sleep(0.02)
+		return item
+
+	items = list(range(200))
+	start = time.perf_counter()
+	for item in items:   # One after the other
+		if Evaluate(Fetch(item)) is not None:
+			Order(item)
+	print("Serial:", round(time.perf_counter() - start, 2), "s")
+
+	pipeline = Pipeline([('fetch', Fetch, 8), ('evaluate', Evaluate, 1), ('order', Order, 4)], queue_size=16)
+	start = time.perf_counter()
+	for item in items:
+		pipeline.Submit(item)
+	pipeline.Join()
+	print("Pipeline:", round(time.perf_counter() - start, 2), "s", pipeline.GetStats())
+	pipeline.Stop()
+
+#%%
+if __name__ == '__main__':
+	Main()
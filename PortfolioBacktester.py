@@ -0,0 +1,226 @@
+import heapq
+import time
+import numpy as np
+import pandas as pd
+
+from CandleStore import CandlesToDataFrame
+from Indicators import Indicators
+from Strategies import GetSignals
+from Backtester import OrderPrices, _FirstCrossing
+
+# PortfolioBacktester.py simulates a bot on all its symbols at once, with one quote balance shared by the
+# symbols as on the exchange : an entry is only placed when the free balance is above trade_allocation
+# (as BotRunner.GetBalances allows it), its amount stays locked until the order fills, and positions on
+# different symbols are open at the same time. The candles are memory-mapped from a CandleStore, one symbol
+# is loaded at a time to find its signals, then the fills of all the symbols are stepped in time order
+# from a heap of events, reading only the candles between an order and its fill.
+
+EXIT, ENTRY, SIGNAL = 0, 1, 2   # Order of the events happening on the same candle : fills during it, then signals at its close
+
+#%%
+class PortfolioBacktester:
+
+	def __init__(self, store, symbols:list, interval:str, strategy, profit_target:float=1.012, trade_allocation:float=100,
+		fee:float=0.001, initial_balance:float=1000, rules:dict=None):
+		self.store = store   # CandleStore holding the candles of the symbols
+		self.symbols = symbols   # Symbols traded by the bot
+		self.interval = interval
+		self.strategy = strategy   # Function of strategies_dict
+		self.profit_target = profit_target
+		self.trade_allocation = trade_allocation   # Quote spent on each trade
+		self.fee = fee   # Fee rate of each order, charged in quote when it fills
+		self.initial_balance = initial_balance   # Quote balance shared by all the symbols
+		self.rules = rules if rules is not None else dict()   # symbol: SymbolRules, to round prices and quantities as the bot does
+
+#%%
+	def Candidates(self, symbol:str) -> np.ndarray:
+		""" Returns the indices of the candles of symbol where the bot would place an entry if it could """
+		candles = self.store.Load(symbol, self.interval)
+		if len(candles) == 0:
+			return np.empty(0, dtype=np.int64)
+
+		df = CandlesToDataFrame(np.array(candles))   # Only this symbol is in memory while its indicators are computed
+		Indicators.AddMissing(df, getattr(self.strategy, 'indicators', []), use_cache=False)   # Not kept in Indicators.CACHE, they go with df
+		signals = GetSignals(self.strategy, df)
+		valid = OrderPrices(df['close'], self.profit_target, self.trade_allocation, self.rules.get(symbol, None))[3]
+
+		return np.flatnonzero(valid & ~np.isnan(signals))
+
+#%%
+	def Run(self) -> dict:
+		""" Simulates the bot on all its symbols and returns its trades, equity curve, drawdown and fees """
+		candles = [self.store.Load(symbol, self.interval) for symbol in self.symbols]   # Memory-mapped, read when searched
+		candidates = [self.Candidates(symbol) for symbol in self.symbols]
+		candidate_times = [candles[s][candidates[s], 0] for s in range(len(self.symbols))]
+
+		events = []   # (time, kind, sequence, symbol index, trade index)
+		sequence = 0
+		def Push(time, kind, s, trade):
+			nonlocal sequence
+			heapq.heappush(events, (time, kind, sequence, s, trade))
+			sequence += 1
+
+		def NextSignal(s, first:int, from_time:float):
+			""" Schedules the first candidate of symbol s from the candle first and the time from_time """
+			k = max(np.searchsorted(candidates[s], first), np.searchsorted(candidate_times[s], from_time))
+			if k < len(candidates[s]):
+				Push(candidate_times[s][k], SIGNAL, s, int(candidates[s][k]))
+
+		for s in range(len(self.symbols)):
+			NextSignal(s, 0, -np.inf)
+
+		free = self.initial_balance   # Quote not locked in orders
+		trades = []   # [symbol index, signal, entry, exit, buy price, sell price, quantity] of each trade
+		waiting = dict()   # symbol index: first candle to check, for the symbols that had a signal without enough balance
+		while len(events) > 0:
+			now, kind, _, s, data = heapq.heappop(events)
+			low, high, times = candles[s][:, 3], candles[s][:, 2], candles[s][:, 0]
+
+			if kind == SIGNAL:
+				i = data
+				buy_prices, take_profit_prices, quantities, valid = OrderPrices(candles[s][i:i + 1, 4], self.profit_target,
+					self.trade_allocation, self.rules.get(self.symbols[s], None))
+				cost = buy_prices[0] * quantities[0]
+				if free <= self.trade_allocation:   # Not enough balance for any symbol until an exit fills
+					waiting[s] = i + 1
+					continue
+				if cost > free:
+					NextSignal(s, i + 1, now)
+					continue
+
+				free -= cost   # Locked by the buy order
+				trades.append([s, i, -1, -1, buy_prices[0], take_profit_prices[0], quantities[0]])
+				entry = _FirstCrossing(low, i + 1, buy_prices[0], below=True)
+				if entry >= 0:
+					Push(times[entry], ENTRY, s, len(trades) - 1)
+
+			elif kind == ENTRY:
+				trade = trades[data]
+				trade[2] = entry = int(np.searchsorted(times, now))
+				free -= trade[4] * trade[6] * self.fee
+				exit = _FirstCrossing(high, entry + 1, trade[5], below=False)
+				if exit >= 0:
+					Push(times[exit], EXIT, s, data)
+
+			else:
+				trade = trades[data]
+				trade[3] = exit = int(np.searchsorted(times, now))
+				free += trade[5] * trade[6] * (1 - self.fee)
+				NextSignal(s, exit + 1, -np.inf)   # The pair is free again from the next candle
+
+				for w, first in waiting.items():   # Balance available again for the symbols waiting for it
+					NextSignal(w, first, now)
+				waiting = dict()
+
+		return self.Report(trades, candles)
+
+#%%
+	def Report(self, trades:list, candles:list) -> dict:
+		""" Builds the trades dataframe and the equity curve on the times of all the symbols
+		(balance plus the positions at their last close) """
+		times = np.empty(0)
+		for c in candles:
+			times = np.union1d(times, c[:, 0])
+
+		rows = np.array(trades, dtype=np.float64).reshape(-1, 7)
+		s, signal, entry, exit, buy_price, sell_price, quantity = rows.T
+		s, signal, entry, exit = [column.astype(np.int64) for column in (s, signal, entry, exit)]
+		filled, closed = entry >= 0, exit >= 0
+		entry_fees = np.where(filled, buy_price * quantity * self.fee, 0.)
+		exit_fees = np.where(closed, sell_price * quantity * self.fee, 0.)
+
+		signal_time, entry_time, exit_time = np.empty(len(rows)), np.full(len(rows), np.nan), np.full(len(rows), np.nan)
+		cash_changes = np.zeros(len(times))
+		equity = np.zeros(len(times))
+		for k in range(len(self.symbols)):
+			mine = s == k
+			if not np.any(mine):
+				continue
+
+			symbol_times, close = candles[k][:, 0], candles[k][:, 4]
+			signal_time[mine] = symbol_times[signal[mine]]
+			f, c = mine & filled, mine & closed
+			entry_time[f] = symbol_times[entry[f]]
+			exit_time[c] = symbol_times[exit[c]]
+
+			# Position of the symbol at its close, carried over the times where it has no candle
+			position_changes = np.zeros(len(symbol_times))
+			np.add.at(position_changes, entry[f], quantity[f])
+			np.add.at(position_changes, exit[c], -quantity[c])
+			value = np.cumsum(position_changes) * close
+			last = np.searchsorted(symbol_times, times, side='right') - 1
+			equity += np.where(last >= 0, value[np.maximum(last, 0)], 0.)
+
+		np.add.at(cash_changes, np.searchsorted(times, entry_time[filled]), -buy_price[filled] * quantity[filled] - entry_fees[filled])
+		np.add.at(cash_changes, np.searchsorted(times, exit_time[closed]), sell_price[closed] * quantity[closed] - exit_fees[closed])
+		equity += self.initial_balance + np.cumsum(cash_changes)
+		drawdown = equity / np.maximum.accumulate(equity) - 1 if len(times) > 0 else equity
+
+		trades_df = pd.DataFrame(dict(
+			symbol = [self.symbols[k] for k in s],
+			signal_time = signal_time,
+			entry_time = entry_time,
+			exit_time = exit_time,
+			buy_price = buy_price,
+			sell_price = sell_price,
+			quantity = quantity,
+			fees = entry_fees + exit_fees,
+			profit = np.where(closed, (sell_price - buy_price) * quantity - entry_fees - exit_fees, np.nan)))
+
+		# Positions open at the same time, counted on the fills
+		changes = np.concatenate([np.ones(int(filled.sum())), -np.ones(int(closed.sum()))])
+		order = np.argsort(np.concatenate([entry_time[filled], exit_time[closed]]), kind='stable')
+		concurrent = np.cumsum(changes[order])
+
+		return dict(
+			trades = trades_df,
+			times = times,
+			equity = equity,
+			drawdown = drawdown,
+			max_drawdown = float(drawdown.min()) if len(times) > 0 else 0.,
+			fees = float(trades_df['fees'].sum()),
+			profit = float(equity[-1] - self.initial_balance) if len(times) > 0 else 0.,
+			closed_trades = int(closed.sum()),
+			open_trades = int((~closed).sum()),
+			max_positions = int(concurrent.max()) if len(concurrent) > 0 else 0)
+
+#%%
+def Main():
+
+	import tempfile
+	from CandleStore import CandleStore
+	from Strategies import strategies_dict
+	from Backtester import Backtester
+
+	# 20 symbols of 200k candles of 1m, cycles with noise, starting at different times
+	store = CandleStore(tempfile.mkdtemp())
+	symbols = ['SYM%02dUSDT' % k for k in range(20)]
+	n = 200000
+	for k, symbol in enumerate(symbols):
+		t = np.arange(n) + k * 1000
+		close = 100 * (k + 1) * np.exp(0.1 * np.sin(t / (700 + 37 * k)) + 0.05 * np.sin(t / 130) + np.random.normal(0, 0.01, n))
+		spread = np.abs(np.random.normal(0, 0.002, n))
+		store.Save(symbol, '1m', np.column_stack([t * 60000., close, close * (1 + spread), close * (1 - spread), close, np.ones(n)]))
+
+	strategy = strategies_dict['ma_simple']
+	for balance in [1e12, 250]:   # Unlimited, then room for two positions
+		start = time.perf_counter()
+		results = PortfolioBacktester(store, symbols, '1m', strategy, profit_target=1.012, trade_allocation=100, initial_balance=balance).Run()
+		print("Balance", balance, ":", round(time.perf_counter() - start, 2), "s,", results['closed_trades'], "trades,", results['open_trades'], "open,",
+			results['max_positions'], "positions at most, profit", round(results['profit'], 2), ", fees", round(results['fees'], 2),
+			", max drawdown", round(results['max_drawdown'] * 100, 4), "%")
+
+		if balance == 1e12:   # Without a balance limit, each symbol trades as it does alone
+			assert Indicators.CACHE.GetStats()['entries'] == 0, "The indicators of the symbols were kept in the cache"
+			same = True
+			for symbol in symbols[:3]:
+				df = CandlesToDataFrame(np.array(store.Load(symbol, '1m')))
+				alone = Backtester(df, strategy, profit_target=1.012, trade_allocation=100, initial_balance=balance, fee=0.001).Run()['trades']
+				together = results['trades'][results['trades']['symbol'] == symbol].reset_index(drop=True)
+				same &= len(alone) == len(together) and np.array_equal(alone['signal_time'], together['signal_time']) and \
+					np.array_equal(alone['exit_time'], together['exit_time'], equal_nan=True)
+			print("    same trades as the symbols backtested alone:", same)
+
+#%%
+if __name__ == '__main__':
+	Main()
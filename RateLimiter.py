@@ -0,0 +1,128 @@
+import time
+import threading
+from urllib.parse import urlsplit, parse_qsl
+
+# RateLimiter.py keeps the request weight we use under the limit of Binance (weight per minute per IP).
+# Every request waits for enough headroom before being sent, orders are served first, and the weight
+# reported by the exchange in the answers keeps our count right when other processes share the IP.
+
+#%%
+def DepthWeight(params:dict):
+	""" Weight of the order book, depending on the number of levels requested """
+	limit = int(params.get('limit', 100))
+	if limit <= 100:
+		return 5
+	elif limit <= 500:
+		return 25
+	elif limit <= 1000:
+		return 50
+
+	return 250
+
+#%%
+class RateLimiter:
+
+	# Weight of the endpoints of Binance.endpoints, by method when it depends on it,
+	# or computed from the params of the request when it depends on them
+	WEIGHTS = {
+		"order": {'GET': 4, 'POST': 1, 'DELETE': 1},
+		"testOrder": 1,
+		"allOrders": 20,
+		"openOrders": lambda params: 6 if 'symbol' in params else 80,
+		"klines": 2,
+		"exchangeInfo": 20,
+		"24hrTicker": lambda params: 2 if 'symbol' in params else 80,   # All the symbols at once weight much more
+		"averagePrice": 2,
+		"orderBook": DepthWeight,
+		"account": 20,
+		"time": 1,
+	}
+
+	# Requests on these endpoints are served first, the others can't use the last reserve of the weight
+	PRIORITY_ENDPOINTS = ["order", "testOrder", "account"]
+
+	def __init__(self, endpoints:dict, limit:int=6000, reserve:float=0.1):
+		self.endpoint_keys = {path: key for key, path in endpoints.items()}   # Find the endpoint of a request from its path
+		self.limit = limit   # Weight allowed per minute by the exchange
+		self.reserve = int(limit * reserve)   # Weight kept for the priority requests
+		self.lock = threading.Lock()
+
+		self.minute = 0   # Binance counts the weight in windows of a minute
+		self.used = 0   # Weight used in the current minute
+		self.banned_until = 0   # After a 429 or a 418, requests must wait for the time given by the exchange
+
+#%%
+	def RequestWeight(self, method:str, url, params=None):
+		""" Returns the endpoint of a request, its weight and whether it has the priority """
+		split_url = urlsplit(url)
+		key = self.endpoint_keys.get(split_url.path, None)
+		all_params = dict(parse_qsl(split_url.query))
+		if isinstance(params, dict):
+			all_params.update(params)
+
+		weight = self.WEIGHTS.get(key, 1)
+		if isinstance(weight, dict):
+			weight = weight.get(method, 1)
+		elif callable(weight):
+			weight = weight(all_params)
+
+		return key, weight, key in self.PRIORITY_ENDPOINTS
+
+#%%
+	def _Roll(self, now:float):
+		minute = int(now // 60)
+		if minute != self.minute:   # A new window started
+			self.minute = minute
+			self.used = 0
+
+#%%
+	def TryAcquire(self, weight:int, priority:bool=False) -> float:
+		""" Uses weight if there is enough headroom and returns 0, otherwise
+		returns the number of seconds to wait before trying again """
+		with self.lock:
+			now = time.time()
+			if now < self.banned_until:
+				return self.banned_until - now
+
+			self._Roll(now)
+			limit = self.limit if priority else self.limit - self.reserve
+			if self.used + weight <= limit or self.used == 0:   # A request heavier than the limit is sent alone
+				self.used += weight
+				return 0
+
+			return 60 - now % 60   # Wait for the next window
+
+#%%
+	def Acquire(self, weight:int, priority:bool=False):
+		""" Waits until weight can be used without going over the limit """
+		wait = self.TryAcquire(weight, priority)
+		while wait > 0:
+			time.sleep(min(wait, 1))   # Checks again every second, priority requests may pass first
+			wait = self.TryAcquire(weight, priority)
+
+#%%
+	def Update(self, status:int, headers):
+		""" Updates the weight used from the answer of the exchange """
+		with self.lock:
+			now = time.time()
+			used = headers.get('X-MBX-USED-WEIGHT-1M', headers.get('x-mbx-used-weight-1m', None))
+			if used is not None:
+				self._Roll(now)
+				self.used = max(self.used, int(used))   # Our count also includes the requests still in flight
+
+			if status in [418, 429]:   # Too many requests (429) or banned (418)
+				retry_after = headers.get('Retry-After', headers.get('retry-after', None))
+				wait = int(retry_after) if retry_after is not None else 60 - now % 60
+				self.banned_until = max(self.banned_until, now + wait)
+
+#%%
+	def GetHeadroom(self) -> int:
+		""" Returns the weight that can still be used in the current minute (without the reserve) """
+		with self.lock:
+			now = time.time()
+			if now < self.banned_until:
+				return 0
+
+			self._Roll(now)
+
+			return max(self.limit - self.reserve - self.used, 0)
@@ -0,0 +1,195 @@
+import time
+import heapq
+import threading
+from datetime import datetime, timezone
+
+from Binance import Binance
+
+# Scheduler.py wakes the jobs of the bots when something happens on the market instead of looping as fast
+# as possible : candle jobs run just after the close of each candle of their interval, on the clock of the
+# exchange (its offset to the local clock is measured with the time endpoint), and periodic jobs, such as
+# the polling of the open orders, run on their own cadence. Between the jobs the thread sleeps.
+# The jobs run one after the other on the thread of Run (the ticks of the bots share their state), so a slow
+# job delays the next ones : a job running longer than its period is reported as an overrun.
+
+WEEK_ORIGIN_MS = 4 * 86400000   # Weekly candles of Binance open on Mondays, the epoch was a Thursday
+
+#%%
+class Scheduler:
+
+	def __init__(self, exchange, delay:float=2, sync_every:float=600):
+		self.exchange = exchange   # Binance, to read the time of the exchange
+		self.delay = delay   # Seconds after a close before waking its jobs, the exchange needs a moment to close the candle
+		self.sync_every = sync_every   # Seconds between two measures of the clock offset
+
+		self.offset = 0.   # Seconds the clock of the exchange is ahead of the local one
+		self.round_trip = None   # Seconds of the request that measured the offset, its uncertainty
+		self.synced = None   # Local time of the last measure
+
+		self.jobs = []   # Heap of (local time due, sequence, job)
+		self.sequence = 0
+		self.stop_event = threading.Event()
+		self.stats = dict()   # name: {runs, late, busy, overruns} of each job
+
+#%%
+	def SyncClock(self, samples:int=3) -> float:
+		""" Measures the offset of the clock of the exchange, keeping the sample with the fastest answer.
+		The candle jobs already scheduled are moved to the new clock """
+		best = None
+		for k in range(samples):
+			sent = time.time()
+			answer = self.exchange.GetServerTime()
+			received = time.time()
+			if not isinstance(answer, dict) or 'serverTime' not in answer:
+				continue
+			if best is None or received - sent < best[0]:
+				best = (received - sent, answer['serverTime'] / 1000 - (sent + received) / 2)   # The exchange read its clock about halfway
+
+		self.synced = time.time()
+		if best is not None:
+			shift = self.offset - best[1]
+			self.round_trip, self.offset = best
+			self.jobs = [(due + shift if job['interval'] is not None else due, sequence, job) for due, sequence, job in self.jobs]
+			heapq.heapify(self.jobs)
+
+		return self.offset
+
+#%%
+	def ServerTime(self) -> float:
+		""" Time of the exchange now, in seconds """
+		return time.time() + self.offset
+
+#%%
+	@staticmethod
+	def NextClose(interval:str, server_time:float) -> float:
+		""" Returns the time (seconds) at which the candle of interval open at server_time closes """
+		ms = int(server_time * 1000)
+		if interval == '1M':   # Months have different lengths, the next candle opens on the first of the next month
+			date = datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+			month = datetime(date.year + date.month // 12, date.month % 12 + 1, 1, tzinfo=timezone.utc)
+			return month.timestamp()
+
+		length = Binance.KLINE_INTERVALS_MS[interval]
+		origin = WEEK_ORIGIN_MS if interval == '1w' else 0
+
+		return ((ms - origin) // length + 1) * length / 1000 + origin / 1000
+
+#%%
+	def AddCandleJob(self, interval:str, function, name:str=None):
+		""" Runs function() after the close of every candle of interval """
+		job = dict(name=name if name is not None else interval, interval=interval, every=None, function=function)
+		self._Schedule(job)
+
+#%%
+	def AddPeriodicJob(self, every:float, function, name:str=None, now:bool=True):
+		""" Runs function() every `every` seconds, the first time right away if now """
+		job = dict(name=name if name is not None else function.__name__, interval=None, every=every, function=function)
+		self._Push(time.time() if now else time.time() + every, job)
+
+#%%
+	def _Push(self, due:float, job:dict):
+		heapq.heappush(self.jobs, (due, self.sequence, job))
+		self.sequence += 1
+		self.stats.setdefault(job['name'], dict(runs=0, late=0., busy=0., overruns=0))
+
+#%%
+	def _Schedule(self, job:dict, due:float=None):
+		""" Pushes the next run of job, after its previous due time. Closes already gone are skipped """
+		if job['interval'] is not None:
+			close = self.NextClose(job['interval'], self.ServerTime())
+			self._Push(close + self.delay - self.offset, job)   # Back to the local clock
+		else:
+			self._Push(max(due + job['every'], time.time()), job)
+
+#%%
+	def Run(self):
+		""" Runs the jobs when they are due until Stop, sleeping in between. The clock is synced
+		before the first job, the candle jobs added before are moved to the clock of the exchange """
+		self.stop_event.clear()
+		while len(self.jobs) > 0 and not self.stop_event.is_set():
+			if self.synced is None or time.time() - self.synced > self.sync_every:
+				self.SyncClock()
+				continue   # The first job may have moved
+
+			due, _, job = self.jobs[0]
+			wait = due - time.time()
+			if wait > 0:
+				if self.stop_event.wait(min(wait, self.sync_every)):   # Woken early by Stop
+					break
+				continue   # Check the clock and the next job again
+
+			heapq.heappop(self.jobs)
+			start = time.time()
+			try:
+				job['function']()
+			except Exception as e:   # The job is tried again at its next time
+				print("\nException raised in the " + job['name'] + " job")
+				print(e)
+
+			stats = self.stats[job['name']]
+			busy = time.time() - start
+			stats['runs'] += 1
+			stats['late'] += start - due
+			stats['busy'] += busy
+			period = job['every'] if job['interval'] is None else Binance.KLINE_INTERVALS_MS[job['interval']] / 1000
+			if busy > period:   # The next runs of this job and the other jobs are late
+				stats['overruns'] += 1
+				print("\nThe " + job['name'] + " job ran for " + str(round(busy, 1)) + " s, longer than its period of " + str(round(period, 1)) + " s")
+			self._Schedule(job, due)
+
+#%%
+	def Stop(self):
+		""" Stops Run after the job running now """
+		self.stop_event.set()
+
+#%%
+	def GetStats(self) -> dict:
+		""" Runs, seconds late and seconds spent running of each job """
+		return {name: dict(stats) for name, stats in self.stats.items()}
+
+#%%
+def Main(seconds:float=70, clock_offset:float=2.5):
+
+	import os
+	import tempfile
+	from MockBinance import MockBinance
+
+	# Mock whose clock is clock_offset seconds ahead of the local one
+	mock = MockBinance(['BTCUSDT'], clock_offset=clock_offset)
+	exchange = Binance(mock.SaveCredentials(os.path.join(tempfile.mkdtemp(), 'credentials.txt')), candles_dir=None)
+	exchange.base = mock.Start()
+
+	# The jobs are added before the clock is synced, Run moves them to the clock of the exchange
+	scheduler = Scheduler(exchange, delay=1)
+	runs = []
+	def Candle():
+		server = scheduler.ServerTime()
+		runs.append(server % 60)
+		print("1m candle job,", round(server % 60, 3), "s after the close on the clock of the exchange")
+	def Orders():
+		print("Orders job at", time.strftime('%H:%M:%S'))
+	def Slow():
+		if scheduler.GetStats()['slow']['runs'] == 0:   # Runs for longer than its period once
+			time.sleep(1.5)
+
+	scheduler.AddCandleJob('1m', Candle)
+	scheduler.AddPeriodicJob(15, Orders, name='orders')
+	scheduler.AddPeriodicJob(1, Slow, name='slow')
+	threading.Timer(seconds, scheduler.Stop).start()
+	scheduler.Run()
+
+	print("Measured offset:", round(scheduler.offset, 3), "s, round trip", round(scheduler.round_trip * 1000, 2), "ms")
+	print("Jobs:", scheduler.GetStats())
+	assert all(1 <= late < 5 for late in runs) and scheduler.GetStats()['slow']['overruns'] == 1
+	print("Requests to the exchange:", mock.GetStats()['requests'])
+	mock.Stop()
+
+	# Closes of the intervals that don't divide evenly
+	now = datetime(2021, 3, 17, 12, 0, tzinfo=timezone.utc).timestamp()   # A Wednesday
+	for interval in ['3m', '1d', '3d', '1w', '1M']:
+		close = datetime.fromtimestamp(Scheduler.NextClose(interval, now), tz=timezone.utc)
+		print(interval, "candle open on", datetime.fromtimestamp(now, tz=timezone.utc).strftime('%a %Y-%m-%d %H:%M'), "closes on", close.strftime('%a %Y-%m-%d %H:%M'))
+
+#%%
+if __name__ == '__main__':
+	Main()
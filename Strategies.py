@@ -1,54 +1,115 @@
+import numpy as np
+from functools import wraps
 from Indicators import Indicators
+from StrategyDSL import CompileStrategy
 
 #%%
+def Requires(*indicators):
+	""" Declares the indicators (indicator_name, col_name, args) a strategy reads, in strategy.indicators.
+	They are computed beforehand by the IndicatorPlanner of BotRunner, or here when they are missing """
+	def Decorator(strategy):
+		@wraps(strategy)
+		def Strategy(df, i:int):
+			Indicators.AddMissing(df, indicators)
+			return strategy(df, i)
+
+		Strategy.indicators = list(indicators)
+		return Strategy
+
+	return Decorator
+
+#%%
+def SignalsOf(strategy):
+	""" Declares the vectorized form of a strategy, in strategy.signals. It returns the buy price of
+	every candle of df (NaN where there is no signal), the same as strategy(df, i) for each i.
+	df can also be a dict of 2D arrays (symbols x candles), the signals of all the symbols are computed at once """
+	def Decorator(signals):
+		@wraps(signals)
+		def Signals(df) -> np.ndarray:
+			Indicators.AddMissing(df, getattr(strategy, 'indicators', []))
+			return signals(df)
+
+		strategy.signals = Signals
+		return Signals
+
+	return Decorator
+
+#%%
+def GetSignals(strategy, df) -> np.ndarray:
+	""" Returns the buy prices of all the candles of df, from the vectorized form of the strategy
+	when it has one, else by calling it on each candle """
+	if hasattr(strategy, 'signals'):
+		return strategy.signals(df)
+
+	buys = [strategy(df, i) for i in range(len(df))]
+	return np.array([np.nan if buy is False else buy for buy in buys], dtype=np.float64)
+
+#%%
+def _Columns(df, *cols) -> list:
+	""" Columns of a dataframe, or arrays of a dict (one symbol per row for 2D arrays) """
+	return [np.asarray(df[col], dtype=np.float64) for col in cols]
+
+#%%
+@Requires(("ema", "50_ema", 50), ("ema", "200_ema", 200))
 def maCrossoverStrategy(df, i:int):
 	""" If price is 10% below the Slow MA, return True """
 
-	if not df.__contains__('50_ema') and not df.__contains__('200_ema'):
-		Indicators.AddIndicator(df, indicator_name="ema", col_name="50_ema", args=50)
-		Indicators.AddIndicator(df, indicator_name="ema", col_name="200_ema", args=200)
-
 	if i > 0 and df['50_ema'][i-1] <= df['200_ema'][i-1] and \
 		df['50_ema'][i] > df['200_ema'][i]:
 		return df['close'][i]
 
 	return False
 
+@SignalsOf(maCrossoverStrategy)
+def maCrossoverSignals(df) -> np.ndarray:
+	fast, slow, close = _Columns(df, '50_ema', '200_ema', 'close')
+	buy = np.zeros(close.shape, dtype=bool)
+	buy[..., 1:] = (fast[..., :-1] <= slow[..., :-1]) & (fast[..., 1:] > slow[..., 1:])   # Fast MA crossing above the slow one
+
+	return np.where(buy, close, np.nan)
+
 #%%
+@Requires(("sma", "slow_sma", 30))
 def maStrategy(df, i:int):
 	""" If price is 4% below the Slow MA, return True """
 
-	if not df.__contains__('slow_sma'):
-		Indicators.AddIndicator(df, indicator_name="sma", col_name="slow_sma", args=30)
-
 	buy_price = 0.96 * df['slow_sma'][i]
 	if buy_price >= df['close'][i]:
 		return min(buy_price, df['high'][i])
 
 	return False
 
+@SignalsOf(maStrategy)
+def maSignals(df) -> np.ndarray:
+	slow_sma, close, high = _Columns(df, 'slow_sma', 'close', 'high')
+	buy_price = 0.96 * slow_sma
+
+	return np.where(buy_price >= close, np.minimum(buy_price, high), np.nan)
+
 #%%
+@Requires(("lbb", "low_boll", 14))
 def bollStrategy(df, i:int):
 	""" If price is 2.5% below the Lower Bollinger Band, return True """
 
-	if not df.__contains__('low_boll'):
-		Indicators.AddIndicator(df, indicator_name="lbb", col_name="low_boll", args=14)
-
 	buy_price = 0.975 * df['low_boll'][i]
 	if buy_price >= df['close'][i]:
 		return min(buy_price, df['high'][i])
 
 	return False
 
+@SignalsOf(bollStrategy)
+def bollSignals(df) -> np.ndarray:
+	low_boll, close, high = _Columns(df, 'low_boll', 'close', 'high')
+	buy_price = 0.975 * low_boll
+
+	return np.where(buy_price >= close, np.minimum(buy_price, high), np.nan)
+
 #%%
+@Requires(("ichimoku", None, None))
 def ichimokuBullish(df, i:int):
 	""" If price is above the Cloud formed by the Senkou Span A and B, 
 	and it moves above Tenkansen (from below), that is a buy signal. """
 
-	if not df.__contains__('tenkansen') or not df.__contains__('kijunsen') or \
-		not df.__contains__('senkou_a') or not df.__contains__('senkou_b'):
-		Indicators.AddIndicator(df, indicator_name="ichimoku", col_name=None, args=None)
-
 	if i - 1 > 0 and i < len(df):
 		if df['senkou_a'][i] is not None and df['senkou_b'][i] is not None:
 			if df['tenkansen'][i] is not None and df['tenkansen'][i-1] is not None:
@@ -60,10 +121,65 @@ def ichimokuBullish(df, i:int):
 	
 	return False
 
+@SignalsOf(ichimokuBullish)
+def ichimokuSignals(df) -> np.ndarray:
+	close, tenkansen, senkou_a, senkou_b = _Columns(df, 'close', 'tenkansen', 'senkou_a', 'senkou_b')
+	buy = np.zeros(close.shape, dtype=bool)
+	buy[..., 2:] = (close[..., 1:-1] < tenkansen[..., 1:-1]) & (close[..., 2:] > tenkansen[..., 2:]) & \
+		(close[..., 2:] > senkou_a[..., 2:]) & (close[..., 2:] > senkou_b[..., 2:])   # Crossing above tenkansen, above the cloud
+
+	return np.where(buy, close, np.nan)
+
 #%%
 strategies_dict = dict(
 	ma_crossover = maCrossoverStrategy,
 	ma_simple = maStrategy,
 	bollinger_simple = bollStrategy,
 	ichimoku_bullish = ichimokuBullish,
-)
\ No newline at end of file
+)
+
+#%%
+def RegisterStrategy(name:str, condition:str, price:str='close'):
+	""" Adds a strategy written as an expression (see StrategyDSL.py) to strategies_dict, buying at price when condition is true """
+	strategies_dict[name] = CompileStrategy(condition, price, name)
+	return strategies_dict[name]
+
+RegisterStrategy('bollinger_uptrend', "close <= 0.975 * lbb(14) & ema(50) > ema(200)", price="min(0.975 * lbb(14), high)")
+
+#%%
+def Main():
+
+	import time
+	import pandas as pd
+
+	# Random walk with wide swings, so that every strategy gives signals
+	n = 5000
+	close = 100 * np.exp(np.cumsum(np.random.normal(0, 0.02, n)))
+	df = pd.DataFrame(dict(time=np.arange(n) * 60000., open=close, high=close * 1.01, low=close * 0.99, close=close, volume=1.))
+
+	for name, strategy in strategies_dict.items():
+		frame = df.copy()
+		start = time.perf_counter()
+		buys = [strategy(frame, i) for i in range(n)]
+		loop_time = time.perf_counter() - start
+		start = time.perf_counter()
+		signals = strategy.signals(frame)
+		vectorized_time = time.perf_counter() - start
+
+		# Both forms agree on every candle: same buy price, or no signal (False / NaN)
+		looped = np.array([np.nan if buy is False else buy for buy in buys], dtype=np.float64)
+		agree = np.allclose(looped, signals, equal_nan=True, rtol=1e-12, atol=0)
+		print(name, ":", int(np.sum(~np.isnan(signals))), "signals, agree:", agree,
+			", loop", round(loop_time * 1000, 1), "ms, vectorized", round(vectorized_time * 1000, 2), "ms")
+		assert agree, name + " vectorized signals differ from the strategy"
+
+	# 2D arrays (symbols x candles) give the signals of each symbol computed alone
+	closes = 100 * np.exp(np.cumsum(np.random.normal(0, 0.02, (20, 1000)), axis=1))
+	for name, strategy in strategies_dict.items():
+		batch = strategy.signals(dict(close=closes, high=closes * 1.01, low=closes * 0.99))
+		alone = np.array([strategy.signals(pd.DataFrame(dict(close=c, high=c * 1.01, low=c * 0.99))) for c in closes])
+		print(name, ": 2D agree:", np.allclose(batch, alone, equal_nan=True, rtol=1e-12, atol=0))
+
+#%%
+if __name__ == '__main__':
+	Main()
@@ -0,0 +1,357 @@
+import re
+import weakref
+import numpy as np
+
+from Indicators import SmoothedMovingAverage, ExponentialMovingAverage, LowerBollingerBand, UpperBollingerBand, \
+	RollingMax, RollingMin, Shift, IchimokuLines
+
+# StrategyDSL.py compiles strategies written as expressions, like
+#     cross_above(ema(50), ema(200)) & close < 0.96 * sma(30)
+# into a plan of numpy operations on whole arrays. Every sub-expression appearing several times (in the
+# condition or the buy price) is computed once, constants are folded, and the plan works the same on the
+# columns of a dataframe or on 2D arrays (one row per symbol), since the indicator kernels work along the last axis.
+#
+# Grammar, from the loosest to the tightest : | (or), & (and), ~ (not), comparisons (< <= > >= == !=),
+# + -, * /, unary -, then numbers, columns (open, high, low, close, volume), functions and parentheses.
+
+TOKENS = re.compile(r'\s*(?:(\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)|([A-Za-z_]\w*)|(<=|>=|==|!=|[-+*/<>&|~(),]))')
+KEYWORDS = {'and': '&', 'or': '|', 'not': '~'}
+BINARY = {'|': 10, '&': 20, '<': 40, '<=': 40, '>': 40, '>=': 40, '==': 40, '!=': 40, '+': 50, '-': 50, '*': 60, '/': 60}   # Binding power
+NOT_POWER, NEG_POWER = 30, 70
+COMMUTATIVE = ['|', '&', '==', '!=', '+', '*', 'min', 'max']
+
+COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+INDICATORS = dict(sma=SmoothedMovingAverage, ema=ExponentialMovingAverage, lbb=LowerBollingerBand, ubb=UpperBollingerBand,
+	highest=RollingMax, lowest=RollingMin)   # name(period) on the close, or name(series, period)
+ICHIMOKU_LINES = ['tenkansen', 'kijunsen', 'senkou_a', 'senkou_b']
+
+OPERATIONS = {
+	'|': np.logical_or, '&': np.logical_and, '<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal,
+	'==': np.equal, '!=': np.not_equal, '+': np.add, '-': np.subtract, '*': np.multiply, '/': np.divide,
+	'min': np.fmin, 'max': np.fmax,
+}
+
+#%%
+def Tokenize(text:str) -> list:
+	""" Splits an expression into ('num', value), ('name', name) and ('op', operator) tokens """
+	tokens = []
+	position = 0
+	text = text.rstrip()
+	while position < len(text):
+		match = TOKENS.match(text, position)
+		if match is None:
+			raise Exception("Unexpected character " + repr(text[position:].lstrip()[:1]) + " at " + str(position) + " in " + repr(text))
+		number, name, op = match.groups()
+		if number is not None:
+			tokens.append(('num', float(number)))
+		elif name in KEYWORDS:
+			tokens.append(('op', KEYWORDS[name]))
+		elif name is not None:
+			tokens.append(('name', name))
+		else:
+			tokens.append(('op', op))
+		position = match.end()
+
+	tokens.append(('end', None))
+	return tokens
+
+#%%
+class Parser:
+	""" Pratt parser building the tree of an expression from its tokens. Nodes are tuples, so that
+	identical sub-expressions are equal and computed once by the Plan """
+
+	def __init__(self, text:str):
+		self.text = text
+		self.tokens = Tokenize(text)
+		self.position = 0
+
+	def Peek(self):
+		return self.tokens[self.position]
+
+	def Next(self):
+		token = self.tokens[self.position]
+		self.position += 1
+		return token
+
+	def Expect(self, op:str):
+		token = self.Next()
+		if token != ('op', op):
+			raise Exception("Expected " + repr(op) + " instead of " + self.Describe(token) + " in " + repr(self.text))
+
+	@staticmethod
+	def Describe(token) -> str:
+		return "end of expression" if token[0] == 'end' else repr(token[1])
+
+#%%
+	def Parse(self):
+		node = self.Expression(0)
+		if self.Peek()[0] != 'end':
+			raise Exception("Unexpected " + self.Describe(self.Peek()) + " in " + repr(self.text))
+
+		return node
+
+#%%
+	def Expression(self, power:int):
+		""" Parses the longest expression whose operators bind more than power """
+		node = self.Prefix(self.Next())
+		while True:
+			kind, op = self.Peek()
+			if kind != 'op' or op not in BINARY or BINARY[op] <= power:
+				return node
+			self.Next()
+			node = _Binary(op, node, self.Expression(BINARY[op]))   # Left associative
+
+#%%
+	def Prefix(self, token):
+		kind, value = token
+		if kind == 'num':
+			return ('num', value)
+		if token == ('op', '('):
+			node = self.Expression(0)
+			self.Expect(')')
+			return node
+		if token == ('op', '-'):
+			node = self.Expression(NEG_POWER)
+			return ('num', -node[1]) if node[0] == 'num' else ('op', '-', ('num', 0.), node)
+		if token == ('op', '~'):
+			return ('not', self.Expression(NOT_POWER))
+		if kind == 'name':
+			args = []
+			if self.Peek() == ('op', '('):
+				self.Next()
+				if self.Peek() != ('op', ')'):
+					args.append(self.Expression(0))
+					while self.Peek() == ('op', ','):
+						self.Next()
+						args.append(self.Expression(0))
+				self.Expect(')')
+			return _Call(value, args)
+
+		raise Exception("Unexpected " + self.Describe(token) + " in " + repr(self.text))
+
+#%%
+def _Binary(op:str, left, right):
+	""" Node of a binary operation, folded when both sides are numbers """
+	if left[0] == 'num' and right[0] == 'num':
+		return ('num', float(OPERATIONS[op](left[1], right[1])))
+	if op in COMMUTATIVE and repr(right) < repr(left):   # a & b and b & a are the same node
+		left, right = right, left
+
+	return ('op', op, left, right)
+
+#%%
+def _Period(node, name:str) -> int:
+	if node[0] != 'num' or node[1] != int(node[1]) or node[1] < 1:
+		raise Exception(name + " needs a whole number of candles, not " + repr(node))
+
+	return int(node[1])
+
+#%%
+def _Call(name:str, args:list):
+	""" Node of a column or a function """
+	if name in COLUMNS and len(args) == 0:
+		return ('col', name)
+	if name in ICHIMOKU_LINES and len(args) == 0:
+		return ('line', name)
+	if name in INDICATORS and len(args) in [1, 2]:
+		series = ('col', 'close') if len(args) == 1 else args[0]
+		return ('indicator', name, series, _Period(args[-1], name))
+	if name == 'shift' and len(args) == 2:
+		return ('shift', args[0], _Period(args[1], name))
+	if name == 'prev' and len(args) == 1:
+		return ('shift', args[0], 1)
+	if name in ['min', 'max'] and len(args) == 2:
+		return _Binary(name, args[0], args[1])
+	if name == 'abs' and len(args) == 1:
+		return ('abs', args[0])
+	if name in ['cross_above', 'cross_below'] and len(args) == 2:
+		a, b = args if name == 'cross_above' else args[::-1]   # a crossing below b is b crossing above a
+		return _Binary('&', _Binary('<=', ('shift', a, 1), ('shift', b, 1)), _Binary('>', a, b))
+
+	raise Exception("Unknown function " + name + " with " + str(len(args)) + " arguments")
+
+#%%
+def _Column(source, name:str):
+	""" Column of a dataframe, or array of a dict of arrays, None if it isn't there """
+	return np.asarray(source[name], dtype=np.float64) if name in source else None
+
+#%%
+class Plan:
+	""" Numpy operations computing the outputs {name: expression}, each distinct sub-expression once """
+
+	def __init__(self, outputs:dict):
+		self.steps = []   # (function(source, *arguments), slots of the arguments), in the order they are computed
+		self.slots = dict()   # node: index of the step computing it
+		self.indicators = []   # (indicator_name, col_name, args) read from the source when there, as Strategies.Requires declares them
+		self.outputs = {name: self.Add(Parser(text).Parse() if isinstance(text, str) else text) for name, text in outputs.items()}
+
+#%%
+	def Add(self, node) -> int:
+		""" Adds the steps computing node and returns the slot of its value """
+		if node in self.slots:
+			return self.slots[node]
+
+		kind = node[0]
+		if kind == 'num':
+			value = node[1]
+			function, args = (lambda source: value), []
+		elif kind == 'col':
+			col = node[1]
+			function, args = (lambda source: _Column(source, col)), []
+		elif kind == 'op':
+			operation = OPERATIONS[node[1]]
+			function, args = (lambda source, a, b: operation(a, b)), [node[2], node[3]]
+		elif kind == 'not':
+			function, args = (lambda source, a: np.logical_not(a)), [node[1]]
+		elif kind == 'abs':
+			function, args = (lambda source, a: np.abs(a)), [node[1]]
+		elif kind == 'shift':
+			periods = node[2]
+			function, args = (lambda source, a: Shift(np.asarray(a, dtype=np.float64), periods)), [node[1]]
+		elif kind == 'indicator':
+			function, args = self._Indicator(*node[1:])
+		elif kind == 'line':
+			line = node[1]
+			function, args = (lambda source, lines: lines[line]), [('ichimoku',)]
+		elif kind == 'ichimoku':
+			self._Declare(("ichimoku", None, None))
+			def function(source, high, low, close):
+				if all(line in source for line in ICHIMOKU_LINES):   # Already computed (by the IndicatorPlanner)
+					return {line: _Column(source, line) for line in ICHIMOKU_LINES}
+				return IchimokuLines(high, low, close)
+			args = [('col', 'high'), ('col', 'low'), ('col', 'close')]
+		else:
+			raise Exception("Unknown node " + repr(node))
+
+		slots = [self.Add(arg) for arg in args]
+		self.steps.append((function, slots))
+		self.slots[node] = len(self.steps) - 1
+
+		return self.slots[node]
+
+#%%
+	def _Indicator(self, name:str, series, period:int):
+		kernel = INDICATORS[name]
+		if series != ('col', 'close') or name not in ['sma', 'ema', 'lbb', 'ubb']:
+			return (lambda source, data: kernel(np.asarray(data, dtype=np.float64), period)), [series]
+
+		col = name + '_' + str(period)   # On the close, it is also an indicator of Indicators.AddIndicator
+		self._Declare((name, col, period))
+		def function(source, close):
+			values = _Column(source, col)
+			return values if values is not None else kernel(close, period)
+
+		return function, [series]
+
+	def _Declare(self, indicator:tuple):
+		if indicator not in self.indicators:
+			self.indicators.append(indicator)
+
+#%%
+	def Evaluate(self, source) -> dict:
+		""" Computes the outputs on source, a dataframe or a dict of arrays (2D arrays give 2D outputs) """
+		values = []
+		for function, slots in self.steps:
+			values.append(function(source, *[values[slot] for slot in slots]))
+
+		return {name: values[slot] for name, slot in self.outputs.items()}
+
+#%%
+def _FrameKey(df) -> tuple:
+	""" Number of candles, open times of the first and last ones and last prices of df, which change
+	when candles are added or the last one is updated in place """
+	if len(df) == 0:
+		return (0,)
+
+	columns = [col for col in ['time', 'close', 'high', 'low'] if col in df]
+	return (len(df), float(df[columns[0]].iat[0])) + tuple(float(df[col].iat[-1]) for col in columns)
+
+#%%
+def CompileStrategy(condition:str, price:str='close', name:str=None):
+	""" Returns a strategy (df, i) buying at price where condition is true, with its vectorized form in
+	strategy.signals and the indicators it reads in strategy.indicators, as the strategies of Strategies.py """
+	plan = Plan(dict(condition=condition, price=price))
+
+	def Signals(source) -> np.ndarray:
+		outputs = plan.Evaluate(source)
+		condition_values = np.nan_to_num(np.asarray(outputs['condition'], dtype=np.float64), nan=0.) != 0   # Warm-up rows are NaN, not signals
+		price_values = np.broadcast_to(np.asarray(outputs['price'], dtype=np.float64), condition_values.shape)
+
+		return np.where(condition_values, price_values, np.nan)
+
+	last = [None]   # (frame, key of its candles, signals) of the last frame evaluated
+	def Strategy(df, i:int):
+		""" Signal on candle i. The signals of the whole frame are kept until another frame comes, or the
+		candles of the same one change (as IndicatorCache.Fingerprint), so that loops over i evaluate the plan once """
+		cached = last[0]
+		key = _FrameKey(df)
+		if cached is not None and cached[0]() is df and cached[1] == key:
+			signals = cached[2]
+		else:
+			signals = Signals(df)
+			last[0] = (weakref.ref(df), key, signals)   # Replaced as a whole, threads read a consistent entry
+
+		buy_price = signals[i]
+		return False if np.isnan(buy_price) else buy_price
+
+	Strategy.__name__ = Strategy.__qualname__ = name if name is not None else 'dsl_strategy'
+	Strategy.__doc__ = "Buys at " + price + " when " + condition
+	Strategy.signals = Signals
+	Strategy.indicators = plan.indicators
+	Strategy.plan = plan
+
+	return Strategy
+
+#%%
+def Main():
+
+	import time
+	import pandas as pd
+	from Strategies import strategies_dict
+
+	plan = Plan(dict(condition="cross_above(ema(50), ema(200)) & close < 0.96*sma(30) | close <= 0.975 * lbb(14) and ema(50) > ema(200)",
+		price="min(0.96 * sma(30), high)"))
+	print(len(plan.steps), "steps, indicators read:", plan.indicators)
+
+	# Same signals as the strategies written by hand
+	n = 100000
+	close = 100 * np.exp(np.cumsum(np.random.normal(0, 0.02, n)))
+	df = pd.DataFrame(dict(time=np.arange(n) * 60000., open=close, high=close * 1.01, low=close * 0.99, close=close, volume=1.))
+	written = dict(
+		ma_crossover = CompileStrategy("cross_above(ema(50), ema(200))"),
+		ma_simple = CompileStrategy("close <= 0.96 * sma(30)", price="min(0.96 * sma(30), high)"),
+		bollinger_simple = CompileStrategy("close <= 0.975 * lbb(14)", price="min(0.975 * lbb(14), high)"),
+		ichimoku_bullish = CompileStrategy("prev(close) < prev(tenkansen) & close > tenkansen & close > senkou_a & close > senkou_b"))
+	for name, strategy in written.items():
+		start = time.perf_counter()
+		signals = strategy.signals(df)
+		elapsed = time.perf_counter() - start
+		expected = strategies_dict[name].signals(df.copy())
+		print(name, ":", int(np.sum(~np.isnan(signals))), "signals in", round(elapsed * 1000, 2), "ms, same as Strategies.py:",
+			np.allclose(signals[2:], expected[2:], equal_nan=True, rtol=1e-12, atol=0))
+
+	# Candle by candle, the plan is evaluated once for the frame
+	frame = df.iloc[:5000].copy()
+	strategy = written['bollinger_simple']
+	start = time.perf_counter()
+	looped = np.array([strategy(frame, i) for i in range(len(frame))], dtype=np.float64)
+	elapsed = time.perf_counter() - start
+	looped[looped == 0] = np.nan   # False
+	assert np.allclose(looped, strategy.signals(frame), equal_nan=True)
+	print("Candle by candle:", len(frame), "candles in", round(elapsed * 1000, 2), "ms, same as the vectorized form: True")
+
+	# The last candle updated in place is evaluated again
+	frame.loc[len(frame) - 1, ['close', 'low']] = 0.5 * frame['low'].iloc[-1]
+	assert strategy(frame, len(frame) - 1) == strategy.signals(frame)[-1] and strategy(frame, len(frame) - 1) is not False
+
+	# The warm-up rows of an indicator used as the condition are NaN, not signals
+	assert np.all(np.isnan(CompileStrategy("sma(30)").signals(frame)[:29]))
+
+	# One row per symbol
+	closes = 100 * np.exp(np.cumsum(np.random.normal(0, 0.02, (50, 1000)), axis=1))
+	signals = written['ma_simple'].signals(dict(close=closes, high=closes * 1.01, low=closes * 0.99))
+	print("2D:", signals.shape, int(np.sum(~np.isnan(signals[:, -1]))), "symbols with a signal on the last candle")
+
+#%%
+if __name__ == '__main__':
+	Main()
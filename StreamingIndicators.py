@@ -0,0 +1,350 @@
+import json
+import time
+import numpy as np
+from collections import deque
+from functools import partial
+
+# StreamingIndicators.py computes the indicators of Indicators.INDICATORS_DICT one candle at a time :
+# each indicator keeps a small state (running sums, ema, Welford variance, monotonic deques for the
+# rolling highs and lows) updated in O(1) per candle instead of recomputing the whole history.
+# States can be saved and restored, so that a restart doesn't need to replay the history.
+
+NAN = float('nan')
+
+#%%
+class StreamingIndicator:
+	""" Saving and restoring of the states of the streaming indicators. Each one has Update, committing
+	a new value, and Peek, computing the output for a value without committing it (for the candle still open) """
+
+	DEQUES = []   # Attributes saved as lists in the states
+
+	def GetState(self) -> dict:
+		""" Returns the state of the indicator (json serializable) """
+		state = dict(self.__dict__)
+		for name in self.DEQUES:
+			state[name] = [list(v) if isinstance(v, tuple) else v for v in state[name]]
+
+		return state
+
+	def SetState(self, state:dict):
+		for name, value in state.items():
+			if name in self.DEQUES:
+				value = deque([tuple(v) if isinstance(v, list) else v for v in value], maxlen=getattr(self, name).maxlen)
+			setattr(self, name, value)
+
+		return self
+
+#%%
+class StreamingSMMA(StreamingIndicator):
+	""" Smoothed moving average (Wilder), seeded with the mean of the first period values, like pyti """
+
+	def __init__(self, period:int):
+		self.period = int(period)
+		self.count = 0   # Values received, until the seed
+		self.total = 0.   # Sum of the first values, for the seed
+		self.value = NAN
+
+	def _Next(self, x:float) -> float:
+		return (self.value * (self.period - 1) + x) / self.period
+
+	def Update(self, x:float) -> float:
+		if x != x and self.count == 0:   # Leading NaNs are skipped
+			return NAN
+
+		if self.count < self.period:
+			self.count += 1
+			self.total += x
+			if self.count == self.period:
+				self.value = self.total / self.period
+		else:
+			self.value = self._Next(x)
+
+		return self.value
+
+	def Peek(self, x:float) -> float:
+		if self.count < self.period - 1 or (x != x and self.count == 0):
+			return NAN
+		if self.count == self.period - 1:
+			return (self.total + x) / self.period
+
+		return self._Next(x)
+
+#%%
+class StreamingEMA(StreamingSMMA):
+	""" Exponential moving average (alpha = 2 / (period + 1)), seeded like the smoothed one """
+
+	def _Next(self, x:float) -> float:
+		alpha = 2 / float(self.period + 1)
+
+		return alpha * x + (1 - alpha) * self.value
+
+#%%
+class StreamingBollinger(StreamingIndicator):
+	""" Bollinger band : mean of the last period values plus or minus std_mult standard deviations
+	(population), the variance being updated with Welford's method as values enter and leave the window """
+
+	DEQUES = ['window']
+
+	def __init__(self, period:int, std_mult:float=2.0, band:str='lower'):
+		self.period = int(period)
+		self.std_mult = std_mult
+		self.band = band   # 'lower' or 'upper'
+		self.window = deque(maxlen=self.period)
+		self.mean = 0.
+		self.m2 = 0.   # Sum of the squared differences to the mean
+		self.updates = 0   # The sums are computed again from the window every period updates, the errors don't add up
+
+	@staticmethod
+	def _Add(n:int, mean:float, m2:float, x:float):
+		n += 1
+		delta = x - mean
+		mean += delta / n
+		return n, mean, m2 + delta * (x - mean)
+
+	@staticmethod
+	def _Remove(n:int, mean:float, m2:float, x:float):
+		if n == 1:
+			return 0, 0., 0.
+		n -= 1
+		delta = x - mean
+		mean -= delta / n
+		return n, mean, m2 - delta * (x - mean)
+
+	def _Band(self, n:int, mean:float, m2:float) -> float:
+		if n < self.period:
+			return NAN
+		std = np.sqrt(max(m2, 0.) / n)
+
+		return mean - self.std_mult * std if self.band == 'lower' else mean + self.std_mult * std
+
+	def _Slide(self, x:float):
+		""" Sums of the window once x entered it """
+		n, mean, m2 = len(self.window), self.mean, self.m2
+		if n == self.period:
+			n, mean, m2 = self._Remove(n, mean, m2, self.window[0])
+
+		return self._Add(n, mean, m2, x)
+
+	def Update(self, x:float) -> float:
+		n, self.mean, self.m2 = self._Slide(x)
+		self.window.append(x)
+
+		self.updates += 1
+		if self.updates % self.period == 0:
+			values = np.array(self.window)
+			self.mean = values.mean()
+			self.m2 = ((values - self.mean) ** 2).sum()
+
+		return self._Band(n, self.mean, self.m2)
+
+	def Peek(self, x:float) -> float:
+		return self._Band(*self._Slide(x))
+
+#%%
+class RollingExtremum(StreamingIndicator):
+	""" Max (or min) of the last window values, from a monotonic deque of (index, value) """
+
+	DEQUES = ['candidates']
+
+	def __init__(self, window:int, is_max:bool=True):
+		self.window = int(window)
+		self.is_max = is_max
+		self.candidates = deque()   # Values which can still become the extremum, the extremum first
+		self.index = -1   # Index of the last value
+
+	def _Beats(self, a:float, b:float) -> bool:
+		return a >= b if self.is_max else a <= b
+
+	def Update(self, x:float) -> float:
+		self.index += 1
+		while len(self.candidates) > 0 and self._Beats(x, self.candidates[-1][1]):
+			self.candidates.pop()   # Can't be the extremum anymore
+		self.candidates.append((self.index, x))
+		if self.candidates[0][0] <= self.index - self.window:   # Left the window
+			self.candidates.popleft()
+
+		return self.candidates[0][1] if self.index + 1 >= self.window else NAN
+
+	def Peek(self, x:float) -> float:
+		if self.index + 2 < self.window:
+			return NAN
+
+		front = [v for i, v in list(self.candidates)[:2] if i > self.index + 1 - self.window][:1]   # Only the first one can leave
+		if len(front) == 0:
+			return x
+
+		return x if self._Beats(x, front[0]) else front[0]
+
+#%%
+class StreamingIchimoku(StreamingIndicator):
+	""" Ichimoku cloud of Indicators.ComputeIchimokuCloud. The chikou span is the close 26 candles
+	later, so it is not known yet for the candles streamed (like the last 26 rows of the batch version) """
+
+	DEQUES = ['mid_lines', 'high_lows']
+	EXTREMA = ['high_9', 'low_9', 'high_26', 'low_26', 'high_52', 'low_52']
+
+	def __init__(self):
+		self.high_9, self.low_9 = RollingExtremum(9, True), RollingExtremum(9, False)
+		self.high_26, self.low_26 = RollingExtremum(26, True), RollingExtremum(26, False)
+		self.high_52, self.low_52 = RollingExtremum(52, True), RollingExtremum(52, False)
+		self.mid_lines = deque(maxlen=27)   # (tenkansen + kijunsen) / 2 of the last candles, senkou_a is the one 26 candles ago
+		self.high_lows = deque(maxlen=53)   # Middle of the 52-period range of the last candles, senkou_b is the one 52 candles ago
+
+	def _Lines(self, extrema:list, mid_lines:list, high_lows:list) -> dict:
+		high_9, low_9, high_26, low_26, high_52, low_52 = extrema
+		tenkansen = (high_9 + low_9) / 2
+		kijunsen = (high_26 + low_26) / 2
+		mid_lines = mid_lines + [(tenkansen + kijunsen) / 2]
+		high_lows = high_lows + [(high_52 + low_52) / 2]
+
+		return dict(
+			tenkansen = tenkansen,
+			kijunsen = kijunsen,
+			senkou_a = mid_lines[-27] if len(mid_lines) >= 27 else NAN,   # shift(26)
+			senkou_b = high_lows[-53] if len(high_lows) >= 53 else NAN,   # shift(52)
+			chikouspan = NAN)
+
+	def Update(self, high:float, low:float, close:float=None) -> dict:
+		extrema = [getattr(self, name).Update(high if name.startswith('high') else low) for name in self.EXTREMA]
+		lines = self._Lines(extrema, list(self.mid_lines), list(self.high_lows))
+		self.mid_lines.append((lines['tenkansen'] + lines['kijunsen']) / 2)
+		self.high_lows.append((extrema[4] + extrema[5]) / 2)
+
+		return lines
+
+	def Peek(self, high:float, low:float, close:float=None) -> dict:
+		extrema = [getattr(self, name).Peek(high if name.startswith('high') else low) for name in self.EXTREMA]
+
+		return self._Lines(extrema, list(self.mid_lines), list(self.high_lows))
+
+	def GetState(self) -> dict:
+		state = StreamingIndicator.GetState(self)
+		for name in self.EXTREMA:
+			state[name] = getattr(self, name).GetState()
+
+		return state
+
+	def SetState(self, state:dict):
+		state = dict(state)
+		for name in self.EXTREMA:
+			getattr(self, name).SetState(state.pop(name))
+
+		return StreamingIndicator.SetState(self, state)
+
+#%%
+# Streaming counterparts of Indicators.INDICATORS_DICT, built from the same args
+STREAMING_INDICATORS_DICT = {
+	"sma": StreamingSMMA,
+	"ema": StreamingEMA,
+	"lbb": partial(StreamingBollinger, band='lower'),
+	"ubb": partial(StreamingBollinger, band='upper'),
+	"ichimoku": lambda args=None: StreamingIchimoku(),
+}
+
+#%%
+class IndicatorStream:
+	""" Indicators of one (symbol, interval) updated candle by candle """
+
+	def __init__(self, indicators:list):
+		self.indicators = []   # (indicator_name, col_name, args, streaming indicator)
+		for indicator_name, col_name, args in indicators:
+			self.indicators.append((indicator_name, col_name, args, STREAMING_INDICATORS_DICT[indicator_name](args)))
+		self.last_time = None   # Open time of the last candle committed
+
+#%%
+	def _Values(self, candle, commit:bool) -> dict:
+		values = dict()
+		for indicator_name, col_name, args, indicator in self.indicators:
+			function = indicator.Update if commit else indicator.Peek
+			if indicator_name == "ichimoku":   # Several columns, like Indicators.AddIndicator
+				values.update(function(candle['high'], candle['low'], candle['close']))
+			else:
+				values[col_name] = function(candle['close'])
+
+		return values
+
+#%%
+	def Update(self, candle) -> dict:
+		""" Commits a closed candle (with time, high, low, close), returns the values of the indicators for it """
+		self.last_time = candle['time']
+
+		return self._Values(candle, True)
+
+#%%
+	def Peek(self, candle) -> dict:
+		""" Returns the values of the indicators for the candle still open, without committing it """
+		return self._Values(candle, False)
+
+#%%
+	def Seed(self, df) -> dict:
+		""" Commits the candles of a dataframe newer than the last one committed, returns the last values """
+		values = dict()
+		times, highs, lows, closes = [df[col].to_numpy() for col in ['time', 'high', 'low', 'close']]
+		for i in range(len(df)):
+			if self.last_time is None or times[i] > self.last_time:
+				values = self.Update(dict(time=times[i], high=highs[i], low=lows[i], close=closes[i]))
+
+		return values
+
+#%%
+	def GetState(self) -> dict:
+		""" Checkpoint of every indicator (json serializable) """
+		return dict(
+			last_time = None if self.last_time is None else float(self.last_time),
+			indicators = [[indicator_name, col_name, args, indicator.GetState()] for indicator_name, col_name, args, indicator in self.indicators])
+
+#%%
+	@classmethod
+	def FromState(cls, state:dict):
+		stream = cls([(indicator_name, col_name, args) for indicator_name, col_name, args, _ in state['indicators']])
+		for (_, _, _, indicator), (_, _, _, indicator_state) in zip(stream.indicators, state['indicators']):
+			indicator.SetState(indicator_state)
+		stream.last_time = state['last_time']
+
+		return stream
+
+#%%
+def Main(n:int=3000):
+
+	import pandas as pd
+	from Indicators import Indicators
+
+	# Random candles, indicators in batch then one candle at a time
+	close = 100 * np.exp(np.cumsum(np.random.normal(0, 0.01, n)))
+	df = pd.DataFrame(dict(time=np.arange(n) * 60000., close=close,
+		high=close * (1 + np.random.uniform(0, 0.01, n)), low=close * (1 - np.random.uniform(0, 0.01, n))))
+
+	indicators = [("sma", "sma_30", 30), ("ema", "ema_50", 50), ("ema", "ema_200", 200), ("lbb", "lbb_14", 14), ("ubb", "ubb_14", 14), ("ichimoku", None, None)]
+	batch = df.copy()
+	for indicator_name, col_name, args in indicators:
+		Indicators.AddIndicator(batch, indicator_name, col_name, args)
+
+	# The second half is streamed after a checkpoint, saved and restored through json
+	stream = IndicatorStream(indicators)
+	rows = [stream.Update(candle) for candle in df.iloc[:n // 2].to_dict('records')]
+	stream = IndicatorStream.FromState(json.loads(json.dumps(stream.GetState())))
+	start = time.perf_counter()
+	rows = rows + [stream.Update(candle) for candle in df.iloc[n // 2:].to_dict('records')]
+	per_candle = (time.perf_counter() - start) / (n - n // 2)
+	streamed = pd.DataFrame(rows)
+
+	for col in streamed.columns:
+		if col == 'chikouspan':   # Looks ahead, only the last row is comparable
+			same = np.isnan(streamed[col].iloc[-1]) and np.isnan(batch[col].iloc[-1])
+		else:
+			same = np.allclose(streamed[col], batch[col], rtol=1e-9, atol=1e-9, equal_nan=True)
+		assert same, col + " streamed differs from the batch version"
+		print(col, "matches the batch version:", same)
+
+	# Peek on the last candle gives what Update would
+	peek = IndicatorStream.FromState(stream.GetState())
+	candle = dict(time=n * 60000., high=close[-1] * 1.02, low=close[-1] * 0.97, close=close[-1] * 1.01)
+	peeked, updated = peek.Peek(candle), peek.Update(candle)
+	same = all(np.allclose(peeked[col], updated[col], equal_nan=True) for col in updated)
+	assert same, "Peek differs from Update"
+	print("Peek matches Update:", same)
+	print(round(per_candle * 1e6, 1), "us per candle for", len(indicators), "indicators")
+
+#%%
+if __name__ == '__main__':
+	Main()
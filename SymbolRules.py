@@ -0,0 +1,90 @@
+import numpy as np
+from decimal import Decimal, ROUND_HALF_EVEN
+
+# SymbolRules.py holds the trading rules of a symbol (tick size, step size, price and quantity bounds,
+# min notional) parsed once from its exchangeInfo data, so that prices and quantities of orders
+# are rounded and validated without scanning the filters again, one at a time or whole arrays at once.
+
+#%%
+class SymbolRules:
+
+	def __init__(self, symbol_data:dict):
+		self.symbol = symbol_data['symbol']
+		filters = {fil['filterType']: fil for fil in symbol_data['filters']}
+
+		price_filter = filters.get('PRICE_FILTER', {})
+		if not price_filter.__contains__('tickSize'):
+			raise Exception("Couldn't find tickSize or PRICE_FILTER in symbol_data.")
+
+		lot_filter = filters.get('LOT_SIZE', {})
+		if not lot_filter.__contains__('stepSize'):
+			raise Exception("Couldn't find stepSize or LOT_SIZE in symbol_data.")
+
+		notional_filter = filters.get('MIN_NOTIONAL', filters.get('NOTIONAL', {}))   # Binance renamed the filter
+
+		self.tick_size = Decimal(price_filter['tickSize']).normalize()   # Prices are multiples of the tick size
+		self.step_size = Decimal(lot_filter['stepSize']).normalize()   # Quantities are multiples of the step size
+
+		# Same rules as floats for the arrays (a max of 0 means there is no max)
+		self.tick = float(self.tick_size)
+		self.step = float(self.step_size)
+		self.price_decimals = max(-self.tick_size.as_tuple().exponent, 0)
+		self.quantity_decimals = max(-self.step_size.as_tuple().exponent, 0)
+		self.min_price = float(price_filter.get('minPrice', 0))
+		self.max_price = float(price_filter.get('maxPrice', 0))
+		self.min_quantity = float(lot_filter.get('minQty', 0))
+		self.max_quantity = float(lot_filter.get('maxQty', 0))
+		self.min_notional = float(notional_filter.get('minNotional', 0))   # Minimum of price * quantity
+
+#%%
+	@staticmethod
+	def _Quantize(value, size:Decimal, round_up:bool=False) -> Decimal:
+		""" Rounds value to the closest multiple of size, plus one size if round_up """
+		steps = (Decimal(value) / size).quantize(Decimal(1), rounding=ROUND_HALF_EVEN)
+		if round_up:
+			steps = steps + 1
+
+		return steps * size
+
+#%%
+	def RoundPrice(self, desired_price, round_up:bool=False) -> Decimal:
+		""" Returns the valid price closest to desired_price (one tick above if round_up) """
+		return self._Quantize(desired_price, self.tick_size, round_up)
+
+#%%
+	def RoundQuantity(self, desired_quantity, round_up:bool=False) -> Decimal:
+		""" Returns the valid quantity closest to desired_quantity (one step above if round_up) """
+		return self._Quantize(desired_quantity, self.step_size, round_up)
+
+#%%
+	def RoundPrices(self, desired_prices:np.ndarray, round_up:bool=False) -> np.ndarray:
+		""" RoundPrice on a whole array of prices """
+		prices = np.round(np.asarray(desired_prices, dtype=np.float64) / self.tick) + (1 if round_up else 0)
+
+		return np.round(prices * self.tick, self.price_decimals)   # Removes the float error of the multiplication
+
+#%%
+	def RoundQuantities(self, desired_quantities:np.ndarray, round_up:bool=False) -> np.ndarray:
+		""" RoundQuantity on a whole array of quantities """
+		quantities = np.round(np.asarray(desired_quantities, dtype=np.float64) / self.step) + (1 if round_up else 0)
+
+		return np.round(quantities * self.step, self.quantity_decimals)
+
+#%%
+	def AreValid(self, prices:np.ndarray, quantities:np.ndarray) -> np.ndarray:
+		""" Returns for each order whether its (rounded) price and quantity follow the rules of the symbol """
+		prices = np.asarray(prices, dtype=np.float64)
+		quantities = np.asarray(quantities, dtype=np.float64)
+
+		valid = (prices >= self.min_price) & (quantities >= self.min_quantity) & (prices * quantities >= self.min_notional)
+		if self.max_price > 0:
+			valid &= prices <= self.max_price
+		if self.max_quantity > 0:
+			valid &= quantities <= self.max_quantity
+
+		return valid & (quantities > 0) & (prices > 0)
+
+#%%
+	def IsValid(self, price, quantity) -> bool:
+		""" Returns whether an order with this (rounded) price and quantity follows the rules of the symbol """
+		return bool(self.AreValid(float(price), float(quantity)))
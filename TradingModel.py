@@ -8,7 +8,7 @@ class TradingModel:
 	def __init__(self, symbol, timeframe:str='4h'):
 		self.symbol = symbol
 		self.timeframe = timeframe
-		self.exchange = Binance()
+		self.exchange = Binance(candles_dir='candles')   # The 10000 candles are read from the disk once downloaded
 		self.df = self.exchange.GetSymbolKlines(symbol, timeframe, 10000)
 		self.last_price = self.df['close'][len(self.df['close'])-1]
 
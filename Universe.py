@@ -0,0 +1,99 @@
+import time
+import numpy as np
+
+# Universe.py ranks the symbols from the 24h tickers of the exchange (one request for all of them),
+# by quote volume, volatility and spread, so that the bots spend their candles requests and strategy
+# checks only on the most liquid and moving symbols instead of all of them every tick.
+
+#%%
+def ScoreTickers(tickers:list, weights:tuple=(1, 1, 1)) -> dict:
+	""" Returns the metrics and the score of every symbol traded in the last 24h, indexed by symbol.
+	Each metric is ranked among the symbols (from 0 to 1), the score is the weighted sum of the ranks
+	of the quote volume (higher is better), the volatility (higher is better) and the spread (lower is better) """
+	tickers = [ticker for ticker in tickers if float(ticker['lastPrice']) > 0 and float(ticker['quoteVolume']) > 0]   # Not traded
+	if len(tickers) == 0:
+		return dict()
+
+	values = np.array([[float(ticker[key]) for key in ['quoteVolume', 'highPrice', 'lowPrice', 'lastPrice', 'bidPrice', 'askPrice']]
+		for ticker in tickers])
+	quote_volume, high, low, last, bid, ask = values.T
+
+	volatility = (high - low) / last   # Range of the last 24h relative to the price
+	spread = np.full(len(tickers), np.inf)   # Symbols without bid or ask are ranked last
+	quoted = (bid > 0) & (ask > 0)
+	spread[quoted] = (ask[quoted] - bid[quoted]) / ((ask[quoted] + bid[quoted]) / 2)
+
+	def Rank(x):
+		return x.argsort(kind='stable').argsort() / max(len(x) - 1, 1)
+
+	score = weights[0] * Rank(quote_volume) + weights[1] * Rank(volatility) + weights[2] * (1 - Rank(spread))
+
+	return {ticker['symbol']: dict(quote_volume=quote_volume[i], volatility=volatility[i], spread=spread[i], score=score[i])
+		for i, ticker in enumerate(tickers)}
+
+#%%
+class Universe:
+
+	def __init__(self, exchange, top_n:int=20, refresh:float=300, weights:tuple=(1, 1, 1)):
+		self.exchange = exchange
+		self.top_n = top_n   # Symbols checked per bot and per tick
+		self.refresh = refresh   # Seconds before the tickers are downloaded again
+		self.weights = weights   # Of the quote volume, volatility and spread in the score
+
+		self.scores = dict()   # symbol: metrics and score, from ScoreTickers
+		self.update_time = 0
+
+#%%
+	def Update(self, force:bool=False):
+		""" Downloads the tickers of all the symbols (one request) once refresh seconds have passed """
+		if not force and time.time() - self.update_time < self.refresh:
+			return
+
+		tickers = self.exchange.Get24hrTickers()
+		if not isinstance(tickers, list):   # Something went wrong, the previous scores are kept
+			return
+
+		self.scores = ScoreTickers(tickers, self.weights)
+		self.update_time = time.time()
+
+#%%
+	def Rank(self, symbols:list=None) -> list:
+		""" Returns the symbols (all the scored ones if None) from the best score to the worst,
+		symbols without ticker are dropped """
+		self.Update()
+		if symbols is None:
+			symbols = self.scores.keys()
+
+		return sorted([symbol for symbol in symbols if symbol in self.scores], key=lambda symbol: -self.scores[symbol]['score'])
+
+#%%
+	def Top(self, symbol_datas:list, n:int=None) -> list:
+		""" Returns the symbol datas of the n best ranked symbols among symbol_datas (top_n if n is None) """
+		if n is None:
+			n = self.top_n
+
+		if len(symbol_datas) <= n:   # Nothing to filter, the tickers aren't needed
+			return symbol_datas
+
+		symbol_datas_dict = {sd['symbol']: sd for sd in symbol_datas}
+		ranked = self.Rank(list(symbol_datas_dict.keys()))
+		if len(ranked) == 0:   # No ticker, no ranking
+			return symbol_datas[:n]
+
+		return [symbol_datas_dict[symbol] for symbol in ranked[:n]]
+
+#%%
+def Main():
+
+	from Binance import Binance
+
+	exchange = Binance('credentials.txt')
+	universe = Universe(exchange, top_n=20)
+	symbols = [sd['symbol'] for sd in exchange.GetSymbolDataOfSymbols() if sd['quoteAsset'] == 'USDT']
+
+	for symbol in universe.Rank(symbols)[:universe.top_n]:
+		print(symbol, universe.scores[symbol])
+
+#%%
+if __name__ == '__main__':
+	Main()